@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 import platform
@@ -9,10 +10,41 @@ def install_requirements():
     subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
     subprocess.check_call([sys.executable, "-m", "pip", "install", "pyinstaller"])
 
-def build_executable():
+# Cold-import budgets in milliseconds, measured in a fresh interpreter
+IMPORT_BUDGETS = {
+    "mcp_client.cli": 50,
+    "mcp_client.ollama, mcp_client.discovery, mcp_client.agent": 250,
+}
+
+def time_import(modules):
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {modules}\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+        "sys.exit('customtkinter' in sys.modules)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"import {modules} pulled in the GUI or failed:\n{result.stderr}")
+    return float(result.stdout.strip())
+
+def check_import_budget():
+    print("Checking cold-import time...")
+    for modules, budget in IMPORT_BUDGETS.items():
+        # Best of three runs to keep disk cache noise out
+        elapsed = min(time_import(modules) for _ in range(3))
+        print(f"  import {modules}: {elapsed:.0f} ms (budget {budget} ms)")
+        if elapsed > budget:
+            raise SystemExit(f"import {modules} is over its {budget} ms budget")
+
+def build_executable(with_embeddings=False):
     print("Building executable...")
     # Create spec file content
     icon_path = 'assets/icon.ico' if platform.system() == 'Windows' else 'assets/icon.icns'
+    # The embedding index needs numpy, which would more than double the bundle; it is opt-in
+    hiddenimports = ['mcp_client.gui'] + (['mcp_client.embeddings'] if with_embeddings else [])
+    excludes = ['PIL'] + ([] if with_embeddings else ['numpy'])
     spec_content = f"""
 import platform
 # -*- mode: python ; coding: utf-8 -*-
@@ -24,11 +56,11 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports={hiddenimports!r},
     hookspath=[],
     hooksconfig={{}},
     runtime_hooks=[],
-    excludes=[],
+    excludes={excludes!r},
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -156,6 +188,11 @@ def create_mac_dmg():
     ])
 
 def main():
+    parser = argparse.ArgumentParser(description="Build the MCP Client executable and installers")
+    parser.add_argument("--with-embeddings", action="store_true",
+                        help="Bundle numpy so \"Give the model related earlier messages\" works in the build")
+    args = parser.parse_args()
+
     # Create necessary directories
     os.makedirs("assets", exist_ok=True)
     os.makedirs("installer", exist_ok=True)
@@ -163,8 +200,11 @@ def main():
     # Install requirements
     install_requirements()
     
+    # Keep the core importable without the GUI and within its import budget
+    check_import_budget()
+    
     # Build executable
-    build_executable()
+    build_executable(args.with_embeddings)
     
     # Create platform-specific installers
     if platform.system() == "Windows":
@@ -0,0 +1,51 @@
+import importlib
+import os
+
+# Per-user data directory for caches and stores
+APP_DIR = os.path.join(os.path.expanduser("~"), ".mcp_client")
+
+# Core names are loaded on first use, so importing the package stays cheap and never touches the GUI
+_EXPORTS = {
+    "HTTPTransport": "transport",
+    "DEFAULT_TRANSPORT": "transport",
+    "GenerationStats": "ollama",
+    "ResponseCache": "ollama",
+    "OllamaClient": "ollama",
+    "ModelCatalog": "ollama",
+    "Conversation": "ollama",
+    "OllamaRouter": "router",
+    "create_ollama_client": "router",
+    "ModelLifecycle": "lifecycle",
+    "ConversationStore": "store",
+    "PromptPrefill": "prefill",
+    "GenerationJob": "scheduler",
+    "RequestScheduler": "scheduler",
+    "MCPError": "mcp",
+    "MCPSession": "mcp",
+    "MCPServer": "mcp",
+    "StdioMCPTransport": "mcp",
+    "HTTPMCPTransport": "mcp",
+    "SSEMCPTransport": "mcp",
+    "SchemaCache": "mcp",
+    "normalize_url": "mcp",
+    "ToolCatalog": "agent",
+    "AgentLoop": "agent",
+    "AgentTrace": "agent",
+    "ServerRegistry": "registry",
+    "HealthMonitor": "health",
+    "ServerDiscovery": "discovery",
+    "run_batch": "batch",
+    "METRICS": "metrics",
+    "Metrics": "metrics",
+    "MetricsServer": "metrics",
+}
+
+__all__ = ["APP_DIR"] + list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
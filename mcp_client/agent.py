@@ -0,0 +1,237 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable
+
+from .mcp import MCPError, MCPServer
+from .ollama import GenerationStats, OllamaClient
+from .transport import RequestScope
+
+class ToolEntry:
+    __slots__ = ("name", "server", "tool_name", "definition")
+
+    def __init__(self, name: str, server: MCPServer, tool_name: str, definition: Dict):
+        self.name = name
+        self.server = server
+        self.tool_name = tool_name
+        self.definition = definition
+
+class ToolView:
+    # The tools of one set of servers, under the names the model sees them by
+    def __init__(self, signature: tuple, entries: Dict[str, ToolEntry], definitions: List[Dict]):
+        self.signature = signature
+        self.entries = entries
+        self.definitions = definitions
+
+    def resolve(self, name: str) -> Optional[ToolEntry]:
+        return self.entries.get(name)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class ToolCatalog:
+    # Shared by jobs with different server sets: each set gets its own view, so one job's name->server
+    # mapping never replaces another's, while the schemas behind them come from the servers' caches
+    def __init__(self, max_views: int = 16):
+        self.max_views = max_views
+        # Sorted server keys -> view, least recently used first
+        self.views: "OrderedDict[tuple, ToolView]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def qualified_name(server: MCPServer, tool_name: str) -> str:
+        # Ollama function names allow letters, digits, _ and -, up to 64 characters
+        prefix = re.sub(r"[^A-Za-z0-9_-]+", "_", server.name).strip("_") or "server"
+        return f"{prefix}__{tool_name}"[:64]
+
+    def refresh(self, servers: List[MCPServer]) -> ToolView:
+        # Cheap when nothing changed: the schema caches answer and the signature matches. Servers are
+        # taken in key order so the same set always gets the same names, whatever order it came in.
+        servers = sorted(set(servers), key=lambda server: server.key)
+        key = tuple(server.key for server in servers)
+        tool_lists = []
+        for server in servers:
+            try:
+                tool_lists.append((server, server.list_tools()))
+            except MCPError:
+                continue
+        signature = tuple((server.key, server.schemas.version) for server, _ in tool_lists)
+        with self.lock:
+            view = self.views.get(key)
+            if view is None or view.signature != signature:
+                view = self._build(signature, tool_lists)
+                self.views[key] = view
+            self.views.move_to_end(key)
+            while len(self.views) > self.max_views:
+                self.views.popitem(last=False)
+            return view
+
+    def _build(self, signature: tuple, tool_lists: List[tuple]) -> ToolView:
+        counts: Dict[str, int] = {}
+        for _, tools in tool_lists:
+            for tool in tools:
+                counts[tool["name"]] = counts.get(tool["name"], 0) + 1
+        entries: Dict[str, ToolEntry] = {}
+        definitions = []
+        for server, tools in tool_lists:
+            for tool in tools:
+                # A name offered by more than one server is qualified everywhere, so it's stable
+                name = tool["name"]
+                if counts[name] > 1:
+                    name = self.qualified_name(server, name)
+                base, suffix = name, 2
+                while name in entries:
+                    name = f"{base[:60]}_{suffix}"
+                    suffix += 1
+                definition = {
+                    "type": "function",
+                    "function": {
+                        "name": name,
+                        "description": tool.get("description", ""),
+                        "parameters": tool.get("inputSchema") or {"type": "object", "properties": {}}
+                    }
+                }
+                entries[name] = ToolEntry(name, server, tool["name"], definition)
+                definitions.append(definition)
+        return ToolView(signature, entries, definitions)
+
+class AgentTrace:
+    def __init__(self):
+        # One entry per model call or tool batch, in order
+        self.steps: List[Dict] = []
+        self.last_stats: Optional[GenerationStats] = None
+        # Set when the model still wanted tools after max_steps and was made to answer without them
+        self.step_limit_hit = False
+
+    def add_model_step(self, duration: float, stats: GenerationStats):
+        self.steps.append({"kind": "model", "duration": duration, "model": stats.model,
+                           "first_token": stats.first_token_latency})
+        self.last_stats = stats
+
+    def add_tool_step(self, duration: float, calls: List[Dict]):
+        self.steps.append({"kind": "tools", "duration": duration, "calls": calls})
+
+    @property
+    def model_time(self) -> float:
+        return sum(step["duration"] for step in self.steps if step["kind"] == "model")
+
+    @property
+    def tool_time(self) -> float:
+        return sum(step["duration"] for step in self.steps if step["kind"] == "tools")
+
+    @property
+    def tool_calls(self) -> int:
+        return sum(len(step["calls"]) for step in self.steps if step["kind"] == "tools")
+
+    def summary(self) -> str:
+        if not self.tool_calls:
+            return ""
+        summary = f"model {self.model_time:.1f} s · tools {self.tool_time:.1f} s ({self.tool_calls} calls)"
+        return summary + (" · step limit reached" if self.step_limit_hit else "")
+
+class AgentLoop:
+    def __init__(self, ollama_client: OllamaClient, servers: List[MCPServer], max_steps: int = 8,
+                 tool_timeout: float = 30.0, max_parallel_tools: int = 8, catalog: Optional[ToolCatalog] = None):
+        self.ollama_client = ollama_client
+        self.servers = servers
+        self.catalog = catalog or ToolCatalog()
+        self.tools: Optional[ToolView] = None
+        self.max_steps = max_steps
+        self.tool_timeout = tool_timeout
+        self.max_parallel_tools = max_parallel_tools
+
+    def run(self, messages: List[Dict], model: str = None, options: Optional[Dict] = None,
+            on_text: Optional[Callable[[str], None]] = None, on_tool: Optional[Callable[[str], None]] = None,
+            cancelled: Optional[Callable[[], bool]] = None, scope: Optional[RequestScope] = None) -> tuple:
+        # Resolved once per run, so tool calls go to this job's servers whatever other jobs refresh
+        self.tools = self.catalog.refresh(self.servers)
+        tools = self.tools.definitions
+        messages = list(messages)
+        trace = AgentTrace()
+        text = ""
+        for _ in range(self.max_steps):
+            tool_calls: List[Dict] = []
+            text = self._model_step(messages, model, options, tools, tool_calls, trace, on_text, cancelled, scope)
+            if not tool_calls or (cancelled and cancelled()):
+                break
+            messages.append({"role": "assistant", "content": text, "tool_calls": tool_calls})
+            messages.extend(self.run_tools(tool_calls, trace, on_tool))
+            # Stopped while the tools ran; the next model call would only be cut off
+            if cancelled and cancelled():
+                break
+        else:
+            # Out of steps with tool results the model hasn't seen: one last call, without tools, for the answer
+            trace.step_limit_hit = True
+            text = self._model_step(messages, model, options, None, [], trace, on_text, cancelled, scope)
+        return text, trace
+
+    def _model_step(self, messages: List[Dict], model: Optional[str], options: Optional[Dict],
+                    tools: Optional[List[Dict]], tool_calls: List[Dict], trace: AgentTrace,
+                    on_text: Optional[Callable[[str], None]], cancelled: Optional[Callable[[], bool]],
+                    scope: Optional[RequestScope]) -> str:
+        stats = GenerationStats(model or self.ollama_client.current_model)
+        pieces = []
+        started = time.perf_counter()
+        # Only the model call is in the scope; MCP connections opened meanwhile must survive an abort
+        with scope or nullcontext():
+            stream = self.ollama_client.stream_chat(messages, model, stats=stats, options=options,
+                                                    tools=tools or None, tool_calls=tool_calls)
+            try:
+                for piece in stream:
+                    if cancelled and cancelled():
+                        break
+                    pieces.append(piece)
+                    if on_text:
+                        on_text(piece)
+            finally:
+                stream.close()
+        trace.add_model_step(time.perf_counter() - started, stats)
+        return "".join(pieces)
+
+    def run_tools(self, tool_calls: List[Dict], trace: AgentTrace,
+                  on_tool: Optional[Callable[[str], None]] = None) -> List[Dict]:
+        # Calls in one turn are independent, so they all run at once
+        started = time.perf_counter()
+        workers = max(1, min(len(tool_calls), self.max_parallel_tools))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool") as pool:
+            outcomes = list(pool.map(self.call_tool, tool_calls))
+        calls = []
+        results = []
+        for name, content, duration, ok in outcomes:
+            calls.append({"name": name, "duration": duration, "ok": ok})
+            results.append({"role": "tool", "content": content, "tool_name": name})
+            if on_tool:
+                on_tool(f"\n[{name}: {'ok' if ok else 'failed'}, {duration * 1000:.0f} ms]\n")
+        trace.add_tool_step(time.perf_counter() - started, calls)
+        return results
+
+    def call_tool(self, call: Dict) -> tuple:
+        function = call.get("function", {})
+        name = function.get("name", "")
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                arguments = {}
+        started = time.perf_counter()
+        entry = self.tools.resolve(name) if self.tools is not None else None
+        if entry is None:
+            return name, f"Error: unknown tool {name}", 0.0, False
+        try:
+            result = entry.server.call_tool(entry.tool_name, arguments, timeout=self.tool_timeout)
+        except MCPError as e:
+            return name, f"Error: {e}", time.perf_counter() - started, False
+        parts = []
+        for item in result.get("content", []):
+            if item.get("type") == "text":
+                parts.append(item.get("text", ""))
+            else:
+                parts.append(json.dumps(item))
+        content = "\n".join(parts)
+        ok = not result.get("isError")
+        return name, content if ok else f"Error: {content}", time.perf_counter() - started, ok
@@ -0,0 +1,136 @@
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Iterator
+
+from .ollama import GenerationStats, OllamaClient, ResponseCache
+from .router import create_ollama_client
+from .transport import HTTPTransport
+
+def read_batch_items(lines) -> Iterator[Dict]:
+    # Each line is a JSON object with at least "prompt" or "messages", or just plain prompt text
+    for index, line in enumerate(line for line in lines if line.strip()):
+        line = line.strip()
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = None
+        if not isinstance(item, dict):
+            item = {"prompt": line}
+        item.setdefault("id", index)
+        item["index"] = index
+        yield item
+
+def run_batch_item(ollama_client: OllamaClient, item: Dict) -> Dict:
+    model = item.get("model") or ollama_client.current_model
+    stats = GenerationStats(model)
+    if item.get("messages"):
+        stream = ollama_client.stream_chat(item["messages"], model, stats=stats, options=item.get("options"))
+    else:
+        stream = ollama_client.stream_response(item.get("prompt", ""), model, stats=stats)
+    text = "".join(stream)
+    result = {"id": item["id"], "index": item["index"], "model": model}
+    # The stream flags its own failures; a reply that merely starts with "Error:" is still a reply
+    if stats.error is not None:
+        result["error"] = stats.error
+    else:
+        result["response"] = text
+    result.update({
+        "first_token_ms": round(stats.first_token_latency * 1000, 1) if stats.first_token_latency is not None else None,
+        "tokens_per_second": round(stats.tokens_per_second, 2) if stats.tokens_per_second else None,
+        "total_s": round(stats.total_time, 3) if stats.total_time is not None else None,
+        "eval_count": stats.eval_count,
+        "prompt_eval_count": stats.prompt_eval_count,
+        "cached": stats.cached,
+    })
+    return result
+
+def run_batch(ollama_client: OllamaClient, items: Iterator[Dict], output, concurrency: int = 4,
+              ordered: bool = False) -> Dict[str, int]:
+    # Results are written as they finish; with ordered=True they're held back until their turn
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    lock = threading.Lock()
+    # Limits how far reading runs ahead of the last result written, so huge inputs aren't loaded at once
+    # and, when ordered, a slow item can't make the results held behind it pile up
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    held: Dict[int, Dict] = {}
+    counts = {"total": 0, "errors": 0}
+    next_index = [0]
+
+    output_open = [True]
+
+    def write(result: Dict):
+        # A closed pipe (e.g. piped into head) just stops the output
+        if not output_open[0]:
+            return
+        try:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+        except OSError:
+            output_open[0] = False
+
+    def finish(item: Dict, future: Future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"id": item["id"], "index": item["index"], "error": f"Error: {e}"}
+        # Unordered, an item gives its slot back when it finishes; ordered, only once it has been written
+        written = 0
+        try:
+            with lock:
+                counts["total"] += 1
+                if "error" in result:
+                    counts["errors"] += 1
+                if not ordered:
+                    write(result)
+                else:
+                    held[result["index"]] = result
+                    while next_index[0] in held:
+                        write(held.pop(next_index[0]))
+                        next_index[0] += 1
+                        written += 1
+        finally:
+            for _ in range(written if ordered else 1):
+                slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        for item in items:
+            slots.acquire()
+            future = pool.submit(run_batch_item, ollama_client, item)
+            future.add_done_callback(lambda f, item=item: finish(item, f))
+    return counts
+
+def batch_main(args) -> int:
+    options = {}
+    if args.seed is not None:
+        options["seed"] = args.seed
+    if args.temperature is not None:
+        options["temperature"] = args.temperature
+    cache = ResponseCache(path=args.cache) if args.cache else None
+    # Several comma-separated URLs spread the prompts over those hosts
+    ollama_client = create_ollama_client(
+        args.url,
+        max_concurrency=args.per_host,
+        transport=HTTPTransport(pool_size=max(args.concurrency, 10)),
+        keep_alive=args.keep_alive,
+        cache=cache,
+        options=options
+    )
+    ollama_client.current_model = args.model
+    source = open(args.input, "r", encoding="utf-8") if args.input and args.input != "-" else sys.stdin
+    output = open(args.output, "w", encoding="utf-8") if args.output and args.output != "-" else sys.stdout
+    started = time.perf_counter()
+    try:
+        counts = run_batch(ollama_client, read_batch_items(source), output, args.concurrency, args.ordered)
+    finally:
+        ollama_client.close()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    print(f"{counts['total']} prompts, {counts['errors']} errors in {elapsed:.1f} s", file=sys.stderr)
+    return 1 if counts["errors"] else 0
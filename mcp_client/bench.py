@@ -0,0 +1,653 @@
+import json
+import operator
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .discovery import DiscoveryCache, ServerDiscovery
+from .health import HealthMonitor
+from .lifecycle import ModelLifecycle
+from .mcp import MCPServer
+from .metrics import METRICS
+from .mocks import MockMCPServer, MockOllamaServer, start_mcp_servers
+from .ollama import Conversation, GenerationStats, OllamaClient
+from .prefill import PromptPrefill
+from .registry import ServerRegistry
+from .router import OllamaRouter
+from .scheduler import RequestScheduler
+from .store import ConversationStore
+from .transport import HTTPTransport
+from .updates import UIUpdateScheduler
+
+SCENARIOS = ["generate", "router", "warmup", "prefill", "discovery", "health", "mcp_tools", "compare", "chat_render", "ui_updates", "store", "embeddings"]
+
+def percentiles(values: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    # Summarizes seconds as milliseconds by default
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(pct: float) -> float:
+        return round(ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)] * scale, 3)
+
+    return {"p50": pick(50), "p95": pick(95), "max": round(ordered[-1] * scale, 3)}
+
+def bench_generate(requests_count: int = 50, concurrency: int = 4, tokens: int = 64,
+                   token_rate: float = 200.0, latency: float = 0.05) -> Dict:
+    with MockOllamaServer(token_rate=token_rate, latency=latency, tokens=tokens) as mock:
+        client = OllamaClient(mock.url, transport=HTTPTransport(pool_size=max(concurrency, 10)), keep_alive=None)
+        model = mock.models[0]
+        results = {"requests": requests_count, "concurrency": concurrency,
+                   "mock": {"tokens": tokens, "token_rate": token_rate, "latency_ms": latency * 1000}}
+
+        # Non-streaming generate_response: whole replies per second
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            replies = list(pool.map(lambda _: client.generate_response("benchmark", model), range(requests_count)))
+        elapsed = time.perf_counter() - started
+        results["generate_response"] = {
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(requests_count / elapsed, 2),
+            "errors": sum(1 for reply in replies if reply.startswith("Error:")),
+        }
+
+        # Streaming: time to first token and client-side token rate
+        def stream(_) -> GenerationStats:
+            stats = GenerationStats(model)
+            for _ in client.stream_response("benchmark", model, stats=stats):
+                pass
+            return stats
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            all_stats = list(pool.map(stream, range(requests_count)))
+        elapsed = time.perf_counter() - started
+        rates = [stats.eval_count / (stats.total_time - stats.first_token_latency)
+                 for stats in all_stats
+                 if stats.total_time and stats.first_token_latency is not None
+                 and stats.total_time > stats.first_token_latency]
+        results["stream_response"] = {
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(requests_count / elapsed, 2),
+            "first_token_ms": percentiles([stats.first_token_latency for stats in all_stats
+                                           if stats.first_token_latency is not None]),
+            "client_tokens_per_second": percentiles(rates, scale=1.0),
+            "errors": sum(1 for stats in all_stats if stats.end_time is None),
+        }
+        client.transport.close()
+    return results
+
+def bench_router(host_counts: List[int], requests_count: int = 40, per_host: int = 2, tokens: int = 64,
+                 token_rate: float = 200.0, latency: float = 0.05) -> Dict:
+    # Each mock host only generates per_host replies at once, like a real GPU box
+    results = {}
+    for host_count in host_counts:
+        mocks = [MockOllamaServer(token_rate=token_rate, latency=latency, tokens=tokens, parallel=per_host).start()
+                 for _ in range(host_count)]
+        client = OllamaRouter([mock.url for mock in mocks], max_concurrency=per_host,
+                              transport=HTTPTransport(pool_size=max(per_host, 10)), keep_alive=None)
+        model = mocks[0].models[0]
+
+        def stream(_) -> GenerationStats:
+            stats = GenerationStats(model)
+            for _ in client.stream_response("benchmark", model, stats=stats):
+                pass
+            return stats
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=client.capacity) as pool:
+                all_stats = list(pool.map(stream, range(requests_count)))
+            elapsed = time.perf_counter() - started
+            served = [host["served"] for host in client.status()]
+        finally:
+            client.close()
+            client.transport.close()
+            for mock in mocks:
+                mock.stop()
+        results[str(host_count)] = {
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(requests_count / elapsed, 2),
+            "first_token_ms": percentiles([stats.first_token_latency for stats in all_stats
+                                           if stats.first_token_latency is not None]),
+            "served_per_host": served,
+            "errors": sum(1 for stats in all_stats if stats.end_time is None),
+        }
+    return results
+
+def bench_warmup(load_time: float = 2.0, tokens: int = 16, token_rate: float = 200.0, latency: float = 0.05) -> Dict:
+    # First-message latency when the model has to load, and when it was preloaded on selection
+    def first_token(client: OllamaClient, model: str) -> Optional[float]:
+        stats = GenerationStats(model)
+        for _ in client.stream_response("benchmark", model, stats=stats):
+            pass
+        return stats.first_token_latency
+
+    results = {"mock_load_ms": load_time * 1000}
+    with MockOllamaServer(token_rate=token_rate, latency=latency, tokens=tokens, load_time=load_time) as mock:
+        model = mock.models[0]
+        client = OllamaClient(mock.url, transport=HTTPTransport(), keep_alive=None)
+        client.available_models = list(mock.models)
+        cold = first_token(client, model)
+        warm = first_token(client, model)
+
+        mock.loaded.clear()
+        lifecycle = ModelLifecycle(client, usage_path=os.devnull)
+        started = time.perf_counter()
+        lifecycle.activate(model)
+        while lifecycle.state_of(model) == "loading":
+            time.sleep(0.01)
+        preload_time = time.perf_counter() - started
+        preloaded = first_token(client, model)
+        lifecycle.stop()
+        client.transport.close()
+    results.update({
+        "cold_first_token_ms": round(cold * 1000, 3) if cold is not None else None,
+        "warm_first_token_ms": round(warm * 1000, 3) if warm is not None else None,
+        "preload_ms": round(preload_time * 1000, 3),
+        "preloaded_first_token_ms": round(preloaded * 1000, 3) if preloaded is not None else None,
+    })
+    return results
+
+def bench_compare(models: int = 4, tokens: int = 64, token_rate: float = 200.0, latency: float = 0.05) -> Dict:
+    # One prompt to several models: the wall time should track the slowest model, not the sum
+    names = [f"mock{index}:latest" for index in range(models)]
+    with MockOllamaServer(token_rate=token_rate, latency=latency, tokens=tokens, models=names) as mock:
+        client = OllamaClient(mock.url, transport=HTTPTransport(pool_size=max(models, 10)), keep_alive=None)
+        scheduler = RequestScheduler(client, max_workers=1)
+
+        def wait(jobs) -> float:
+            started = time.perf_counter()
+            remaining = {job.job_id for job in jobs}
+            while remaining:
+                for kind, job, _ in scheduler.poll():
+                    if kind in ("done", "cancelled"):
+                        remaining.discard(job.job_id)
+                time.sleep(0.005)
+            return time.perf_counter() - started
+
+        try:
+            jobs = scheduler.submit_group("benchmark", names)
+            fan_out = wait(jobs)
+            totals = [job.stats.total_time for job in jobs if job.stats and job.stats.total_time]
+            sequential = sum(wait([scheduler.submit("benchmark", name)]) for name in names)
+            # With a limit of one per model, the same model asked N times runs one request at a time
+            scheduler.set_model_limits(1)
+            limited = wait(scheduler.submit_group("benchmark", [names[0]] * models))
+            return {
+                "models": models,
+                "fan_out_s": round(fan_out, 3),
+                "slowest_model_s": round(max(totals), 3) if totals else None,
+                "sequential_s": round(sequential, 3),
+                "same_model_limited_s": round(limited, 3),
+            }
+        finally:
+            scheduler.shutdown()
+            client.transport.close()
+
+def bench_prefill(turns: int = 3, history_chars: int = 8000, prompt_rate: float = 4000.0, tokens: int = 16,
+                  token_rate: float = 200.0, latency: float = 0.05) -> Dict:
+    # A long chat continued turn by turn, with and without processing each message while it is typed.
+    # The mock evaluates only the part of a prompt its cache doesn't hold, at prompt_rate characters/s.
+    rng = random.Random(0)
+    words = ["model", "server", "tool", "request", "latency", "cache", "token", "stream", "context", "reply"]
+    history = []
+    while sum(len(message["content"]) for message in history) < history_chars:
+        history.append({"role": "user" if len(history) % 2 == 0 else "assistant",
+                        "content": " ".join(rng.choices(words, k=60))})
+    drafts = [" ".join(rng.choices(words, k=30)) for _ in range(turns)]
+    results = {"turns": turns, "history_chars": history_chars, "mock_prompt_chars_per_second": prompt_rate}
+    for mode in ("off", "on"):
+        with MockOllamaServer(token_rate=token_rate, latency=latency, tokens=tokens, prompt_rate=prompt_rate) as mock:
+            client = OllamaClient(mock.url, transport=HTTPTransport(pool_size=4), keep_alive=None)
+            scheduler = RequestScheduler(client, max_workers=1)
+            prefill = PromptPrefill(client, min_interval=0.0)
+            if mode == "on":
+                scheduler.prefill = prefill
+            conversation = Conversation(context_window=32768)
+            conversation.restore(history)
+            first_tokens = []
+            try:
+                for draft in drafts:
+                    if mode == "on":
+                        # The user pauses twice while typing; each pause prefills what is there so far
+                        for end in (len(draft) // 3, 2 * len(draft) // 3):
+                            prefill.request(conversation.draft_messages(draft[:end]), mock.models[0],
+                                            conversation.options())
+                            while prefill.running:
+                                time.sleep(0.005)
+                    conversation.add_user(draft)
+                    job = scheduler.submit(draft, mock.models[0], conversation=conversation)
+                    done = False
+                    while not done:
+                        done = any(kind in ("done", "cancelled") for kind, _, _ in scheduler.poll())
+                        time.sleep(0.005)
+                    conversation.add_assistant(job.text, job.stats)
+                    first_tokens.append(job.stats.first_token_latency)
+            finally:
+                scheduler.shutdown()
+                client.transport.close()
+            stats = prefill.stats()
+            results[mode] = {
+                "first_token_ms": percentiles(first_tokens),
+                "prefills": stats["completed"],
+                "estimated_saved_ms": round(stats["saved_seconds"] * 1000, 1),
+            }
+    return results
+
+def bench_discovery(port_counts: List[int], port_base: int = 20000, servers: int = 10,
+                    concurrency: int = 256, timeout: float = 120.0) -> Dict:
+    # A first start has to sweep; a second one lists the cached servers at once and only re-checks them
+    results = {}
+    for port_count in port_counts:
+        port_range = (port_base, port_base + port_count)
+        mocks = start_mcp_servers(port_range, min(servers, port_count))
+        runs = []
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for _ in range(2):
+                    discovery = ServerDiscovery(cache=DiscoveryCache(os.path.join(directory, "cache.json")),
+                                                config_path=os.path.join(directory, "servers.json"))
+                    try:
+                        discovery.start_discovery(port_range, hosts=["127.0.0.1"], concurrency=concurrency,
+                                                  mdns=False)
+                        deadline = time.monotonic() + timeout
+                        while time.monotonic() < deadline:
+                            if "revalidated_seconds" in discovery.startup:
+                                # A fallback sweep runs only when none of the cached servers answered
+                                if not discovery.startup["fallback_scan"] or discovery.last_sweep:
+                                    break
+                            time.sleep(0.01)
+                    finally:
+                        discovery.stop_discovery()
+                    runs.append(discovery)
+        finally:
+            for mock in mocks:
+                mock.stop()
+        first, second = runs
+        sweep = first.last_sweep
+        results[str(port_count)] = {
+            "mock_servers": len(mocks),
+            "found": len(first.discovered_servers),
+            "seconds": round(sweep["duration"], 3) if sweep else None,
+            "probes_per_second": round(sweep["probes_per_second"], 1) if sweep else None,
+            "cached_start": {
+                "listed": second.startup["cached_servers"],
+                "listed_ms": round(second.startup["cached_seconds"] * 1000, 3),
+                "revalidated_ms": round(second.startup.get("revalidated_seconds", 0) * 1000, 3),
+                "online": sum(1 for server in second.discovered_servers if server.status == "online"),
+                "swept": bool(second.last_sweep),
+            },
+        }
+    return results
+
+def bench_health(servers: int = 50, workers: int = 16, rounds: int = 3, latency: float = 0.01,
+                 timeout: float = 60.0) -> Dict:
+    mocks = [MockMCPServer(latency=latency).start() for _ in range(servers)]
+    registry = ServerRegistry()
+    for index, mock in enumerate(mocks):
+        registry.add(MCPServer(f"Mock {index}", mock.url))
+    monitor = HealthMonitor(registry, base_interval=3600, max_workers=workers)
+    round_times = []
+    try:
+        monitor.start()
+        for round_index in range(rounds):
+            started = time.perf_counter()
+            if round_index:
+                for server in registry:
+                    monitor.check_now(server)
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if all(len(monitor.health_for(server).latencies) > round_index for server in registry):
+                    break
+                time.sleep(0.005)
+            round_times.append(time.perf_counter() - started)
+    finally:
+        monitor.stop()
+        for mock in mocks:
+            mock.stop()
+    latencies = [latency for server in registry for latency in monitor.health_for(server).latencies]
+    return {
+        "servers": servers,
+        "workers": workers,
+        "mock_latency_ms": latency * 1000,
+        "round_seconds": [round(elapsed, 3) for elapsed in round_times],
+        "probe_ms": percentiles(latencies),
+        "online": sum(1 for server in registry if server.status == "online"),
+    }
+
+def bench_mcp_tools(calls: int = 200, concurrency: int = 8) -> Dict:
+    with MockMCPServer() as mock:
+        server = MCPServer("Mock", mock.url, transport=HTTPTransport(pool_size=max(concurrency, 10)))
+        started = time.perf_counter()
+        session = server.connect(timeout=10)
+        connect_time = time.perf_counter() - started
+
+        def call(index: int) -> float:
+            call_started = time.perf_counter()
+            session.call_tool("echo", {"text": str(index)}, timeout=10)
+            return time.perf_counter() - call_started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(call, range(calls)))
+        elapsed = time.perf_counter() - started
+        server.disconnect()
+        server.transport.close()
+    return {
+        "calls": calls,
+        "concurrency": concurrency,
+        "connect_ms": round(connect_time * 1000, 3),
+        "calls_per_second": round(calls / elapsed, 1),
+        "call_ms": percentiles(latencies),
+    }
+
+def bench_chat_render(messages: int = 5000, scroll_steps: int = 200, stream_chunks: int = 200) -> Dict:
+    # Needs a display; without one the scenario is reported as skipped
+    try:
+        from .gui import ChatHistoryView, ctk
+        root = ctk.CTk()
+    except Exception as e:
+        return {"skipped": str(e)}
+    try:
+        root.geometry("800x600")
+        view = ChatHistoryView(root)
+        view.pack(fill="both", expand=True)
+        root.update()
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for index in range(messages):
+            view.add_message("message " * rng.randint(1, 60), is_user=index % 2 == 0)
+        root.update()
+        load_time = time.perf_counter() - started
+
+        scroll_frames = []
+        for _ in range(scroll_steps):
+            view.scroll_to(rng.randrange(messages))
+            frame_started = time.perf_counter()
+            root.update()
+            scroll_frames.append(time.perf_counter() - frame_started)
+
+        view.scroll_to(messages)
+        root.update()
+        index = view.add_message("", is_user=False)
+        stream_frames = []
+        for _ in range(stream_chunks):
+            view.append_text(index, " token")
+            frame_started = time.perf_counter()
+            root.update()
+            stream_frames.append(time.perf_counter() - frame_started)
+        return {
+            "messages": messages,
+            "load_ms": round(load_time * 1000, 3),
+            "scroll_frame_ms": percentiles(scroll_frames),
+            "stream_frame_ms": percentiles(stream_frames),
+            "widgets": len(view.slots),
+        }
+    finally:
+        root.destroy()
+
+class FrameLoop:
+    # Just enough of Tk's after() to drive the UI update scheduler without a display
+    def __init__(self):
+        self.due = None
+        self.callback = None
+
+    def after(self, ms: int, callback):
+        self.due = time.perf_counter() + ms / 1000
+        self.callback = callback
+        return "frame"
+
+    def after_cancel(self, after_id):
+        self.callback = None
+
+    def run(self, seconds: float):
+        end = time.perf_counter() + seconds
+        while self.callback is not None and time.perf_counter() < end:
+            time.sleep(max(self.due - time.perf_counter(), 0))
+            self.callback()
+
+def bench_ui_updates(streams: int = 4, token_rate: float = 100.0, server_events: float = 200.0,
+                     seconds: float = 2.0, widget_cost: float = 0.0005, max_fps: float = 30.0) -> Dict:
+    # Streams and server events posted from worker threads; each applied update stands in for a widget redraw
+    loop = FrameLoop()
+    updates = UIUpdateScheduler(loop, max_fps=max_fps)
+    stop = threading.Event()
+
+    def redraw(value=None):
+        time.sleep(widget_cost)
+
+    def stream(index: int):
+        next_token = time.perf_counter()
+        while not stop.is_set():
+            updates.post(("reply", index), redraw, " token", merge=operator.add)
+            next_token += 1.0 / token_rate
+            time.sleep(max(next_token - time.perf_counter(), 0))
+
+    def servers():
+        next_event = time.perf_counter()
+        while not stop.is_set():
+            updates.post(("server_list",), redraw)
+            next_event += 1.0 / server_events
+            time.sleep(max(next_event - time.perf_counter(), 0))
+
+    workers = [threading.Thread(target=stream, args=(index,)) for index in range(streams)]
+    workers.append(threading.Thread(target=servers))
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    updates.start()
+    loop.run(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    updates.stop()
+    stats = updates.stats()
+    return {
+        "events": stats["posted"],
+        "events_per_second": round(stats["posted"] / seconds, 1),
+        "redraws": stats["applied"],
+        "merged": stats["merged"],
+        "dropped": stats["dropped"],
+        "frames_per_second": round(stats["frames"] / seconds, 1),
+        "frame_ms": percentiles(list(updates.frame_times)),
+        # What redrawing once per event would cost the UI thread every second
+        "per_event_redraw_ms_per_second": round(stats["posted"] / seconds * widget_cost * 1000, 1),
+    }
+
+def bench_store(messages: int = 200000, per_conversation: int = 1000, queries: int = 50, pages: int = 50) -> Dict:
+    # Search and paging over a large history, plus the cost of saving one message from the UI thread
+    rng = random.Random(0)
+    words = ["model", "server", "tool", "python", "request", "latency", "cache", "token", "stream", "query",
+             "error", "window", "thread", "socket", "index", "search", "prompt", "context", "reply", "agent"]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ConversationStore(os.path.join(directory, "conversations.sqlite3"))
+        try:
+            started = time.perf_counter()
+            conversation_ids = []
+            for offset in range(0, messages, per_conversation):
+                conversation_id = store.create_conversation(f"chat {offset // per_conversation}", "bench")
+                conversation_ids.append(conversation_id)
+                rows = [(conversation_id, "user" if index % 2 == 0 else "assistant",
+                         " ".join(rng.choices(words, k=30)) + f" marker{offset + index}", time.time())
+                        for index in range(min(per_conversation, messages - offset))]
+                with store.lock:
+                    store.db.executemany(
+                        "INSERT INTO messages (conversation_id, role, content, created) VALUES (?, ?, ?, ?)", rows
+                    )
+                    store.db.commit()
+            fill_time = time.perf_counter() - started
+
+            saves = []
+            for index in range(100):
+                save_started = time.perf_counter()
+                store.add_message(conversation_ids[-1], "user", f"saved message {index}", model="bench")
+                saves.append(time.perf_counter() - save_started)
+
+            # Common words match nearly every message; markers match exactly one
+            searches = {"common": [], "rare": [], "prefix": []}
+            for _ in range(queries):
+                for kind, text in (("common", rng.choice(words)),
+                                   ("rare", f"marker{rng.randrange(messages)}"),
+                                   ("prefix", f"{rng.choice(words)} {rng.choice(words)[:3]}")):
+                    search_started = time.perf_counter()
+                    store.search(text, limit=50)
+                    searches[kind].append(time.perf_counter() - search_started)
+
+            page_times = []
+            for _ in range(pages):
+                conversation_id = rng.choice(conversation_ids)
+                page_started = time.perf_counter()
+                page = store.load_page(conversation_id, limit=100)
+                while page:
+                    page = store.load_page(conversation_id, before_id=page[0]["id"], limit=100)
+                page_times.append((time.perf_counter() - page_started) / (per_conversation / 100 + 1))
+            return {
+                "messages": messages,
+                "fts": store.fts,
+                "fill_s": round(fill_time, 3),
+                "save_ms": percentiles(saves),
+                "search_ms": {kind: percentiles(values) for kind, values in searches.items()},
+                "page_ms": percentiles(page_times),
+            }
+        finally:
+            store.close()
+
+def bench_embeddings(chunks: int = 100000, dims: tuple = (768, 256), queries: int = 50,
+                     indexed_texts: int = 2000) -> Dict:
+    # Top-k over a large index, and how fast texts go through /api/embed in batches
+    try:
+        import numpy as np
+        from .embeddings import EmbeddingIndex
+    except ImportError as e:
+        return {"skipped": str(e)}
+    rng = np.random.default_rng(0)
+    results = {"chunks": chunks}
+    with MockOllamaServer() as mock, tempfile.TemporaryDirectory() as directory:
+        client = OllamaClient(mock.url, keep_alive=None)
+        for dim in dims:
+            index = EmbeddingIndex(client, f"bench-{dim}", directory=os.path.join(directory, str(dim)))
+            for start in range(0, chunks, 10000):
+                count = min(10000, chunks - start)
+                index._append(rng.standard_normal((count, dim), dtype=np.float32),
+                              [{"source": "bench", "ref": start + row, "text": ""} for row in range(count)])
+            timings = []
+            for _ in range(queries):
+                query = rng.standard_normal(dim, dtype=np.float32)
+                started = time.perf_counter()
+                index.search_vector(query, 5)
+                timings.append(time.perf_counter() - started)
+            results[f"search_{dim}d_ms"] = percentiles(timings)
+            index.close()
+
+        index = EmbeddingIndex(client, "bench-mock", directory=os.path.join(directory, "mock"))
+        words = ["model", "server", "tool", "python", "request", "latency", "cache", "token", "stream", "query"]
+        started = time.perf_counter()
+        for number in range(indexed_texts):
+            index.submit(" ".join(rng.choice(words, 20)), "bench", number)
+        while len(index) < indexed_texts and time.perf_counter() - started < 60:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        results["indexing"] = {"texts": len(index), "texts_per_second": round(len(index) / elapsed, 1)}
+        index.close()
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def run_benchmarks(args) -> Dict:
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    # Runs with and without --metrics show what the instrumentation costs
+    METRICS.enabled = args.metrics
+    report = {
+        "commit": git_commit(),
+        "metrics": args.metrics,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": {},
+    }
+    for name in scenarios:
+        print(f"Running {name}...", file=sys.stderr)
+        if name == "generate":
+            result = bench_generate(args.requests, args.concurrency, args.tokens, args.token_rate, args.latency)
+        elif name == "router":
+            host_counts = [int(count) for count in args.hosts.split(",")]
+            result = bench_router(host_counts, args.requests, args.per_host, args.tokens, args.token_rate, args.latency)
+        elif name == "warmup":
+            result = bench_warmup(args.load_time, args.tokens, args.token_rate, args.latency)
+        elif name == "prefill":
+            result = bench_prefill(token_rate=args.token_rate, latency=args.latency)
+        elif name == "discovery":
+            port_counts = [int(count) for count in args.ports.split(",")]
+            result = bench_discovery(port_counts, args.port_base, args.mcp_servers)
+        elif name == "health":
+            result = bench_health(args.health_servers, args.health_workers)
+        elif name == "mcp_tools":
+            result = bench_mcp_tools(args.requests * 4, args.concurrency)
+        elif name == "compare":
+            result = bench_compare(args.compare_models, args.tokens, args.token_rate, args.latency)
+        elif name == "chat_render":
+            result = bench_chat_render(args.messages)
+        elif name == "ui_updates":
+            result = bench_ui_updates()
+        elif name == "embeddings":
+            result = bench_embeddings()
+        elif name == "store":
+            result = bench_store(args.stored_messages)
+        else:
+            result = {"skipped": f"unknown scenario (choose from {', '.join(SCENARIOS)})"}
+        report["scenarios"][name] = result
+    return report
+
+def flatten(result, prefix: str = "") -> Dict[str, float]:
+    values = {}
+    if isinstance(result, dict):
+        for key, value in result.items():
+            values.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(result, (int, float)) and not isinstance(result, bool):
+        values[prefix] = result
+    return values
+
+def compare_reports(baseline: Dict, current: Dict) -> List[str]:
+    # One line per numeric metric that changed between the reports, with the relative change
+    old = flatten(baseline.get("scenarios", {}))
+    new = flatten(current.get("scenarios", {}))
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] == new[key]:
+            continue
+        if old[key]:
+            change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%"
+        else:
+            change = "n/a"
+        lines.append(f"{key}: {old[key]} -> {new[key]} ({change})")
+    return lines
+
+def bench_main(args) -> int:
+    report = run_benchmarks(args)
+    text = json.dumps(report, indent=2)
+    if args.output and args.output != "-":
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('commit') or args.compare}:", file=sys.stderr)
+        for line in compare_reports(baseline, report):
+            print(f"  {line}", file=sys.stderr)
+    return 0
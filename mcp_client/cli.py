@@ -0,0 +1,62 @@
+import argparse
+from typing import List, Optional
+
+def positive_int(text: str) -> int:
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="Py_MCP_Client", description="MCP Client")
+    commands = parser.add_subparsers(dest="command")
+    batch = commands.add_parser("batch", help="Run prompts from a JSONL file or stdin without the GUI")
+    batch.add_argument("input", nargs="?", default="-", help="JSONL or plain-text prompt file (default: stdin)")
+    batch.add_argument("-o", "--output", default="-", help="Where to write JSONL results (default: stdout)")
+    batch.add_argument("-m", "--model", help="Model for items that don't name one")
+    batch.add_argument("-c", "--concurrency", type=positive_int, default=4, help="Prompts in flight at once")
+    batch.add_argument("--ordered", action="store_true", help="Write results in input order")
+    batch.add_argument("--url", default="http://localhost:11434", help="Ollama base URL, or several separated by commas")
+    batch.add_argument("--per-host", type=positive_int, default=2, help="Requests in flight per Ollama host")
+    batch.add_argument("--keep-alive", default="30m", help="Ollama keep_alive for the model")
+    batch.add_argument("--seed", type=int, help="Sampling seed")
+    batch.add_argument("--temperature", type=float, help="Sampling temperature")
+    batch.add_argument("--cache", help="SQLite file for the response cache")
+    bench = commands.add_parser("bench", help="Benchmark against local mock Ollama and MCP servers")
+    bench.add_argument("-o", "--output", default="-", help="Where to write the JSON report (default: stdout)")
+    bench.add_argument("--compare", help="Earlier JSON report to compare against")
+    bench.add_argument("--scenarios", default="generate,router,warmup,prefill,discovery,health,mcp_tools,compare,chat_render,ui_updates,store,embeddings",
+                       help="Comma-separated scenarios to run")
+    bench.add_argument("--requests", type=int, default=50, help="Generate requests per run")
+    bench.add_argument("-c", "--concurrency", type=int, default=4, help="Requests in flight at once")
+    bench.add_argument("--tokens", type=int, default=64, help="Tokens per mock reply")
+    bench.add_argument("--token-rate", type=float, default=200.0, help="Mock tokens per second")
+    bench.add_argument("--latency", type=float, default=0.05, help="Mock time to first token in seconds")
+    bench.add_argument("--load-time", type=float, default=2.0, help="Mock model load time in seconds")
+    bench.add_argument("--hosts", default="1,2,4", help="Comma-separated Ollama host counts for the router")
+    bench.add_argument("--per-host", type=int, default=2, help="Replies each mock Ollama host generates at once")
+    bench.add_argument("--ports", default="100,1000,10000", help="Comma-separated discovery sweep sizes")
+    bench.add_argument("--port-base", type=int, default=20000, help="First port of the discovery sweep")
+    bench.add_argument("--mcp-servers", type=int, default=10, help="Mock MCP servers spread over each sweep")
+    bench.add_argument("--health-servers", type=int, default=50, help="Servers in the health-check fan-out")
+    bench.add_argument("--health-workers", type=int, default=16, help="Health-check worker threads")
+    bench.add_argument("--compare-models", type=int, default=4, help="Models sent the same prompt at once")
+    bench.add_argument("--messages", type=int, default=5000, help="Messages in the chat rendering scenario")
+    bench.add_argument("--stored-messages", type=int, default=200000,
+                       help="Messages saved before timing search in the store scenario")
+    bench.add_argument("--metrics", action="store_true", help="Record metrics while benchmarking")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "batch":
+        from .batch import batch_main
+        return batch_main(args)
+    if args.command == "bench":
+        from .bench import bench_main
+        return bench_main(args)
+    # The GUI (and customtkinter) is only imported when it is actually started
+    from .gui import MCPClient
+    app = MCPClient()
+    app.mainloop()
+    return 0
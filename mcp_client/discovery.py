@@ -0,0 +1,429 @@
+import asyncio
+import ipaddress
+import itertools
+import json
+import os
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from . import APP_DIR
+from .mcp import MCPServer
+from .metrics import METRICS
+from .registry import ServerRegistry
+from .transport import HTTPTransport
+
+# DNS-SD service type MCP servers advertise themselves under
+MDNS_SERVICE_TYPE = "_mcp._tcp.local."
+# Largest network a sweep takes, a /16; every sweep probes each address on every port in the range
+MAX_SCAN_ADDRESSES = 65536
+
+def server_to_entry(server: MCPServer) -> Dict:
+    entry = {"name": server.name, "url": server.url, "transport": server.mcp_transport}
+    if server.command:
+        entry["command"] = server.command
+    if server.mcp_path != "/mcp":
+        entry["path"] = server.mcp_path
+    return entry
+
+def server_from_entry(entry: Dict, name: Optional[str] = None) -> Optional[MCPServer]:
+    # Cache entries, servers.json entries and "mcpServers" entries (command + args, or url) alike
+    name = entry.get("name") or name
+    command = entry.get("command")
+    if isinstance(command, str):
+        command = shlex.split(command) + [str(arg) for arg in entry.get("args", [])]
+    if command:
+        return MCPServer(name or command[0], "", command=list(command))
+    url = entry.get("url")
+    if not url:
+        return None
+    transport = entry.get("transport") or entry.get("type") or "http"
+    if transport not in MCPServer.TRANSPORTS:
+        transport = "http"
+    return MCPServer(name or url, url, mcp_transport=transport, mcp_path=entry.get("path") or "/mcp")
+
+class DiscoveryCache:
+    # Every server discovery has found, with where and when it was last seen, so the next start needn't search
+    def __init__(self, path: Optional[str] = None, max_age: float = 30 * 24 * 3600):
+        self.path = path or os.path.join(APP_DIR, "discovered_servers.json")
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # server key -> server entry plus "source", "first_seen" and "last_seen"
+        self.data: Dict[str, Dict] = self._load()
+        self.dirty = False
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        # Servers that haven't been seen for a long time are forgotten
+        cutoff = time.time() - self.max_age
+        return {key: entry for key, entry in data.items()
+                if isinstance(entry, dict) and entry.get("last_seen", 0) >= cutoff}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            data = dict(self.data)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Write then rename so a crash never leaves a half-written cache
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def servers(self) -> List[MCPServer]:
+        # Most recently seen first
+        with self.lock:
+            entries = sorted(self.data.values(), key=lambda entry: entry.get("last_seen", 0), reverse=True)
+        servers = [server_from_entry(entry) for entry in entries]
+        return [server for server in servers if server is not None]
+
+    def source_of(self, server: MCPServer) -> Optional[str]:
+        with self.lock:
+            return self.data.get(server.key, {}).get("source")
+
+    def seen(self, server: MCPServer, source: str):
+        now = time.time()
+        with self.lock:
+            entry = self.data.get(server.key)
+            if entry is None:
+                entry = self.data[server.key] = {"first_seen": now}
+            entry.update(server_to_entry(server), source=source, last_seen=now)
+            self.dirty = True
+
+    def forget(self, server: MCPServer):
+        with self.lock:
+            if self.data.pop(server.key, None) is not None:
+                self.dirty = True
+
+class ServerDiscovery:
+    # Finds MCP servers without a port sweep where it can: the cache of earlier finds (shown at once,
+    # re-checked in the background), a watched servers.json and DNS-SD announcements. Sweeping a port
+    # range is the fallback when none of them turn up a server that answers, or when asked for.
+    def __init__(self, transport: Optional[HTTPTransport] = None, cache: Optional[DiscoveryCache] = None,
+                 config_path: Optional[str] = None):
+        # Probes go to many short-lived hosts, so don't retry them or keep big pools around
+        self.transport = transport or HTTPTransport(pool_size=1, retries=0, max_sessions=8)
+        self.registry = ServerRegistry()
+        self.cache = cache or DiscoveryCache()
+        self.config_path = config_path or os.path.join(APP_DIR, "servers.json")
+        self.config_mtime = None
+        self.config_servers: Dict[str, MCPServer] = {}
+        self.config_error: Optional[str] = None
+        self.zeroconf = None
+        self.mdns_browser = None
+        self.mdns_error: Optional[str] = None
+        # DNS-SD instance name -> server, so a goodbye finds the server it announced
+        self.mdns_servers: Dict[str, MCPServer] = {}
+        self.discovery_running = False
+        self.discovery_thread = None
+        self.scan_requested = threading.Event()
+        # Appended to from any thread, taken by the discovery thread
+        self.scan_lock = threading.Lock()
+        self.scan_callbacks: List[Callable[[List[MCPServer]], None]] = []
+        self.scan_error: Optional[str] = None
+        self.last_sweep: Dict[str, float] = {}
+        # Time from start_discovery until the cached servers were listed, and until they were re-checked
+        self.startup: Dict[str, float] = {}
+
+    def start_discovery(self, port_range: tuple = (8000, 8100), hosts: Optional[List[str]] = None,
+                        concurrency: int = 256, sweep_interval: float = 30.0, connect_timeout: float = 0.3,
+                        scan: str = "fallback", mdns: bool = True, watch_interval: float = 1.0):
+        # scan: "always" sweeps every sweep_interval, "fallback" once if nothing else found a server,
+        # "never" only when request_scan() asks for it
+        if self.discovery_running:
+            return
+        # A bad host or network is the caller's mistake; raise it here rather than lose it on the worker thread
+        hosts = self.expand_hosts(hosts or ["localhost"])
+
+        self.discovery_running = True
+        started = time.perf_counter()
+        # Known servers are listed right away; whether they still answer is checked on the worker thread
+        cached = [self.registry.add(server) for server in self.cache.servers()]
+        self.startup = {"cached_servers": len(cached), "cached_seconds": time.perf_counter() - started}
+        self._check_config()
+        if mdns:
+            self._start_mdns()
+        self.discovery_thread = threading.Thread(
+            target=self._discovery_worker,
+            args=(cached, port_range, hosts, concurrency, sweep_interval, connect_timeout,
+                  scan, watch_interval, started)
+        )
+        self.discovery_thread.daemon = True
+        self.discovery_thread.start()
+
+    def stop_discovery(self):
+        self.discovery_running = False
+        self.scan_requested.set()
+        if self.discovery_thread:
+            self.discovery_thread.join()
+        if self.zeroconf is not None:
+            self.zeroconf.close()
+            self.zeroconf = None
+            self.mdns_browser = None
+        self.cache.save()
+
+    def request_scan(self, callback: Optional[Callable[[List[MCPServer]], None]] = None):
+        # Sweeps the port range now; callback gets the servers the sweep found, on the discovery thread
+        if callback is not None:
+            with self.scan_lock:
+                self.scan_callbacks.append(callback)
+        self.scan_requested.set()
+
+    def _found(self, server: MCPServer, source: str) -> MCPServer:
+        server = self.registry.add(server)
+        self.registry.set_status(server, "online")
+        self.cache.seen(server, source)
+        if METRICS.enabled:
+            METRICS.inc("discovery_servers_total", {"source": source})
+        return server
+
+    def _revalidate(self, servers: List[MCPServer], timeout: float = 1.0):
+        # stdio servers would have to be started to check them; they stay "unknown" until used
+        servers = [server for server in servers if server.mcp_transport != "stdio"]
+        if not servers:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(servers), 16)) as pool:
+            results = list(pool.map(lambda server: server.probe(timeout)[0], servers))
+        for server, healthy in zip(servers, results):
+            if healthy:
+                self._found(server, self.cache.source_of(server) or "cache")
+            else:
+                self.registry.set_status(server, "offline")
+
+    def _check_config(self):
+        # servers.json: {"servers": [{"name": ..., "url": ...}]} or {"mcpServers": {name: {"command": ...}}}
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.config_mtime:
+            return
+        self.config_mtime = mtime
+        servers = {}
+        if mtime is not None:
+            try:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, list):
+                    data = {"servers": data}
+                entries = [(entry, None) for entry in data.get("servers", [])]
+                entries += [(entry, name) for name, entry in (data.get("mcpServers") or {}).items()]
+                for entry, name in entries:
+                    server = server_from_entry(entry, name) if isinstance(entry, dict) else None
+                    if server is not None:
+                        servers[server.key] = server
+                self.config_error = None
+            except (OSError, ValueError, AttributeError) as e:
+                # A half-saved or broken file keeps the servers it listed before
+                self.config_error = str(e)
+                return
+        # Servers taken out of the file go away; added ones appear without a check, like manually added ones
+        for key, server in self.config_servers.items():
+            if key not in servers:
+                self.registry.remove(server)
+                self.cache.forget(server)
+        for key, server in servers.items():
+            if key not in self.config_servers:
+                self.registry.add(server)
+                self.cache.seen(server, "config")
+        self.config_servers = servers
+
+    def _start_mdns(self):
+        # Optional: zeroconf does the multicast browsing
+        try:
+            from zeroconf import ServiceBrowser, Zeroconf
+        except ImportError:
+            self.mdns_error = "zeroconf is not installed"
+            return
+        try:
+            self.zeroconf = Zeroconf()
+            self.mdns_browser = ServiceBrowser(self.zeroconf, MDNS_SERVICE_TYPE, handlers=[self._on_mdns_service])
+        except OSError as e:
+            self.mdns_error = str(e)
+            self.zeroconf = None
+
+    def _on_mdns_service(self, zeroconf, service_type: str, name: str, state_change):
+        # Runs on zeroconf's thread; resolving waits for the network, so it gets a thread of its own
+        if state_change.name == "Removed":
+            server = self.mdns_servers.pop(name, None)
+            if server is not None:
+                self.registry.set_status(server, "offline")
+            return
+        worker = threading.Thread(target=self._resolve_mdns, args=(zeroconf, service_type, name))
+        worker.daemon = True
+        worker.start()
+
+    def _resolve_mdns(self, zeroconf, service_type: str, name: str):
+        info = zeroconf.get_service_info(service_type, name, timeout=3000)
+        if info is None or not info.parsed_addresses() or not self.discovery_running:
+            return
+        # TXT records may say where the MCP endpoint is and which transport it speaks
+        properties = {key.decode(errors="replace"): (value or b"").decode(errors="replace")
+                      for key, value in (info.properties or {}).items()}
+        instance = name[:-len(service_type) - 1] if name.endswith(service_type) else name
+        entry = {"name": instance, "url": self.server_url(info.parsed_addresses()[0], info.port),
+                 "transport": properties.get("transport"), "path": properties.get("path")}
+        self.mdns_servers[name] = self._found(server_from_entry(entry), "mdns")
+
+    @property
+    def discovered_servers(self) -> List[MCPServer]:
+        return list(self.registry)
+
+    @staticmethod
+    def expand_hosts(hosts: List[str]) -> List[str]:
+        # Accepts host names, single addresses and CIDR ranges like 192.168.1.0/24
+        expanded = []
+        for host in hosts:
+            if "/" not in host:
+                expanded.append(host)
+                continue
+            try:
+                network = ipaddress.ip_network(host, strict=False)
+            except ValueError as e:
+                raise ValueError(f"Invalid network {host!r}: {e}") from None
+            # Checked before anything is listed; a /8 or an IPv6 /64 would not fit in memory
+            if network.num_addresses > MAX_SCAN_ADDRESSES:
+                raise ValueError(f"Network {host!r} is too large to scan ({network.num_addresses} addresses, "
+                                 f"at most {MAX_SCAN_ADDRESSES})")
+            if network.num_addresses == 1:
+                expanded.append(str(network.network_address))
+            else:
+                expanded.extend(str(address) for address in network.hosts())
+        return expanded
+
+    @staticmethod
+    def server_url(host: str, port: int) -> str:
+        if ":" in host:
+            host = f"[{host}]"
+        return f"http://{host}:{port}"
+
+    def _discovery_worker(self, cached: List[MCPServer], port_range: tuple, hosts: List[str], concurrency: int,
+                          sweep_interval: float, connect_timeout: float, scan: str, watch_interval: float,
+                          started: float):
+        self._revalidate(cached)
+        fallback = scan == "fallback" and not any(server.status == "online" for server in self.registry)
+        if scan == "always" or fallback:
+            self.scan_requested.set()
+        self.startup.update(revalidated_seconds=time.perf_counter() - started, fallback_scan=fallback)
+        loop = asyncio.new_event_loop()
+        try:
+            next_sweep = None
+            while self.discovery_running:
+                if self.scan_requested.is_set() or (next_sweep is not None and time.monotonic() >= next_sweep):
+                    self.scan_requested.clear()
+                    with self.scan_lock:
+                        callbacks, self.scan_callbacks = self.scan_callbacks, []
+                    try:
+                        found = loop.run_until_complete(self._sweep(hosts, port_range, concurrency, connect_timeout))
+                        self.scan_error = None
+                    except Exception as e:
+                        # Reported through scan_error; the thread keeps watching servers.json
+                        self.scan_error = f"Sweep failed: {e}"
+                        found = []
+                    for callback in callbacks:
+                        callback(found)
+                    if scan == "always":
+                        next_sweep = time.monotonic() + sweep_interval
+                self._check_config()
+                self.cache.save()
+                # Wakes up for a requested sweep right away, otherwise to look at servers.json again
+                self.scan_requested.wait(watch_interval)
+        finally:
+            loop.close()
+
+    async def _sweep(self, hosts: List[str], port_range: tuple, concurrency: int,
+                     connect_timeout: float) -> List[MCPServer]:
+        started = time.perf_counter()
+        ports = range(port_range[0], port_range[1])
+        probes = len(hosts) * len(ports)
+        # A fixed set of probers pulls from one lazy iterator, so even a /16 times a port range never has
+        # more than `concurrency` coroutines or a full target list in memory
+        targets = itertools.product(hosts, ports)
+        open_ports = []
+
+        async def prober():
+            for host, port in targets:
+                if not self.discovery_running:
+                    return
+                if await self._probe_port(host, port, connect_timeout):
+                    open_ports.append((host, port))
+
+        await asyncio.gather(*(prober() for _ in range(max(min(concurrency, probes), 1))))
+
+        # Only the few open ports get an HTTP health check, on the default executor
+        loop = asyncio.get_running_loop()
+        servers = await asyncio.gather(
+            *(loop.run_in_executor(None, self._identify_server, host, port) for host, port in open_ports)
+        )
+        # Apply only the differences: new servers are added, swept ones that stopped answering marked offline
+        found = []
+        for server in servers:
+            if server:
+                found.append(self._found(server, "scan"))
+        swept_hosts = set(hosts)
+        seen = {server.key for server in found}
+        if self.discovery_running:
+            for server in self.registry:
+                parts = urlsplit(server.url)
+                try:
+                    port = parts.port
+                except ValueError:
+                    continue
+                swept = (parts.hostname in swept_hosts and port in ports
+                         and server.url == self.server_url(parts.hostname, port))
+                if swept and server.key not in seen:
+                    self.registry.set_status(server, "offline")
+
+        duration = time.perf_counter() - started
+        if METRICS.enabled:
+            METRICS.observe("discovery_sweep_seconds", duration)
+            METRICS.inc("discovery_probes_total", {"result": "open"}, len(open_ports))
+            METRICS.inc("discovery_probes_total", {"result": "closed"}, probes - len(open_ports))
+        self.last_sweep = {
+            "duration": duration,
+            "probes": probes,
+            "probes_per_second": probes / duration if duration > 0 else 0.0,
+            "open_ports": len(open_ports),
+            "servers": len(found),
+        }
+        return found
+
+    async def _probe_port(self, host: str, port: int, timeout: float) -> bool:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+    def _identify_server(self, host: str, port: int) -> Optional[MCPServer]:
+        # Try to identify if it's an MCP server
+        url = self.server_url(host, port)
+        try:
+            response = self.transport.get(f"{url}/health", timeout=1)
+        except requests.exceptions.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        name = f"MCP Server {port}" if host == "localhost" else f"MCP Server {host}:{port}"
+        return MCPServer(name, url)
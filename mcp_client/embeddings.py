@@ -0,0 +1,390 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import APP_DIR
+from .mcp import MCPError, MCPServer
+from .ollama import OllamaClient
+
+def chunk_text(text: str, size: int = 1000) -> List[str]:
+    # Pieces of about `size` characters, cut at whitespace
+    words = text.split()
+    chunks, current, length = [], [], 0
+    for word in words:
+        if current and length + len(word) + 1 > size:
+            chunks.append(" ".join(current))
+            current, length = [], 0
+        current.append(word)
+        length += len(word) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+class EmbeddingIndex:
+    # Unit-length vectors in one float32 matrix, so top-k is a single matrix-vector product.
+    # On disk the vectors are appended to a raw file that can be memory-mapped instead of read in.
+    def __init__(self, ollama_client: OllamaClient, model: str = "nomic-embed-text", directory: Optional[str] = None,
+                 batch_size: int = 64, chunk_chars: int = 1000, mmap: bool = False, dimensions: Optional[int] = None):
+        self.ollama_client = ollama_client
+        self.model = model
+        # Fewer dimensions make every search proportionally cheaper; only for Matryoshka-trained models
+        self.dimensions = dimensions
+        name = model + (f"-{dimensions}" if dimensions else "")
+        self.directory = directory or os.path.join(APP_DIR, "embeddings", re.sub(r"[^\w.-]", "_", name))
+        self.batch_size = batch_size
+        self.chunk_chars = chunk_chars
+        self.mmap = mmap
+        self.vectors: Optional[np.ndarray] = None
+        self.count = 0
+        self.dim: Optional[int] = None
+        # One entry per row: where the text came from and the text itself
+        self.chunks: List[Dict] = []
+        self.indexed: set = set()
+        # Rows of deleted chats stay in the files but are masked out of every search
+        self.removed: set = set()
+        self.live: Optional[np.ndarray] = None
+        self.pending: List[Tuple[str, Dict]] = []
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self.flush_scheduled = False
+        # Times the index started over because the model's vector size changed
+        self.rebuilds = 0
+        self.closed = threading.Event()
+        self.load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def chunks_path(self) -> str:
+        return os.path.join(self.directory, "chunks.jsonl")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def removed_path(self) -> str:
+        return os.path.join(self.directory, "removed.jsonl")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def load(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model or meta.get("dimensions") != self.dimensions:
+                return
+            dim = int(meta["dim"])
+            chunks = []
+            with open(self.chunks_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        chunks.append(json.loads(line))
+                    except ValueError:
+                        # A write cut short by a crash; everything after it is dropped
+                        break
+            rows = os.path.getsize(self.vectors_path) // (4 * dim)
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        count = min(len(chunks), rows)
+        # Bring both files back in step so later appends line up
+        if rows > count:
+            os.truncate(self.vectors_path, count * dim * 4)
+        if len(chunks) > count:
+            with open(self.chunks_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(chunk) + "\n" for chunk in chunks[:count])
+        self.dim = dim
+        self.chunks = chunks[:count]
+        self.indexed = {(chunk.get("source"), chunk.get("ref")) for chunk in self.chunks}
+        self.count = count
+        if count:
+            self.vectors = self._read_vectors(count)
+        try:
+            with open(self.removed_path, "r", encoding="utf-8") as f:
+                removed = {tuple(json.loads(line)) for line in f if line.strip()}
+        except (OSError, ValueError):
+            removed = set()
+        if removed:
+            self.removed = removed
+            self.live = np.array([(chunk.get("source"), chunk.get("ref")) not in removed for chunk in self.chunks])
+
+    def _read_vectors(self, count: int) -> np.ndarray:
+        if self.mmap:
+            return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        return np.fromfile(self.vectors_path, dtype=np.float32, count=count * self.dim).reshape(count, self.dim)
+
+    def _append(self, vectors: np.ndarray, chunks: List[Dict]):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        rebuilt = False
+        with self.lock:
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                self._reset_for_rebuild()
+                rebuilt = True
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dimensions": self.dimensions, "dim": self.dim}, f)
+            # Vectors first: a crash between the two writes leaves a row without text, which load() drops
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.chunks_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(chunk) + "\n" for chunk in chunks)
+            needed = self.count + len(vectors)
+            if self.mmap:
+                self.vectors = self._read_vectors(needed)
+            else:
+                # Doubling keeps appends amortized O(1) while the matrix stays contiguous
+                if self.vectors is None or len(self.vectors) < needed:
+                    capacity = max(needed, 2 * (len(self.vectors) if self.vectors is not None else 0), 1024)
+                    grown = np.empty((capacity, self.dim), dtype=np.float32)
+                    if self.count:
+                        grown[:self.count] = self.vectors[:self.count]
+                    self.vectors = grown
+                self.vectors[self.count:needed] = vectors
+            if self.live is not None:
+                self.live = np.concatenate([self.live, np.ones(len(chunks), dtype=bool)])
+            self.chunks.extend(chunks)
+            self.indexed.update((chunk.get("source"), chunk.get("ref")) for chunk in chunks)
+            self.count = needed
+        if rebuilt:
+            self._schedule_flush()
+
+    def _reset_for_rebuild(self):
+        # The model now returns vectors of another size (it was updated or swapped under the same name), so
+        # the old rows can't be compared with new ones. The files start over and every live text is queued to
+        # be embedded again; searches see a partial index until the background flush has caught up.
+        live = [chunk for chunk in self.chunks if (chunk.get("source"), chunk.get("ref")) not in self.removed]
+        for path in (self.vectors_path, self.chunks_path, self.removed_path, self.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.vectors = None
+        self.count = 0
+        self.dim = None
+        self.chunks = []
+        self.removed = set()
+        self.live = None
+        # Still counted as indexed, so backfills don't queue them a second time
+        self.indexed = {(chunk.get("source"), chunk.get("ref")) for chunk in live}
+        self.pending[:0] = [(chunk["text"], chunk) for chunk in live]
+        self.rebuilds += 1
+
+    def remove(self, keys: set):
+        # keys are (source, ref) pairs, e.g. ("chat", message_id)
+        with self.lock:
+            keys = {key for key in keys if key not in self.removed}
+            if not keys:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.removed_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(list(key)) + "\n" for key in keys)
+            self.removed |= keys
+            if self.live is None:
+                self.live = np.ones(self.count, dtype=bool)
+            for row, chunk in enumerate(self.chunks):
+                if (chunk.get("source"), chunk.get("ref")) in keys:
+                    self.live[row] = False
+
+    def remove_conversation(self, conversation_id: int):
+        with self.lock:
+            keys = {("chat", chunk["ref"]) for chunk in self.chunks
+                    if chunk.get("source") == "chat" and chunk.get("conversation") == conversation_id}
+        self.remove(keys)
+
+    def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        vectors = self.ollama_client.embed(texts, self.model, self.dimensions)
+        if vectors is None or len(vectors) != len(texts):
+            return None
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dimensions and vectors.shape[1] > self.dimensions:
+            # Older Ollama versions ignore `dimensions`; cutting the vector is what it would do
+            vectors = vectors[:, :self.dimensions]
+        return vectors
+
+    def _items(self, text: str, source: str, ref, fields: Dict) -> List[Tuple[str, Dict]]:
+        return [(chunk, dict(fields, source=source, ref=ref, text=chunk)) for chunk in chunk_text(text, self.chunk_chars)]
+
+    def add(self, text: str, source: str, ref, **fields) -> int:
+        # Blocking; returns the number of chunks indexed
+        return self._add_items(self._items(text, source, ref, fields))
+
+    def _add_items(self, items: List[Tuple[str, Dict]]) -> int:
+        added = 0
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            vectors = self.embed([text for text, _ in batch])
+            if vectors is None:
+                break
+            self._append(vectors, [chunk for _, chunk in batch])
+            added += len(batch)
+        return added
+
+    def submit(self, text: str, source: str, ref, **fields):
+        # Non-blocking; texts are embedded in batches on a background thread
+        with self.lock:
+            self.pending.extend(self._items(text, source, ref, fields))
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        with self.lock:
+            if self.flush_scheduled or not self.pending or self.closed.is_set():
+                return
+            self.flush_scheduled = True
+        self.executor.submit(self._flush)
+
+    def _flush(self):
+        drained = False
+        try:
+            while not self.closed.is_set():
+                with self.lock:
+                    batch = self.pending[:self.batch_size]
+                    del self.pending[:self.batch_size]
+                if not batch:
+                    drained = True
+                    return
+                vectors = self.embed([text for text, _ in batch])
+                if vectors is None:
+                    # Ollama is unreachable or lacks the model; try again with the next submission
+                    with self.lock:
+                        self.pending[:0] = batch
+                    return
+                self._append(vectors, [chunk for _, chunk in batch])
+        finally:
+            # Cleared however the loop ends, even by an exception, or no submission would schedule a flush again
+            with self.lock:
+                self.flush_scheduled = False
+                # A submission that arrived after the queue ran dry saw the flag still set
+                again = drained and bool(self.pending)
+            if again:
+                self._schedule_flush()
+
+    def is_indexed(self, source: str, ref) -> bool:
+        with self.lock:
+            return (source, ref) in self.indexed
+
+    def search_vector(self, query: np.ndarray, k: int = 5) -> List[Dict]:
+        query = np.asarray(query, dtype=np.float32)
+        with self.lock:
+            if not self.count:
+                return []
+            stale = query.shape[0] != self.dim
+            if stale:
+                # The model's vector size changed before anything new was indexed; nothing here can be
+                # compared with the query until the rebuild has embedded the texts again
+                self._reset_for_rebuild()
+            else:
+                # Rows are only ever appended, so this view stays valid while others add more
+                matrix = self.vectors[:self.count]
+                chunks = self.chunks
+                live = self.live[:self.count] if self.live is not None else None
+        if stale:
+            self._schedule_flush()
+            return []
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = matrix @ query
+        if live is not None:
+            scores[~live] = -np.inf
+            k = min(k, int(live.sum()))
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+            top = top[np.argsort(-scores[top])]
+        else:
+            top = np.argsort(-scores)
+        return [dict(chunks[index], score=float(scores[index])) for index in top]
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        if not self.count:
+            return []
+        vectors = self.embed([query])
+        if vectors is None:
+            return []
+        return self.search_vector(vectors[0], k)
+
+    def context_for(self, query: str, k: int = 4, min_score: float = 0.5, exclude: Optional[set] = None) -> str:
+        # Excerpts worth showing the model, or "" if nothing is close enough
+        hits = [hit for hit in self.search(query, k) if hit["score"] >= min_score
+                and hit["text"] not in (exclude or set())]
+        return "\n\n".join(f"- {hit['text']}" for hit in hits)
+
+    def augment_messages(self, messages: List[Dict]) -> List[Dict]:
+        # Adds related excerpts from earlier chats and resources just before the latest user message
+        if not messages or messages[-1]["role"] != "user":
+            return messages
+        context = self.context_for(messages[-1]["content"], exclude={message["content"] for message in messages})
+        if not context:
+            return messages
+        note = {"role": "system", "content": f"Possibly relevant excerpts from earlier conversations and documents:\n\n{context}"}
+        return messages[:-1] + [note, messages[-1]]
+
+    def augment_prompt(self, prompt: str) -> str:
+        context = self.context_for(prompt, exclude={prompt})
+        if not context:
+            return prompt
+        return f"Possibly relevant excerpts from earlier conversations and documents:\n\n{context}\n\n{prompt}"
+
+    def index_store(self, store, batch: int = 500) -> int:
+        # Blocking; embeds saved chat messages that aren't in the index yet and forgets deleted ones
+        with self.lock:
+            # Only what was indexed before the scan; messages sent meanwhile aren't missed by it
+            known = {chunk["ref"] for chunk in self.chunks if chunk.get("source") == "chat"}
+        after_id = 0
+        added = 0
+        seen = set()
+        while not self.closed.is_set():
+            messages = store.messages_after(after_id, batch)
+            if not messages:
+                self.remove({("chat", ref) for ref in known - seen})
+                return added
+            seen.update(message["id"] for message in messages)
+            # Chunks of many messages share each /api/embed request
+            items = []
+            for message in messages:
+                # New messages may have been indexed already as they were sent
+                if not self.is_indexed("chat", message["id"]):
+                    items += self._items(message["content"], "chat", message["id"],
+                                         {"conversation": message["conversation_id"], "role": message["role"]})
+            indexed = self._add_items(items)
+            added += indexed
+            if indexed < len(items):
+                return added
+            after_id = messages[-1]["id"]
+        return added
+
+    def index_resources(self, server: MCPServer) -> int:
+        # Blocking; embeds the text resources a connected MCP server exposes
+        added = 0
+        try:
+            resources = server.list_resources()
+            session = server.connect()
+        except MCPError:
+            return 0
+        for resource in resources:
+            if self.closed.is_set():
+                break
+            uri = resource.get("uri")
+            if not uri or self.is_indexed("resource", uri):
+                continue
+            try:
+                contents = session.read_resource(uri).get("contents", [])
+            except MCPError:
+                continue
+            text = "\n".join(item["text"] for item in contents if isinstance(item.get("text"), str))
+            if text.strip():
+                added += self.add(text, "resource", uri, server=server.name, name=resource.get("name"))
+        return added
+
+    def close(self):
+        # Background indexing stops at its next batch
+        self.closed.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,1673 @@
+import os
+import math
+import operator
+import queue
+import shlex
+import threading
+import time
+from datetime import datetime
+from tkinter import messagebox
+from typing import Callable, List, Dict, Optional
+
+import customtkinter as ctk
+
+from . import APP_DIR
+from .discovery import ServerDiscovery
+from .health import HealthMonitor
+from .mcp import MCPError, MCPServer
+from .lifecycle import ModelLifecycle
+from .metrics import METRICS, MetricsServer, label_key
+from .ollama import GenerationStats, OllamaClient, ResponseCache, ModelCatalog, Conversation
+from .prefill import PromptPrefill
+from .registry import ServerRegistry
+from .router import OllamaRouter, create_ollama_client
+from .scheduler import RequestScheduler, parse_model_limits
+from .store import ConversationStore
+from .updates import UIUpdateScheduler
+
+# Set appearance mode and default color theme
+ctk.set_appearance_mode("dark")
+ctk.set_default_color_theme("blue")
+
+class ChatRecord:
+    # Backing store entry for one message; widgets are only created for visible records
+    __slots__ = ("text", "is_user", "timestamp", "stats", "height")
+
+    def __init__(self, text: str, is_user: bool, timestamp: Optional[str] = None, stats: str = ""):
+        self.text = text
+        self.is_user = is_user
+        self.timestamp = timestamp or datetime.now().strftime("%H:%M")
+        self.stats = stats
+        self.height = 0
+
+    @classmethod
+    def from_stored(cls, message: Dict) -> "ChatRecord":
+        created = datetime.fromtimestamp(message["created"])
+        # Older messages carry their date as well
+        fmt = "%H:%M" if created.date() == datetime.now().date() else "%d %b %Y %H:%M"
+        return cls(message["content"], message["role"] == "user", created.strftime(fmt), message["stats"] or "")
+
+class ChatMessage(ctk.CTkFrame):
+    def __init__(self, master, message, is_user=True, **kwargs):
+        super().__init__(master, **kwargs)
+        self.configure(fg_color="transparent")
+        self.text = message
+        self.is_user = is_user
+        self.stats_text = ""
+        
+        # Create message container with different colors for user and AI
+        self.message_frame = ctk.CTkFrame(self, fg_color="#2B2B2B" if is_user else "#1F1F1F")
+        self.message_frame.pack(fill="x", padx=10, pady=5)
+        
+        # Add timestamp
+        timestamp = datetime.now().strftime("%H:%M")
+        self.time_label = ctk.CTkLabel(self.message_frame, text=timestamp, font=("Arial", 10), text_color="gray")
+        self.time_label.pack(anchor="e", padx=5, pady=2)
+        
+        # Add message text
+        self.message_label = ctk.CTkLabel(
+            self.message_frame, 
+            text=message,
+            wraplength=400,
+            justify="left",
+            font=("Arial", 12)
+        )
+        self.message_label.pack(padx=10, pady=5, anchor="w")
+        self.stats_label = None
+
+    def append_text(self, text: str):
+        self.text += text
+        self.message_label.configure(text=self.text)
+
+    def set_stats(self, stats: GenerationStats):
+        self.set_stats_text(stats.summary())
+
+    def set_stats_text(self, summary: str):
+        self.stats_text = summary
+        if not summary:
+            if self.stats_label is not None:
+                self.stats_label.pack_forget()
+            return
+        if self.stats_label is None:
+            self.stats_label = ctk.CTkLabel(self.message_frame, text="", font=("Arial", 10), text_color="gray")
+        self.stats_label.configure(text=summary)
+        self.stats_label.pack(anchor="e", padx=5, pady=2)
+
+    def show(self, record: ChatRecord):
+        # Rebind a recycled widget to another record, touching only what changed
+        if self.is_user != record.is_user:
+            self.is_user = record.is_user
+            self.message_frame.configure(fg_color="#2B2B2B" if record.is_user else "#1F1F1F")
+        if self.time_label.cget("text") != record.timestamp:
+            self.time_label.configure(text=record.timestamp)
+        if self.text != record.text:
+            self.text = record.text
+            self.message_label.configure(text=record.text)
+        if self.stats_text != record.stats:
+            self.set_stats_text(record.stats)
+
+class ChatHistoryView(ctk.CTkFrame):
+    def __init__(self, master, buffer: int = 2, max_widgets: int = 60, **kwargs):
+        super().__init__(master, **kwargs)
+        self.records: List[ChatRecord] = []
+        self.buffer = buffer
+        self.max_widgets = max_widgets
+        self.first = 0
+        self.visible_count = 0
+        self.follow_tail = True
+        self.render_pending = False
+        # Recycled message widgets, one per visible slot
+        self.slots: List[ChatMessage] = []
+        self.bound: Dict[int, ChatMessage] = {}
+        # Returns the page before the oldest record when scrolled to the top, for saved chats
+        self.load_older: Optional[Callable[[], List[ChatRecord]]] = None
+        # Records inserted at the front since the last clear; handed-out indices stay valid
+        self.prepended = 0
+        
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.grid(row=0, column=0, sticky="nsew")
+        self.viewport.grid_columnconfigure(0, weight=1)
+        self.viewport.grid_propagate(False)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        
+        self.viewport.bind("<Configure>", lambda e: self.schedule_render())
+        # Wheel events are bound once for the app and filtered by widget path
+        self.bind_all("<MouseWheel>", self.on_mousewheel, add="+")
+        self.bind_all("<Button-4>", lambda e: self.on_wheel_step(e, -1), add="+")
+        self.bind_all("<Button-5>", lambda e: self.on_wheel_step(e, 1), add="+")
+
+    def add_message(self, text: str, is_user: bool = True) -> int:
+        self.records.append(ChatRecord(text, is_user))
+        self.schedule_render()
+        return len(self.records) - 1 - self.prepended
+
+    def append_text(self, index: int, text: str):
+        index += self.prepended
+        record = self.records[index]
+        record.text += text
+        record.height = 0
+        widget = self.bound.get(index)
+        if widget is not None:
+            widget.append_text(text)
+        if widget is not None or self.follow_tail:
+            self.schedule_render()
+
+    def set_stats(self, index: int, stats: GenerationStats):
+        index += self.prepended
+        record = self.records[index]
+        record.stats = stats.summary()
+        record.height = 0
+        widget = self.bound.get(index)
+        if widget is not None:
+            widget.set_stats_text(record.stats)
+            self.schedule_render()
+
+    def clear(self):
+        self.set_records([])
+
+    def set_records(self, records: List[ChatRecord], load_older: Optional[Callable[[], List[ChatRecord]]] = None):
+        self.records = records
+        self.load_older = load_older
+        self.prepended = 0
+        self.first = 0
+        self.follow_tail = True
+        self.schedule_render()
+
+    def prepend(self, records: List[ChatRecord]):
+        self.records[:0] = records
+        self.prepended += len(records)
+        self.first += len(records)
+
+    def estimate_height(self, record: ChatRecord) -> int:
+        if record.height:
+            return record.height
+        # Roughly 7px per character at the 400px wrap length, 18px per line
+        lines = sum(max(1, math.ceil(len(line) * 7 / 400)) for line in record.text.split("\n"))
+        return 50 + lines * 18 + (18 if record.stats else 0)
+
+    def schedule_render(self):
+        if not self.render_pending:
+            self.render_pending = True
+            self.after_idle(self.render)
+
+    def render(self):
+        self.render_pending = False
+        height = self.viewport.winfo_height()
+        if height <= 1:
+            height = 600
+        if self.follow_tail:
+            self.first = self.first_for_tail(height)
+        self.first = max(0, min(self.first, len(self.records) - 1))
+
+        # Materialize widgets only for the viewport plus a few buffered records
+        self.bound = {}
+        used = 0
+        slot_index = 0
+        index = self.first
+        extra = 0
+        while index < len(self.records) and slot_index < self.max_widgets:
+            if used >= height:
+                if extra >= self.buffer:
+                    break
+                extra += 1
+            record = self.records[index]
+            slot = self.slot(slot_index)
+            slot.show(record)
+            slot.grid(row=slot_index, column=0, sticky="ew")
+            self.bound[index] = slot
+            used += self.estimate_height(record)
+            slot_index += 1
+            index += 1
+        for slot in self.slots[slot_index:]:
+            slot.grid_remove()
+
+        # Cache real heights so the next layout is exact for these records
+        self.viewport.update_idletasks()
+        for record_index, slot in self.bound.items():
+            self.records[record_index].height = slot.winfo_reqheight()
+
+        self.visible_count = max(slot_index - extra, 1)
+        self.update_scrollbar()
+
+    def slot(self, slot_index: int) -> ChatMessage:
+        while len(self.slots) <= slot_index:
+            widget = ChatMessage(self.viewport, "", is_user=False)
+            self.slots.append(widget)
+        return self.slots[slot_index]
+
+    def first_for_tail(self, height: int) -> int:
+        used = 0
+        index = len(self.records)
+        while index > 0 and used < height:
+            index -= 1
+            used += self.estimate_height(self.records[index])
+        # If the last records overflow the viewport, start at the newest one that still fits
+        if used > height and index < len(self.records) - 1:
+            index += 1
+        return index
+
+    def update_scrollbar(self):
+        total = len(self.records)
+        if total == 0:
+            self.scrollbar.set(0, 1)
+            return
+        self.scrollbar.set(self.first / total, min((self.first + self.visible_count) / total, 1.0))
+
+    def scroll_to(self, first: int):
+        if first <= 0 and self.load_older is not None:
+            # Reaching the top of a saved chat pulls in the page before it
+            older = self.load_older()
+            if older:
+                self.prepend(older)
+                first += len(older)
+            else:
+                self.load_older = None
+        last_first = max(len(self.records) - self.visible_count, 0)
+        self.first = max(0, min(first, last_first))
+        self.follow_tail = self.first >= last_first
+        self.schedule_render()
+
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.records)))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.visible_count if args[2] == "pages" else 1)
+            self.scroll_to(self.first + step)
+
+    def owns(self, widget) -> bool:
+        path = str(widget)
+        return path == str(self) or path.startswith(str(self) + ".")
+
+    def on_wheel_step(self, event, step: int):
+        if self.owns(event.widget):
+            self.scroll_to(self.first + step)
+
+    def on_mousewheel(self, event):
+        if not self.owns(event.widget) or not event.delta:
+            return
+        # Windows reports multiples of 120, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_to(self.first - (1 if delta > 0 else -1) * max(abs(delta), 1))
+
+class SettingsDialog(ctk.CTkToplevel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Settings")
+        self.geometry("420x820")
+        
+        # Make dialog modal
+        self.transient(parent)
+        self.grab_set()
+        
+        # Create settings content; it scrolls once it outgrows the window
+        content = ctk.CTkScrollableFrame(self)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        # Theme settings
+        theme_frame = ctk.CTkFrame(content, fg_color="transparent")
+        theme_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(theme_frame, text="Theme:", font=("Arial", 12, "bold")).pack(anchor="w")
+        theme_menu = ctk.CTkOptionMenu(
+            theme_frame,
+            values=["Dark", "Light", "System"],
+            command=self.change_theme
+        )
+        theme_menu.pack(fill="x", pady=5)
+        
+        # Ollama settings
+        ollama_frame = ctk.CTkFrame(content, fg_color="transparent")
+        ollama_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(ollama_frame, text="Ollama URLs (comma-separated):", font=("Arial", 12, "bold")).pack(anchor="w")
+        self.ollama_url = ctk.CTkEntry(ollama_frame)
+        self.ollama_url.insert(0, parent.ollama_client.base_url)
+        self.ollama_url.pack(fill="x", pady=5)
+        ctk.CTkLabel(
+            ollama_frame,
+            text="Requests per host at once:",
+            font=("Arial", 11),
+            text_color="gray"
+        ).pack(anchor="w")
+        client = parent.ollama_client
+        self.per_host_entry = ctk.CTkEntry(ollama_frame)
+        self.per_host_entry.insert(0, str(client.backends[0].max_concurrency if isinstance(client, OllamaRouter) else 2))
+        self.per_host_entry.pack(fill="x", pady=5)
+        ctk.CTkLabel(
+            ollama_frame,
+            text="Requests per model at once (e.g. 2, llama3:70b=1):",
+            font=("Arial", 11),
+            text_color="gray"
+        ).pack(anchor="w")
+        scheduler = parent.scheduler
+        limits = [str(scheduler.default_model_limit)] if scheduler.default_model_limit else []
+        limits += [f"{name}={limit}" for name, limit in scheduler.model_limits.items()]
+        self.model_limits_entry = ctk.CTkEntry(ollama_frame, placeholder_text="No limit")
+        if limits:
+            self.model_limits_entry.insert(0, ", ".join(limits))
+        self.model_limits_entry.pack(fill="x", pady=5)
+        
+        # Model loading settings
+        models_frame = ctk.CTkFrame(content, fg_color="transparent")
+        models_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(models_frame, text="Model Loading:", font=("Arial", 12, "bold")).pack(anchor="w")
+        ctk.CTkLabel(
+            models_frame,
+            text="Keep models loaded for (e.g. 30m, 2h, -1 for always):",
+            font=("Arial", 11),
+            text_color="gray"
+        ).pack(anchor="w")
+        self.keep_alive_entry = ctk.CTkEntry(models_frame, placeholder_text="Ollama default")
+        if client.keep_alive is not None:
+            self.keep_alive_entry.insert(0, str(client.keep_alive))
+        self.keep_alive_entry.pack(fill="x", pady=5)
+        ctk.CTkLabel(
+            models_frame,
+            text="Also load the most used models at start (count):",
+            font=("Arial", 11),
+            text_color="gray"
+        ).pack(anchor="w")
+        self.prewarm_entry = ctk.CTkEntry(models_frame)
+        self.prewarm_entry.insert(0, str(parent.model_lifecycle.prewarm_count))
+        self.prewarm_entry.pack(fill="x", pady=5)
+        self.prefill_switch = ctk.CTkSwitch(models_frame, text="Process my message while I type")
+        if parent.scheduler.prefill is not None:
+            self.prefill_switch.select()
+        self.prefill_switch.pack(anchor="w", pady=5)
+        
+        # Response cache settings
+        cache_frame = ctk.CTkFrame(content, fg_color="transparent")
+        cache_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(cache_frame, text="Response Cache:", font=("Arial", 12, "bold")).pack(anchor="w")
+        self.cache_switch = ctk.CTkSwitch(cache_frame, text="Reuse replies to repeated prompts")
+        if parent.ollama_client.cache is not None:
+            self.cache_switch.select()
+        self.cache_switch.pack(anchor="w", pady=5)
+        ctk.CTkLabel(
+            cache_frame,
+            text="Seed (replies are only cached with a fixed seed):",
+            font=("Arial", 11),
+            text_color="gray"
+        ).pack(anchor="w")
+        self.seed_entry = ctk.CTkEntry(cache_frame, placeholder_text="Random")
+        seed = parent.ollama_client.options.get("seed")
+        if seed is not None:
+            self.seed_entry.insert(0, str(seed))
+        self.seed_entry.pack(fill="x", pady=5)
+        
+        # Retrieval settings
+        retrieval_frame = ctk.CTkFrame(content, fg_color="transparent")
+        retrieval_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(retrieval_frame, text="Earlier Chats:", font=("Arial", 12, "bold")).pack(anchor="w")
+        self.retrieval_switch = ctk.CTkSwitch(retrieval_frame, text="Give the model related earlier messages")
+        if parent.embedding_index is not None:
+            self.retrieval_switch.select()
+        self.retrieval_switch.pack(anchor="w", pady=5)
+        ctk.CTkLabel(
+            retrieval_frame,
+            text="Embedding model:",
+            font=("Arial", 11),
+            text_color="gray"
+        ).pack(anchor="w")
+        self.embed_model_entry = ctk.CTkEntry(retrieval_frame)
+        self.embed_model_entry.insert(0, parent.embedding_index.model if parent.embedding_index else "nomic-embed-text")
+        self.embed_model_entry.pack(fill="x", pady=5)
+        
+        # Metrics settings
+        metrics_frame = ctk.CTkFrame(content, fg_color="transparent")
+        metrics_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(metrics_frame, text="Metrics:", font=("Arial", 12, "bold")).pack(anchor="w")
+        self.metrics_switch = ctk.CTkSwitch(metrics_frame, text="Record request timings")
+        if METRICS.enabled:
+            self.metrics_switch.select()
+        self.metrics_switch.pack(anchor="w", pady=5)
+        ctk.CTkLabel(
+            metrics_frame,
+            text="Prometheus port (serves /metrics on localhost):",
+            font=("Arial", 11),
+            text_color="gray"
+        ).pack(anchor="w")
+        self.metrics_port_entry = ctk.CTkEntry(metrics_frame, placeholder_text="Off")
+        if parent.metrics_server is not None:
+            self.metrics_port_entry.insert(0, str(parent.metrics_server.httpd.server_address[1]))
+        self.metrics_port_entry.pack(fill="x", pady=5)
+        
+        # Save button
+        save_btn = ctk.CTkButton(
+            content,
+            text="Save Settings",
+            command=self.save_settings
+        )
+        save_btn.pack(pady=20)
+    
+    def change_theme(self, choice):
+        ctk.set_appearance_mode(choice.lower())
+    
+    def save_settings(self):
+        seed = self.seed_entry.get().strip()
+        if seed and not seed.lstrip("-").isdigit():
+            messagebox.showerror("Error", "Seed must be a whole number")
+            return
+        per_host = self.per_host_entry.get().strip()
+        if not (per_host.isdigit() and int(per_host) > 0):
+            messagebox.showerror("Error", "Requests per host must be a positive number")
+            return
+        per_host = int(per_host)
+        try:
+            model_limits = parse_model_limits(self.model_limits_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Requests per model: {e}")
+            return
+        prewarm = self.prewarm_entry.get().strip() or "0"
+        if not prewarm.isdigit():
+            messagebox.showerror("Error", "The number of models to load at start must be a whole number")
+            return
+        # Ollama takes a duration like "30m", or a number of seconds where negative means forever
+        keep_alive = self.keep_alive_entry.get().strip() or None
+        if keep_alive and keep_alive.lstrip("-").isdigit():
+            keep_alive = int(keep_alive)
+        metrics_port = self.metrics_port_entry.get().strip()
+        if metrics_port and not (metrics_port.isdigit() and 0 < int(metrics_port) < 65536):
+            messagebox.showerror("Error", "Metrics port must be a number between 1 and 65535")
+            return
+        
+        # Save metrics settings
+        if not self.master.set_metrics(bool(self.metrics_switch.get()), int(metrics_port) if metrics_port else None):
+            return
+        if not self.master.set_retrieval(bool(self.retrieval_switch.get()),
+                                         self.embed_model_entry.get().strip() or "nomic-embed-text"):
+            return
+        
+        # Save cache settings
+        options = dict(self.master.ollama_client.options)
+        options.pop("seed", None)
+        if seed:
+            options["seed"] = int(seed)
+        cache = self.master.ollama_client.cache
+        if self.cache_switch.get() and cache is None:
+            cache = ResponseCache(path=os.path.join(APP_DIR, "response_cache.sqlite3"))
+        elif not self.cache_switch.get() and cache is not None:
+            cache.close()
+            cache = None
+        self.master.ollama_client.cache = cache
+        self.master.ollama_client.options = options
+        self.master.ollama_client.keep_alive = keep_alive
+        self.master.model_lifecycle.prewarm_count = int(prewarm)
+        self.master.set_prefill(bool(self.prefill_switch.get()))
+        self.master.scheduler.set_model_limits(*model_limits)
+        
+        # Save Ollama URL
+        ollama_url = self.ollama_url.get().strip()
+        if ollama_url:
+            # Several URLs make a router that spreads requests over the hosts
+            previous = self.master.ollama_client
+            previous.close()
+            self.master.ollama_client = create_ollama_client(ollama_url, max_concurrency=per_host, keep_alive=keep_alive,
+                                                             cache=cache, options=options)
+            self.master.ollama_client.current_model = previous.current_model
+            self.master.scheduler.ollama_client = self.master.ollama_client
+            if isinstance(self.master.ollama_client, OllamaRouter):
+                self.master.scheduler.set_max_workers(max(self.master.ollama_client.capacity, 2))
+            else:
+                self.master.scheduler.set_max_workers(2)
+            self.master.ollama_client.available_models = self.master.model_catalog.cached_models(
+                self.master.ollama_client.base_url
+            )
+            self.master.model_lifecycle.set_client(self.master.ollama_client)
+            if self.master.embedding_index is not None:
+                self.master.embedding_index.ollama_client = self.master.ollama_client
+            self.master.prompt_prefill.ollama_client = self.master.ollama_client
+            self.master.update_llm_list()
+            self.master.refresh_models()
+        
+        messagebox.showinfo("Success", "Settings saved successfully!")
+        self.destroy()
+
+class StatsDialog(ctk.CTkToplevel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Stats")
+        self.geometry("760x520")
+        self.transient(parent)
+        
+        self.textbox = ctk.CTkTextbox(self, font=("Courier", 12), wrap="none")
+        self.textbox.pack(fill="both", expand=True, padx=10, pady=(10, 0))
+        
+        buttons = ctk.CTkFrame(self, fg_color="transparent")
+        buttons.pack(fill="x", padx=10, pady=10)
+        ctk.CTkButton(buttons, text="Reset", width=100, command=self.reset).pack(side="right")
+        self.refresh()
+    
+    def reset(self):
+        METRICS.reset()
+        self.refresh(reschedule=False)
+    
+    def refresh(self, reschedule: bool = True):
+        text = self.describe()
+        if self.textbox.get("1.0", "end-1c") != text:
+            self.textbox.configure(state="normal")
+            self.textbox.delete("1.0", "end")
+            self.textbox.insert("1.0", text)
+            self.textbox.configure(state="disabled")
+        if reschedule:
+            self.after(1000, self.refresh)
+    
+    @staticmethod
+    def ms(value) -> str:
+        return "-" if value is None else f"{value * 1000:.0f} ms"
+    
+    def describe(self) -> str:
+        lines = []
+        client = self.master.ollama_client
+        if isinstance(client, OllamaRouter):
+            lines.append(f"{'Ollama host':<40} {'state':>8} {'busy':>6} {'served':>7}  loaded")
+            for host in client.status():
+                state = "up" if host["healthy"] else "down"
+                lines.append(f"{host['url'][:40]:<40} {state:>8} {host['in_flight']:>2}/{host['max_concurrency']:<3} "
+                             f"{host['served']:>7}  {', '.join(host['loaded'])}")
+            lines.append("")
+        # Counted whether or not metrics are on
+        ui = self.master.ui_updates.stats()
+        lines.append(f"UI frames: {ui['frames']}, p50 {self.ms(ui['frame_p50'])}, p95 {self.ms(ui['frame_p95'])}, "
+                     f"max {self.ms(ui['frame_max'])}")
+        lines.append(f"UI updates: {ui['posted']} posted, {ui['merged']} merged, {ui['dropped']} dropped, "
+                     f"{ui['applied']} applied, {ui['deferred']} deferred to the next frame")
+        if self.master.scheduler.prefill is not None:
+            prefill = self.master.scheduler.prefill.stats()
+            lines.append(f"Prefill while typing: {prefill['completed']} done, {prefill['skipped']} skipped, "
+                         f"{prefill['discarded']} outdated, {prefill['aborted']} aborted, {prefill['failed']} failed; "
+                         f"an estimated ~{prefill['saved_tokens']} prompt tokens and ~{prefill['saved_seconds']:.1f} s "
+                         f"of prompt eval saved over {prefill['replies']} replies")
+        lines.append("")
+        if not METRICS.enabled:
+            lines.append("Metrics are off. Turn on \"Record request timings\" in Settings.")
+            return "\n".join(lines)
+        snapshot = METRICS.snapshot()
+        counters = snapshot["counters"]
+        histograms = snapshot["histograms"]
+        
+        # Requests per endpoint, with errors and latency split into headers and body
+        totals: Dict[tuple, List[int]] = {}
+        for key, count in counters.get("http_requests_total", {}).items():
+            labels = dict(key)
+            endpoint = (labels.get("host", ""), labels.get("path", ""))
+            entry = totals.setdefault(endpoint, [0, 0])
+            entry[0] += int(count)
+            if not labels.get("status", "").isdigit() or int(labels["status"]) >= 400:
+                entry[1] += int(count)
+        lines.append(f"{'HTTP endpoint':<40} {'count':>6} {'errors':>6} {'ttfb p50':>9} {'p50':>9} {'p95':>9}")
+        for (host, path), (count, errors) in sorted(totals.items()):
+            key = (("host", host), ("path", path))
+            ttfb = histograms.get("http_ttfb_seconds", {}).get(key)
+            duration = histograms.get("http_duration_seconds", {}).get(key)
+            lines.append(
+                f"{(host + path)[:40]:<40} {count:>6} {errors:>6} "
+                f"{self.ms(ttfb.quantile(0.5) if ttfb else None):>9} "
+                f"{self.ms(duration.quantile(0.5) if duration else None):>9} "
+                f"{self.ms(duration.quantile(0.95) if duration else None):>9}"
+            )
+        
+        # Where generation time goes, as reported by Ollama
+        lines.append("")
+        lines.append(f"{'Ollama model':<28} {'first token':>12} {'prompt eval':>12} {'generation':>12} {'tok/s':>7}")
+        for key, first_token in sorted(histograms.get("ollama_first_token_seconds", {}).items()):
+            prompt_eval = histograms.get("ollama_prompt_eval_seconds", {}).get(key)
+            generation = histograms.get("ollama_eval_seconds", {}).get(key)
+            tokens = counters.get("ollama_tokens_total", {}).get(label_key(dict(key, kind="eval")), 0)
+            rate = f"{tokens / generation.sum:.1f}" if generation and generation.sum else "-"
+            lines.append(
+                f"{dict(key).get('model', '')[:28]:<28} {self.ms(first_token.quantile(0.5)):>12} "
+                f"{self.ms(prompt_eval.mean if prompt_eval else None):>12} "
+                f"{self.ms(generation.mean if generation else None):>12} {rate:>7}"
+            )
+        
+        lines.append("")
+        lines.append(f"{'MCP method':<28} {'count':>6} {'p50':>9} {'p95':>9}")
+        for key, histogram in sorted(histograms.get("mcp_request_seconds", {}).items()):
+            labels = dict(key)
+            name = f"{labels.get('method', '')} ({labels.get('outcome', '')})"
+            lines.append(f"{name[:28]:<28} {histogram.count:>6} "
+                         f"{self.ms(histogram.quantile(0.5)):>9} {self.ms(histogram.quantile(0.95)):>9}")
+        
+        lines.append("")
+        callback = histograms.get("ui_callback_seconds", {})
+        lag = histograms.get("ui_lag_seconds", {})
+        for key, histogram in sorted(callback.items()):
+            late = lag.get(key)
+            lines.append(f"UI {dict(key).get('callback', '')}: callback p95 {self.ms(histogram.quantile(0.95))}, "
+                         f"late p95 {self.ms(late.quantile(0.95) if late else None)}")
+        
+        lines.append("")
+        lines.append("Recent requests")
+        for span in reversed(METRICS.recent_spans(15)):
+            started = datetime.fromtimestamp(span.wall_time).strftime("%H:%M:%S")
+            status = span.error or span.status
+            detail = ""
+            if "eval" in span.attributes:
+                detail = (f"  prompt eval {self.ms(span.attributes['prompt_eval'])}, "
+                          f"generation {self.ms(span.attributes['eval'])}")
+            lines.append(
+                f"{started} {span.labels.get('method', ''):<4} {span.labels.get('path', '')[:24]:<24} {status!s:>4} "
+                f"connect {self.ms(span.connect):>7} ttfb {self.ms(span.ttfb):>7} total {self.ms(span.duration):>8}{detail}"
+            )
+        return "\n".join(lines)
+
+class CompareDialog(ctk.CTkToplevel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Compare Models")
+        self.geometry("1100x700")
+        self.transient(parent)
+        # Job id -> (text box, stats label) for the run in progress
+        self.columns: Dict[int, tuple] = {}
+        self.jobs = []
+        self.finished = 0
+        self.started = 0.0
+
+        models_frame = ctk.CTkScrollableFrame(self, orientation="horizontal", height=40)
+        models_frame.pack(fill="x", padx=10, pady=(10, 0))
+        self.model_checks: Dict[str, ctk.CTkCheckBox] = {}
+        for model in parent.ollama_client.available_models:
+            check = ctk.CTkCheckBox(models_frame, text=model, font=("Arial", 12))
+            if model == parent.ollama_client.current_model:
+                check.select()
+            check.pack(side="left", padx=(0, 15))
+            self.model_checks[model] = check
+
+        prompt_frame = ctk.CTkFrame(self, fg_color="transparent")
+        prompt_frame.pack(fill="x", padx=10, pady=10)
+        prompt_frame.grid_columnconfigure(0, weight=1)
+        self.prompt_entry = ctk.CTkEntry(prompt_frame, placeholder_text="Prompt for every selected model...", height=40)
+        self.prompt_entry.grid(row=0, column=0, sticky="ew", padx=(0, 10))
+        self.prompt_entry.bind("<Return>", lambda e: self.run())
+        ctk.CTkButton(prompt_frame, text="Run", width=100, height=40, command=self.run).grid(row=0, column=1)
+        ctk.CTkButton(
+            prompt_frame,
+            text="Stop",
+            width=80,
+            height=40,
+            fg_color="#8B2E2E",
+            hover_color="#A33A3A",
+            command=self.stop
+        ).grid(row=0, column=2, padx=(10, 0))
+        self.summary_label = ctk.CTkLabel(self, text="", font=("Arial", 11), text_color="gray")
+        self.summary_label.pack(anchor="w", padx=12)
+
+        self.results_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.results_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.results_frame.grid_rowconfigure(1, weight=1)
+        parent.compare_dialog = self
+
+    def run(self):
+        prompt = self.prompt_entry.get().strip()
+        models = [model for model, check in self.model_checks.items() if check.get()]
+        if not prompt:
+            return
+        if len(models) < 2:
+            messagebox.showerror("Error", "Pick at least two models to compare", parent=self)
+            return
+        self.stop()
+        jobs = self.master.scheduler.submit_group(prompt, models)
+        if jobs is None:
+            messagebox.showerror("Error", "Too many requests in flight, please wait", parent=self)
+            return
+        self.jobs = jobs
+        self.finished = 0
+        self.started = time.perf_counter()
+        self.summary_label.configure(text=f"Running {len(jobs)} models...")
+
+        # One column per model, side by side
+        for widget in self.results_frame.winfo_children():
+            widget.destroy()
+        self.columns = {}
+        for column, job in enumerate(jobs):
+            self.results_frame.grid_columnconfigure(column, weight=1, uniform="model")
+            ctk.CTkLabel(self.results_frame, text=job.model, font=("Arial", 12, "bold")).grid(
+                row=0, column=column, sticky="w", padx=5)
+            textbox = ctk.CTkTextbox(self.results_frame, wrap="word", font=("Arial", 12))
+            textbox.grid(row=1, column=column, sticky="nsew", padx=5)
+            textbox.configure(state="disabled")
+            stats_label = ctk.CTkLabel(self.results_frame, text="waiting...", font=("Arial", 10),
+                                       text_color="gray", justify="left", wraplength=220)
+            stats_label.grid(row=2, column=column, sticky="w", padx=5)
+            self.columns[job.job_id] = (textbox, stats_label)
+
+    def stop(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def on_events(self, events: List[tuple]):
+        # Chunks for the same model are merged so each column is redrawn once per tick
+        text_by_job: Dict[int, str] = {}
+        for kind, job, payload in events:
+            column = self.columns.get(job.job_id)
+            if column is None:
+                continue
+            textbox, stats_label = column
+            if kind in ("chunk", "tool"):
+                if job.job_id not in text_by_job:
+                    stats_label.configure(text="generating...")
+                text_by_job[job.job_id] = text_by_job.get(job.job_id, "") + payload
+                continue
+            if job.job_id in text_by_job:
+                self.append(textbox, text_by_job.pop(job.job_id))
+            self.finished += 1
+            summary = payload.summary() if payload else ""
+            stats_label.configure(text=summary + (" \u00B7 stopped" if kind == "cancelled" else ""))
+        for job_id, text in text_by_job.items():
+            self.append(self.columns[job_id][0], text)
+        if self.jobs and self.finished == len(self.jobs):
+            self.show_summary()
+
+    @staticmethod
+    def append(textbox, text: str):
+        textbox.configure(state="normal")
+        textbox.insert("end", text)
+        textbox.configure(state="disabled")
+
+    def show_summary(self):
+        wall = time.perf_counter() - self.started
+        totals = [job.stats.total_time for job in self.jobs if job.stats and job.stats.total_time]
+        text = f"All done in {wall:.1f} s"
+        if totals:
+            text += f" \u00B7 slowest model {max(totals):.1f} s \u00B7 one after another would take {sum(totals):.1f} s"
+        self.summary_label.configure(text=text)
+        self.jobs = []
+
+    def destroy(self):
+        self.stop()
+        self.master.compare_dialog = None
+        super().destroy()
+
+class HistoryDialog(ctk.CTkToplevel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("History")
+        self.geometry("560x600")
+        self.transient(parent)
+        self.store: ConversationStore = parent.conversation_store
+        self.search_due = None
+
+        self.search_entry = ctk.CTkEntry(self, placeholder_text="Search all chats...", height=35)
+        self.search_entry.pack(fill="x", padx=10, pady=(10, 0))
+        self.search_entry.bind("<KeyRelease>", lambda e: self.schedule_search())
+        self.search_entry.bind("<Return>", lambda e: self.run_search())
+        self.summary_label = ctk.CTkLabel(self, text="", font=("Arial", 10), text_color="gray")
+        self.summary_label.pack(anchor="w", padx=12)
+
+        self.results = ctk.CTkScrollableFrame(self, fg_color="transparent")
+        self.results.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.show_conversations()
+        self.search_entry.focus_set()
+
+    def clear_results(self):
+        for widget in self.results.winfo_children():
+            widget.destroy()
+
+    def add_row(self, title: str, detail: str, command, on_delete=None):
+        row = ctk.CTkFrame(self.results, fg_color="transparent")
+        row.pack(fill="x", pady=2)
+        row.grid_columnconfigure(0, weight=1)
+        ctk.CTkButton(
+            row,
+            text=f"{title}\n{detail}",
+            anchor="w",
+            font=("Arial", 12),
+            fg_color="#2B2B2B",
+            hover_color="#3A3A3A",
+            command=command
+        ).grid(row=0, column=0, sticky="ew")
+        if on_delete is not None:
+            ctk.CTkButton(
+                row,
+                text="\u2715",
+                width=30,
+                fg_color="transparent",
+                hover_color="#8B2E2E",
+                command=on_delete
+            ).grid(row=0, column=1, padx=(5, 0))
+
+    def show_conversations(self):
+        self.clear_results()
+        conversations = self.store.list_conversations(limit=100)
+        self.summary_label.configure(text=f"{len(conversations)} recent chats" if conversations else "No saved chats yet")
+        for conversation in conversations:
+            updated = datetime.fromtimestamp(conversation["updated"]).strftime("%d %b %Y %H:%M")
+            detail = f"{updated} \u00B7 {conversation['message_count']} messages"
+            if conversation["model"]:
+                detail += f" \u00B7 {conversation['model']}"
+            self.add_row(
+                conversation["title"] or "Untitled",
+                detail,
+                lambda cid=conversation["id"]: self.open(cid),
+                lambda cid=conversation["id"]: self.delete(cid)
+            )
+
+    def schedule_search(self):
+        # Search once typing pauses rather than on every key
+        if self.search_due is not None:
+            self.after_cancel(self.search_due)
+        self.search_due = self.after(200, self.run_search)
+
+    def run_search(self):
+        self.search_due = None
+        text = self.search_entry.get().strip()
+        if not text:
+            self.show_conversations()
+            return
+        started = time.perf_counter()
+        hits = self.store.search(text, limit=50)
+        elapsed = time.perf_counter() - started
+        self.clear_results()
+        self.summary_label.configure(text=f"{len(hits)} matches in {elapsed * 1000:.0f} ms")
+        for hit in hits:
+            created = datetime.fromtimestamp(hit["created"]).strftime("%d %b %Y %H:%M")
+            self.add_row(
+                f"{hit['title'] or 'Untitled'} \u00B7 {created}",
+                hit["snippet"].replace("\n", " "),
+                lambda cid=hit["conversation_id"], mid=hit["id"]: self.open(cid, mid)
+            )
+
+    def open(self, conversation_id: int, message_id: Optional[int] = None):
+        self.master.open_conversation(conversation_id, message_id)
+        self.destroy()
+
+    def delete(self, conversation_id: int):
+        if not messagebox.askyesno("Delete Chat", "Delete this chat for good?", parent=self):
+            return
+        self.store.delete_conversation(conversation_id)
+        if self.master.embedding_index is not None:
+            self.master.embedding_index.remove_conversation(conversation_id)
+        if self.master.conversation_id == conversation_id:
+            self.master.new_chat()
+        self.show_conversations()
+
+class AddServerDialog(ctk.CTkToplevel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Add Server")
+        self.geometry("400x340")
+        
+        # Make dialog modal
+        self.transient(parent)
+        self.grab_set()
+        
+        # Create content
+        content = ctk.CTkFrame(self)
+        content.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        # Server name
+        name_frame = ctk.CTkFrame(content, fg_color="transparent")
+        name_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(name_frame, text="Server Name:", font=("Arial", 12, "bold")).pack(anchor="w")
+        self.name_entry = ctk.CTkEntry(name_frame)
+        self.name_entry.pack(fill="x", pady=5)
+        
+        # Transport
+        transport_frame = ctk.CTkFrame(content, fg_color="transparent")
+        transport_frame.pack(fill="x", pady=10)
+        ctk.CTkLabel(transport_frame, text="Transport:", font=("Arial", 12, "bold")).pack(anchor="w")
+        self.transport_menu = ctk.CTkOptionMenu(
+            transport_frame,
+            values=["HTTP", "SSE", "stdio"],
+            command=self.on_transport_change
+        )
+        self.transport_menu.pack(fill="x", pady=5)
+        
+        # Server URL, or the command line for stdio servers
+        url_frame = ctk.CTkFrame(content, fg_color="transparent")
+        url_frame.pack(fill="x", pady=10)
+        self.url_label = ctk.CTkLabel(url_frame, text="Server URL:", font=("Arial", 12, "bold"))
+        self.url_label.pack(anchor="w")
+        self.url_entry = ctk.CTkEntry(url_frame)
+        self.url_entry.pack(fill="x", pady=5)
+        
+        # Add button
+        self.add_btn = ctk.CTkButton(
+            content,
+            text="Add Server",
+            command=self.add_server
+        )
+        self.add_btn.pack(pady=20)
+        self.check_results: queue.Queue = queue.Queue()
+    
+    def on_transport_change(self, choice):
+        self.url_label.configure(text="Command:" if choice == "stdio" else "Server URL:")
+    
+    def add_server(self):
+        name = self.name_entry.get().strip()
+        url = self.url_entry.get().strip()
+        
+        if name and url:
+            transport = self.transport_menu.get().lower()
+            if transport == "stdio":
+                server = MCPServer(name, "", command=shlex.split(url))
+            else:
+                server = MCPServer(name, url, mcp_transport=transport)
+            # Check the server off the UI thread and poll for the answer
+            self.add_btn.configure(state="disabled", text="Checking...")
+            worker = threading.Thread(target=lambda: self.check_results.put((server, server.check_status())))
+            worker.daemon = True
+            worker.start()
+            self.after(100, self.finish_add_server)
+        else:
+            messagebox.showerror("Error", "Please fill in all fields")
+    
+    def finish_add_server(self):
+        try:
+            server, online = self.check_results.get_nowait()
+        except queue.Empty:
+            self.after(100, self.finish_add_server)
+            return
+        if online:
+            self.master.add_server(server)
+            messagebox.showinfo("Success", f"Server {server.name} added successfully!")
+            self.destroy()
+        else:
+            self.add_btn.configure(state="normal", text="Add Server")
+            messagebox.showerror("Error", "Could not connect to server")
+
+class MCPClient(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+        
+        # Initialize Ollama client, seeded from the cached catalogue so startup never waits on Ollama
+        self.ollama_client = OllamaClient()
+        self.model_catalog = ModelCatalog()
+        self.ollama_client.available_models = self.model_catalog.cached_models(self.ollama_client.base_url)
+        self.model_updates: queue.Queue = queue.Queue()
+        
+        # Generation jobs run on background workers; replies are keyed by job id
+        self.scheduler = RequestScheduler(self.ollama_client)
+        self.pending_replies: Dict[int, int] = {}
+        # Chat history sent to /api/chat, trimmed to fit the model's context window
+        self.conversation = Conversation()
+        # Every chat is saved as it happens; the open one is created with its first message
+        self.conversation_store = ConversationStore()
+        self.conversation_id: Optional[int] = None
+        self.reply_conversations: Dict[int, int] = {}
+        # The user turn each reply answers, in self.conversation
+        self.reply_turns: Dict[int, int] = {}
+        self.compare_dialog = None
+        # Semantic index over saved chats and MCP resources; numpy is only imported once it's turned on
+        self.embedding_index = None
+        # Evaluates the prompt in Ollama while it's typed, once turned on in Settings
+        self.prompt_prefill = PromptPrefill(self.ollama_client, self.scheduler.tool_catalog)
+        self.prefill_due = None
+
+        # Initialize server discovery
+        self.server_discovery = ServerDiscovery()
+        self.known_servers = ServerRegistry()
+        # Registry events can come from worker threads, so they are queued for the UI thread
+        self.server_events: queue.Queue = queue.Queue()
+        self.known_servers.subscribe(lambda event, server: self.server_events.put((event, server, None)))
+        # Servers discovery finds (from its cache, servers.json, DNS-SD or a port sweep) are listed as they turn up
+        self.server_discovery.registry.subscribe(self.on_discovery_event)
+        self.server_names: List[str] = []
+        # Per-server MCP state shown in the sidebar, keyed by server key
+        self.server_tools: Dict[str, List[Dict]] = {}
+        self.server_activity: Dict[str, str] = {}
+        self.subscribed_sessions: set = set()
+        self.health_monitor = HealthMonitor(self.known_servers)
+        self.metrics_server = None
+        # Loads the selected model ahead of the first message and keeps it in memory
+        self.model_lifecycle = ModelLifecycle(self.ollama_client)
+        
+        # Configure window
+        self.title("MCP Client")
+        self.geometry("1200x800")
+        self.minsize(800, 600)
+        
+        # Configure grid layout
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        
+        # Create sidebar
+        self.create_sidebar()
+        
+        # Create main chat area
+        self.create_chat_area()
+        
+        # Start server discovery
+        self.server_discovery.start_discovery()
+        
+        # Start checking known servers in the background
+        self.health_monitor.start()
+        self.model_lifecycle.start()
+        
+        # Refresh the model list once the window is up
+        self.after(100, self.refresh_models)
+        
+        # Widgets change once per frame, at most 30 times a second: results and server events are drained
+        # at the start of each frame and repeated updates to the same widget collapse into one
+        self.ui_updates = UIUpdateScheduler(self, max_fps=30)
+        self.ui_updates.add_source(self.process_generation_results)
+        self.ui_updates.add_source(self.process_server_events)
+        self.ui_updates.every("server_status", 0.2, self.update_server_status)
+        self.ui_updates.every("model_state", 0.5, self.update_model_state)
+        self.ui_updates.start()
+        
+    def create_sidebar(self):
+        sidebar = ctk.CTkFrame(self, width=250, corner_radius=0)
+        sidebar.grid(row=0, column=0, sticky="nsew")
+        sidebar.grid_rowconfigure(4, weight=1)
+        
+        # Logo/Title
+        title_frame = ctk.CTkFrame(sidebar, fg_color="transparent")
+        title_frame.pack(fill="x", padx=20, pady=(20, 10))
+        ctk.CTkLabel(
+            title_frame,
+            text="MCP Client",
+            font=("Arial", 24, "bold")
+        ).pack()
+        
+        # LLM Selection
+        llm_frame = ctk.CTkFrame(sidebar, fg_color="transparent")
+        llm_frame.pack(fill="x", padx=20, pady=10)
+        ctk.CTkLabel(
+            llm_frame,
+            text="Choose LLM:",
+            font=("Arial", 12, "bold")
+        ).pack(anchor="w")
+        self.llm_selector = ctk.CTkOptionMenu(
+            llm_frame,
+            values=self.ollama_client.available_models or ["Loading models..."],
+            font=("Arial", 12),
+            command=self.on_llm_change
+        )
+        self.llm_selector.pack(fill="x", pady=(5, 0))
+        self.model_info_label = ctk.CTkLabel(
+            llm_frame,
+            text="",
+            font=("Arial", 10),
+            text_color="gray"
+        )
+        self.model_info_label.pack(anchor="w")
+        self.model_state_label = ctk.CTkLabel(
+            llm_frame,
+            text="",
+            font=("Arial", 10),
+            text_color="gray"
+        )
+        self.model_state_label.pack(anchor="w")
+        ctk.CTkButton(
+            llm_frame,
+            text="Compare Models",
+            font=("Arial", 12),
+            height=30,
+            command=self.show_compare_dialog
+        ).pack(fill="x", pady=(5, 0))
+        
+        # Server Selection
+        server_frame = ctk.CTkFrame(sidebar, fg_color="transparent")
+        server_frame.pack(fill="x", padx=20, pady=10)
+        ctk.CTkLabel(
+            server_frame,
+            text="MCP Servers:",
+            font=("Arial", 12, "bold")
+        ).pack(anchor="w")
+        self.server_list = ctk.CTkOptionMenu(
+            server_frame,
+            values=["No servers available"],
+            font=("Arial", 12),
+            command=self.on_server_change
+        )
+        self.server_list.pack(fill="x", pady=(5, 0))
+        self.server_status_label = ctk.CTkLabel(
+            server_frame,
+            text="",
+            font=("Arial", 10),
+            text_color="gray"
+        )
+        self.server_status_label.pack(anchor="w")
+        self.tools_switch = ctk.CTkSwitch(
+            server_frame,
+            text="Let the model use MCP tools",
+            font=("Arial", 12)
+        )
+        self.tools_switch.select()
+        self.tools_switch.pack(anchor="w", pady=(5, 0))
+        
+        # Server Management Buttons
+        button_frame = ctk.CTkFrame(sidebar, fg_color="transparent")
+        button_frame.pack(fill="x", padx=20, pady=10)
+        
+        self.add_server_btn = ctk.CTkButton(
+            button_frame,
+            text="Add Server",
+            font=("Arial", 12),
+            height=35,
+            command=self.show_add_server_dialog
+        )
+        self.add_server_btn.pack(fill="x", pady=(0, 5))
+        
+        self.discover_server_btn = ctk.CTkButton(
+            button_frame,
+            text="Discover Servers",
+            font=("Arial", 12),
+            height=35,
+            command=self.discover_servers
+        )
+        self.discover_server_btn.pack(fill="x", pady=(0, 5))
+        self.discovery_label = ctk.CTkLabel(
+            button_frame,
+            text="",
+            font=("Arial", 10),
+            text_color="gray"
+        )
+        self.discovery_label.pack(anchor="w")
+        self.discovery_label_due = None
+        
+        self.new_chat_btn = ctk.CTkButton(
+            button_frame,
+            text="New Chat",
+            font=("Arial", 12),
+            height=35,
+            command=self.new_chat
+        )
+        self.new_chat_btn.pack(fill="x", pady=(0, 5))
+
+        self.history_btn = ctk.CTkButton(
+            button_frame,
+            text="History",
+            font=("Arial", 12),
+            height=35,
+            command=self.show_history_dialog
+        )
+        self.history_btn.pack(fill="x")
+
+        # Settings button at bottom
+        settings_btn = ctk.CTkButton(
+            sidebar,
+            text="Settings",
+            font=("Arial", 12),
+            height=35,
+            command=self.show_settings_dialog
+        )
+        settings_btn.pack(side="bottom", fill="x", padx=20, pady=20)
+        
+        stats_btn = ctk.CTkButton(
+            sidebar,
+            text="Stats",
+            font=("Arial", 12),
+            height=35,
+            command=self.show_stats_dialog
+        )
+        stats_btn.pack(side="bottom", fill="x", padx=20)
+        
+    def create_chat_area(self):
+        # Main chat container
+        chat_container = ctk.CTkFrame(self)
+        chat_container.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
+        chat_container.grid_rowconfigure(0, weight=1)
+        chat_container.grid_columnconfigure(0, weight=1)
+        
+        # Chat history
+        self.chat_history = ChatHistoryView(
+            chat_container,
+            fg_color="transparent"
+        )
+        self.chat_history.grid(row=0, column=0, sticky="nsew")
+        
+        # Input area
+        input_frame = ctk.CTkFrame(chat_container)
+        input_frame.grid(row=1, column=0, sticky="ew", pady=(10, 0))
+        input_frame.grid_columnconfigure(0, weight=1)
+        
+        self.chat_input = ctk.CTkEntry(
+            input_frame,
+            placeholder_text="Type your message here...",
+            height=40,
+            font=("Arial", 12)
+        )
+        self.chat_input.grid(row=0, column=0, sticky="ew", padx=(0, 10))
+        
+        self.send_btn = ctk.CTkButton(
+            input_frame,
+            text="Send",
+            width=100,
+            height=40,
+            font=("Arial", 12),
+            command=self.send_message
+        )
+        self.send_btn.grid(row=0, column=1)
+        
+        self.stop_btn = ctk.CTkButton(
+            input_frame,
+            text="Stop",
+            width=80,
+            height=40,
+            font=("Arial", 12),
+            fg_color="#8B2E2E",
+            hover_color="#A33A3A",
+            command=self.stop_generation
+        )
+        self.stop_btn.grid(row=0, column=2, padx=(10, 0))
+        
+        # Bind enter key to send message
+        self.chat_input.bind("<Return>", lambda e: self.send_message())
+        self.chat_input.bind("<KeyRelease>", self.on_input_changed)
+    
+    def show_settings_dialog(self):
+        SettingsDialog(self)
+    
+    def show_stats_dialog(self):
+        StatsDialog(self)
+
+    def show_history_dialog(self):
+        HistoryDialog(self)
+
+    def show_compare_dialog(self):
+        if self.compare_dialog is not None:
+            self.compare_dialog.focus()
+            return
+        CompareDialog(self)
+
+    def set_metrics(self, enabled: bool, port=None) -> bool:
+        METRICS.enabled = enabled
+        current = self.metrics_server.httpd.server_address[1] if self.metrics_server else None
+        if enabled and port == current:
+            return True
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if enabled and port:
+            try:
+                self.metrics_server = MetricsServer(METRICS, port=port)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not serve metrics on port {port}: {e}")
+                return False
+            self.metrics_server.start()
+        return True
+    
+    def set_prefill(self, enabled: bool):
+        self.scheduler.prefill = self.prompt_prefill if enabled else None
+        if not enabled:
+            self.prompt_prefill.cancel()
+    
+    def on_input_changed(self, event=None):
+        # Debounced: the prompt is only sent once typing pauses
+        if self.scheduler.prefill is None or event is not None and event.keysym == "Return":
+            return
+        if self.prefill_due is not None:
+            self.after_cancel(self.prefill_due)
+        self.prefill_due = self.after(600, self.prefill_prompt)
+    
+    def prefill_prompt(self):
+        self.prefill_due = None
+        prefill = self.scheduler.prefill
+        model = self.ollama_client.current_model
+        draft = self.chat_input.get().strip()
+        # Not before the model is in memory: loading it is already under way and would only be delayed
+        if prefill is None or not draft or not model or self.model_lifecycle.state_of(model) != "loaded":
+            return
+        wait = prefill.retry_after()
+        if wait > 0:
+            self.prefill_due = self.after(int(wait * 1000) + 50, self.prefill_prompt)
+            return
+        messages = self.conversation.draft_messages(draft)
+        if messages is not None:
+            prefill.request(messages, model, self.conversation.options(), self.tool_servers(),
+                            busy=self.scheduler.in_flight() > 0)
+    
+    def set_retrieval(self, enabled: bool, model: str) -> bool:
+        index = self.embedding_index
+        if index is not None and (not enabled or index.model != model):
+            self.scheduler.retriever = None
+            index.close()
+            self.embedding_index = None
+        if not enabled or self.embedding_index is not None:
+            return True
+        try:
+            from .embeddings import EmbeddingIndex
+        except ImportError:
+            messagebox.showerror("Error", "Using earlier chats needs numpy (pip install numpy)")
+            return False
+        index = EmbeddingIndex(self.ollama_client, model)
+        self.embedding_index = index
+        self.scheduler.retriever = index
+        # Catch up on chats saved before, and on what connected servers offer, in the background
+        index.executor.submit(index.index_store, self.conversation_store)
+        for server in self.known_servers:
+            if server.is_connected():
+                index.executor.submit(index.index_resources, server)
+        return True
+    
+    def show_add_server_dialog(self):
+        AddServerDialog(self)
+    
+    def discover_servers(self):
+        # Passive discovery keeps the list current; the button sweeps the port range on top of it
+        known = {server.key for server in self.known_servers}
+
+        def done(found: List[MCPServer]):
+            # On the discovery thread
+            new_servers = [server for server in found if server.key not in known]
+            text = f"Found {len(found)} servers ({len(new_servers)} new)" if found else "No servers found"
+            if self.server_discovery.scan_error:
+                text = self.server_discovery.scan_error
+            self.ui_updates.post(("discovery_result",), self.show_discovery_result, text)
+
+        self.show_discovery_result("Scanning ports...")
+        self.server_discovery.request_scan(done)
+    
+    def on_discovery_event(self, event: str, server: MCPServer):
+        # Called on whichever thread discovery is running on; the registry queues its own events for the UI
+        if event == ServerRegistry.ADDED:
+            self.known_servers.add(server)
+        elif event == ServerRegistry.REMOVED:
+            # Taken out of servers.json
+            self.known_servers.remove(server)
+    
+    def show_discovery_result(self, text: str):
+        self.discovery_label.configure(text=text)
+        if self.discovery_label_due is not None:
+            self.after_cancel(self.discovery_label_due)
+        self.discovery_label_due = self.after(5000, lambda: self.discovery_label.configure(text=""))
+    
+    def add_server(self, server: MCPServer) -> MCPServer:
+        # Remembered so it is listed again on the next start
+        self.server_discovery.cache.seen(server, "manual")
+        return self.known_servers.add(server)
+    
+    def process_server_events(self):
+        while True:
+            try:
+                event, server, payload = self.server_events.get_nowait()
+            except queue.Empty:
+                break
+            self.on_server_event(event, server, payload)
+    
+    def on_server_event(self, event: str, server: MCPServer, payload=None):
+        if event == "connected":
+            self.server_tools[server.key] = payload
+            self.server_activity[server.key] = ""
+            if self.embedding_index is not None:
+                self.embedding_index.executor.submit(self.embedding_index.index_resources, server)
+            self.ui_updates.post(("server_status",), self.update_server_status)
+            return
+        if event == "connect_failed":
+            self.server_activity[server.key] = payload
+            self.ui_updates.post(("server_status",), self.update_server_status)
+            return
+        if event == "notification":
+            method, params = payload
+            if method == "notifications/progress":
+                total = params.get("total")
+                progress = params.get("progress")
+                self.server_activity[server.key] = f"progress {progress}/{total}" if total else f"progress {progress}"
+            elif method == "notifications/message":
+                self.server_activity[server.key] = str(params.get("data", ""))[:60]
+            self.ui_updates.post(("server_status",), self.update_server_status)
+            return
+        if event == ServerRegistry.ADDED:
+            self.server_names.append(server.name)
+        elif event == ServerRegistry.REMOVED:
+            if server.name in self.server_names:
+                self.server_names.remove(server.name)
+        else:
+            return
+        # A discovery sweep adds servers in bursts; the option menu is rebuilt once per frame
+        self.ui_updates.post(("server_list",), self.update_server_list)
+    
+    def update_server_status(self):
+        server = self.known_servers.find_by_name(self.server_list.get())
+        text = ""
+        if server:
+            text = f"\u25CF {server.status}"
+            health = self.health_monitor.health_for(server)
+            if health and health.latencies:
+                summary = health.summary()
+                text += f" \u00B7 p50 {summary['p50'] * 1000:.0f} ms \u00B7 p95 {summary['p95'] * 1000:.0f} ms"
+            if server.key in self.server_tools:
+                text += f"\n{len(self.server_tools[server.key])} tools"
+            if self.server_activity.get(server.key):
+                text += f"\n{self.server_activity[server.key]}"
+        if self.server_status_label.cget("text") != text:
+            color = {"online": "#4CAF50", "offline": "#E57373"}.get(server.status if server else "", "gray")
+            self.server_status_label.configure(text=text, text_color=color)
+    
+    def update_server_list(self):
+        server_names = self.server_names or ["No servers available"]
+        self.server_list.configure(values=server_names)
+        # Keep the current selection unless it went away
+        if self.server_list.get() not in server_names:
+            self.server_list.set(server_names[0])
+    
+    def refresh_models(self):
+        client = self.ollama_client
+        worker = threading.Thread(target=lambda: self.model_updates.put((client, self.model_catalog.refresh(client))))
+        worker.daemon = True
+        worker.start()
+        self.after(100, self.finish_model_refresh)
+    
+    def finish_model_refresh(self):
+        try:
+            client, models = self.model_updates.get_nowait()
+        except queue.Empty:
+            self.after(100, self.finish_model_refresh)
+            return
+        # Ignore results for a client that was replaced in the meantime
+        if client is self.ollama_client:
+            client.available_models = models
+            self.update_llm_list()
+    
+    def update_llm_list(self):
+        models = self.ollama_client.available_models
+        if not models:
+            models = ["No models available"]
+        self.llm_selector.configure(values=models)
+        if models[0] != "No models available" and self.llm_selector.get() not in models:
+            self.llm_selector.set(models[0])
+        self.update_model_info()
+    
+    def update_model_info(self):
+        model = self.llm_selector.get()
+        self.model_info_label.configure(text=self.model_catalog.describe(self.ollama_client.base_url, model))
+    
+    def update_model_state(self):
+        model = self.llm_selector.get()
+        text = ""
+        if model in self.ollama_client.available_models:
+            text = self.model_lifecycle.describe(model)
+        if self.model_state_label.cget("text") != text:
+            state = self.model_lifecycle.state_of(model)
+            color = {"loaded": "#4CAF50", "loading": "#E0B040", "failed": "#E57373"}.get(state, "gray")
+            self.model_state_label.configure(text=text, text_color=color)
+    
+    def on_llm_change(self, choice):
+        self.ollama_client.current_model = choice
+        self.prompt_prefill.cancel()
+        # Start loading now so the first message doesn't wait for it
+        self.model_lifecycle.activate(choice)
+        self.update_model_info()
+        messagebox.showinfo("LLM Changed", f"Selected LLM: {choice}")
+    
+    def on_server_change(self, choice):
+        # Connecting is the selection; progress shows up under the server list
+        if choice != "No servers available":
+            server = self.known_servers.find_by_name(choice)
+            if server:
+                self.connect_server(server)
+    
+    def tool_servers(self) -> List[MCPServer]:
+        # Every server the user has connected to this session contributes its tools
+        if not self.tools_switch.get():
+            return []
+        return [server for server in self.known_servers if server.is_connected()]
+    
+    def connect_server(self, server: MCPServer):
+        # Opens the MCP session in the background; results arrive through server_events
+        def worker():
+            try:
+                session = server.connect()
+                if id(session) not in self.subscribed_sessions:
+                    self.subscribed_sessions.add(id(session))
+                    session.subscribe(
+                        lambda method, params: self.server_events.put(("notification", server, (method, params)))
+                    )
+                self.server_events.put(("connected", server, server.list_tools()))
+            except MCPError as e:
+                self.server_events.put(("connect_failed", server, str(e)))
+        
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+    
+    def send_message(self):
+        message = self.chat_input.get().strip()
+        if self.prefill_due is not None:
+            self.after_cancel(self.prefill_due)
+            self.prefill_due = None
+        if message and self.pending_replies:
+            # One reply at a time per chat: a second send would be built without the first reply,
+            # and the two replies would land out of order
+            self.chat_history.add_message("Wait for the reply to finish, or press Stop", is_user=False)
+            return
+        if message:
+            # Add user message
+            self.chat_history.add_message(message, is_user=True)
+            # Clear input
+            self.chat_input.delete(0, "end")
+            
+            # Get response from Ollama
+            if self.ollama_client.current_model:
+                # In the history before the job is queued, since a worker may build the prompt right away;
+                # taken back out if the job is refused or gets no reply
+                turn = self.conversation.add_user(message)
+                job = self.scheduler.submit(message, conversation=self.conversation, servers=self.tool_servers())
+                if job is None:
+                    self.conversation.remove_user(turn)
+                    self.chat_history.add_message("Too many requests in flight, please wait", is_user=False)
+                    return
+                self.model_lifecycle.record_use(job.model)
+                self.save_message("user", message, job.model)
+                self.reply_conversations[job.job_id] = self.conversation_id
+                self.reply_turns[job.job_id] = turn
+                # The reply is filled in by process_generation_results as chunks arrive
+                self.pending_replies[job.job_id] = self.chat_history.add_message("", is_user=False)
+            else:
+                self.chat_history.add_message("Please select an LLM model first", is_user=False)
+
+    def stop_generation(self):
+        # Chat replies only; a comparison has its own Stop button
+        for job_id in self.pending_replies:
+            self.scheduler.cancel(job_id)
+    
+    def forget_replies(self):
+        # The chat view is about to be replaced; updates still queued for its replies would land on other messages
+        self.pending_replies.clear()
+        self.reply_turns.clear()
+        self.prompt_prefill.cancel()
+        self.ui_updates.discard(lambda key: key[0] == "reply")
+    
+    def new_chat(self):
+        self.stop_generation()
+        self.forget_replies()
+        self.conversation.clear()
+        self.chat_history.clear()
+        self.conversation_id = None
+
+    def save_message(self, role: str, text: str, model: Optional[str], stats: Optional[GenerationStats] = None,
+                     conversation_id: Optional[int] = None):
+        if conversation_id is None:
+            if self.conversation_id is None:
+                # Named after its first message, like most chat apps do
+                self.conversation_id = self.conversation_store.create_conversation(text.split("\n")[0][:60], model)
+            conversation_id = self.conversation_id
+        message_id = self.conversation_store.add_message(conversation_id, role, text, model=model,
+                                                         server=self.ollama_client.base_url, stats=stats)
+        if self.embedding_index is not None:
+            self.embedding_index.submit(text, "chat", message_id, conversation=conversation_id, role=role)
+
+    def open_conversation(self, conversation_id: int, message_id: Optional[int] = None, page_size: int = 100):
+        # Only the newest page is read now; older ones load as the view scrolls up to them
+        self.stop_generation()
+        self.forget_replies()
+        page = self.conversation_store.load_page(conversation_id, limit=page_size)
+        # The newest messages are also the model's context, trimmed to fit on the next request
+        self.conversation.restore(page)
+        self.conversation_id = conversation_id
+        loaded_ids = [message["id"] for message in page]
+
+        def load_older() -> List[ChatRecord]:
+            if not loaded_ids:
+                return []
+            older = self.conversation_store.load_page(conversation_id, before_id=loaded_ids[0], limit=page_size)
+            loaded_ids[:0] = [message["id"] for message in older]
+            return [ChatRecord.from_stored(message) for message in older]
+
+        self.chat_history.set_records([ChatRecord.from_stored(message) for message in page], load_older)
+        if message_id is not None:
+            # A search hit may be further back; page until it is in view
+            while loaded_ids and loaded_ids[0] > message_id:
+                older = load_older()
+                if not older:
+                    break
+                self.chat_history.prepend(older)
+            if message_id in loaded_ids:
+                self.chat_history.scroll_to(loaded_ids.index(message_id))
+    
+    def process_generation_results(self):
+        # Chunks for the same reply merge into one append per frame, however fast tokens arrive
+        compare_events = []
+        for kind, job, payload in self.scheduler.poll():
+            if job.group is not None:
+                compare_events.append((kind, job, payload))
+                continue
+            if kind in ("chunk", "tool"):
+                reply = self.pending_replies.get(job.job_id)
+                if reply is not None:
+                    self.ui_updates.post(("reply", job.job_id),
+                                         lambda text, reply=reply: self.chat_history.append_text(reply, text),
+                                         payload, merge=operator.add)
+                continue
+            answered = bool(job.text) and job.error is None
+            conversation_id = self.reply_conversations.pop(job.job_id, None)
+            if conversation_id is not None and answered:
+                # Saved once it's complete, even if the chat was left meanwhile
+                self.save_message("assistant", job.text, job.model, payload, conversation_id)
+            turn = self.reply_turns.pop(job.job_id, None)
+            reply = self.pending_replies.pop(job.job_id, None)
+            if reply is None:
+                continue
+            if job.conversation is not None and turn is not None:
+                if answered:
+                    job.conversation.add_assistant(job.text, payload, turn)
+                else:
+                    job.conversation.remove_user(turn)
+            if kind == "done" and answered:
+                self.model_lifecycle.mark_loaded(job.model)
+            # Posted after the reply's text, so it is applied after it
+            self.ui_updates.post(("reply", job.job_id, kind),
+                                 lambda stats, reply=reply, kind=kind: self.finish_reply(reply, kind, stats), payload)
+        if compare_events and self.compare_dialog is not None:
+            self.ui_updates.post(("compare",), self.update_compare_dialog, compare_events, merge=operator.add)
+    
+    def finish_reply(self, reply: int, kind: str, stats: Optional[GenerationStats]):
+        if kind == "cancelled":
+            self.chat_history.append_text(reply, " [stopped]")
+        elif stats:
+            self.chat_history.set_stats(reply, stats)
+    
+    def update_compare_dialog(self, events: list):
+        # The dialog may have been closed since the events were posted
+        if self.compare_dialog is not None:
+            self.compare_dialog.on_events(events)
+    
+    def destroy(self):
+        self.ui_updates.stop()
+        self.server_discovery.stop_discovery()
+        self.scheduler.shutdown()
+        self.health_monitor.stop()
+        self.model_lifecycle.stop()
+        self.ollama_client.close()
+        if self.embedding_index is not None:
+            self.embedding_index.close()
+        self.conversation_store.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        for server in self.known_servers:
+            server.disconnect()
+        super().destroy()
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from .mcp import MCPServer
+from .registry import ServerRegistry
+
+class ServerHealth:
+    def __init__(self, interval: float, max_samples: int = 500):
+        self.interval = interval
+        self.next_check = 0.0
+        self.consecutive_failures = 0
+        self.latencies: deque = deque(maxlen=max_samples)
+        self.transitions: deque = deque(maxlen=10)
+        self.last_healthy: Optional[bool] = None
+        self.checking = False
+
+    def record(self, healthy: bool, latency: float):
+        if healthy:
+            self.consecutive_failures = 0
+            self.latencies.append(latency)
+        else:
+            self.consecutive_failures += 1
+        if self.last_healthy is not None and healthy != self.last_healthy:
+            self.transitions.append(time.monotonic())
+        self.last_healthy = healthy
+
+    def flaps(self, window: float) -> int:
+        cutoff = time.monotonic() - window
+        return sum(1 for t in self.transitions if t >= cutoff)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "interval": self.interval,
+            "failures": self.consecutive_failures,
+        }
+
+class HealthMonitor:
+    def __init__(self, registry: ServerRegistry, base_interval: float = 10.0, min_interval: float = 2.0,
+                 max_interval: float = 60.0, max_backoff: float = 300.0, flap_window: float = 120.0,
+                 max_workers: int = 16, timeout: float = 5.0):
+        self.registry = registry
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.flap_window = flap_window
+        self.timeout = timeout
+        self.health: Dict[str, ServerHealth] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="health")
+        self.stop_event = threading.Event()
+        self.monitor_thread = None
+        registry.subscribe(self._on_registry_event)
+
+    def start(self):
+        if self.monitor_thread:
+            return
+        for server in self.registry:
+            self._track(server)
+        self.monitor_thread = threading.Thread(target=self._monitor_worker)
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.monitor_thread:
+            self.monitor_thread.join()
+            self.monitor_thread = None
+        self.executor.shutdown(wait=False)
+
+    def health_for(self, server: MCPServer) -> Optional[ServerHealth]:
+        with self.lock:
+            return self.health.get(server.key)
+
+    def check_now(self, server: MCPServer):
+        # Moves the server to the front of the schedule
+        with self.lock:
+            health = self.health.get(server.key)
+            if health:
+                health.next_check = 0.0
+
+    def _track(self, server: MCPServer):
+        with self.lock:
+            self.health.setdefault(server.key, ServerHealth(self.base_interval))
+
+    def _on_registry_event(self, event: str, server: MCPServer):
+        if event == ServerRegistry.ADDED:
+            self._track(server)
+        elif event == ServerRegistry.REMOVED:
+            with self.lock:
+                self.health.pop(server.key, None)
+
+    def _monitor_worker(self):
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            due = []
+            with self.lock:
+                for key, health in self.health.items():
+                    if not health.checking and health.next_check <= now:
+                        health.checking = True
+                        due.append(key)
+            # Checks run concurrently; the loop itself only schedules
+            for key in due:
+                server = self.registry.get(key)
+                if server is None:
+                    with self.lock:
+                        if key in self.health:
+                            self.health[key].checking = False
+                    continue
+                self.executor.submit(self._check, server)
+            self.stop_event.wait(0.25)
+
+    def _check(self, server: MCPServer):
+        try:
+            healthy, latency = server.probe(self.timeout)
+        except Exception:
+            # A probe that raises counts as a failed check
+            healthy, latency = False, 0.0
+        with self.lock:
+            health = self.health.get(server.key)
+            if health is not None:
+                try:
+                    health.record(healthy, latency)
+                    health.interval = self._next_interval(health, healthy)
+                finally:
+                    # Always cleared, or the monitor would never schedule this server again
+                    health.next_check = time.monotonic() + health.interval
+                    health.checking = False
+        if health is not None:
+            self.registry.set_status(server, "online" if healthy else "offline")
+
+    def _next_interval(self, health: ServerHealth, healthy: bool) -> float:
+        # Flapping servers are watched closely, stable ones relax, dead ones back off
+        if health.flaps(self.flap_window) >= 3:
+            return self.min_interval
+        if not healthy:
+            # The exponent is capped; max_backoff is reached long before, and a huge power would overflow
+            return min(self.base_interval * 2 ** min(health.consecutive_failures - 1, 16), self.max_backoff)
+        if health.transitions and health.transitions[-1] >= time.monotonic() - self.base_interval:
+            return self.base_interval
+        return min(max(health.interval, self.base_interval) * 1.5, self.max_interval)
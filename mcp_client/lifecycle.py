@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from . import APP_DIR
+from .ollama import OllamaClient
+
+class ModelState:
+    UNLOADED = "unloaded"
+    LOADING = "loading"
+    LOADED = "loaded"
+    FAILED = "failed"
+
+    def __init__(self):
+        self.state = self.UNLOADED
+        self.load_time: Optional[float] = None
+        self.expires_at: Optional[str] = None
+        self.changed = time.monotonic()
+
+    def set(self, state: str):
+        self.state = state
+        self.changed = time.monotonic()
+
+class ModelLifecycle:
+    # Loads models before they're needed and keeps the active one in memory
+    def __init__(self, ollama_client: OllamaClient, usage_path: Optional[str] = None,
+                 prewarm_count: int = 0, check_interval: float = 30.0):
+        self.ollama_client = ollama_client
+        self.usage_path = usage_path or os.path.join(APP_DIR, "model_usage.json")
+        # How many of the most used models to load at start, besides the active one
+        self.prewarm_count = prewarm_count
+        self.check_interval = check_interval
+        self.states: Dict[str, ModelState] = {}
+        self.usage: Dict[str, int] = self._load_usage()
+        self.active_model: Optional[str] = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-load")
+        self.stop_event = threading.Event()
+        self.check_now = threading.Event()
+        self.monitor_thread = None
+
+    def _load_usage(self) -> Dict[str, int]:
+        try:
+            with open(self.usage_path, "r", encoding="utf-8") as f:
+                usage = json.load(f)
+            return {str(name): int(count) for name, count in usage.items()} if isinstance(usage, dict) else {}
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _save_usage(self):
+        with self.lock:
+            usage = dict(self.usage)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.usage_path)), exist_ok=True)
+            tmp_path = f"{self.usage_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(usage, f)
+            os.replace(tmp_path, self.usage_path)
+        except OSError:
+            pass
+
+    def start(self):
+        if self.monitor_thread:
+            return
+        self.prewarm()
+        self.monitor_thread = threading.Thread(target=self._monitor_worker)
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.check_now.set()
+        if self.monitor_thread:
+            self.monitor_thread.join()
+            self.monitor_thread = None
+        self.executor.shutdown(wait=False)
+
+    def set_client(self, ollama_client: OllamaClient):
+        # A new server (or pool) knows nothing about what the old one had loaded
+        with self.lock:
+            self.ollama_client = ollama_client
+            self.states = {}
+        self.prewarm()
+        if self.active_model:
+            self.preload(self.active_model)
+
+    def activate(self, model: str):
+        self.active_model = model
+        self.preload(model)
+
+    def record_use(self, model: str):
+        with self.lock:
+            self.usage[model] = self.usage.get(model, 0) + 1
+        self.executor.submit(self._save_usage)
+
+    def most_used(self, count: int) -> List[str]:
+        with self.lock:
+            ranked = sorted(self.usage.items(), key=lambda item: -item[1])
+        available = set(self.ollama_client.available_models)
+        return [name for name, _ in ranked if not available or name in available][:count]
+
+    def prewarm(self):
+        for model in self.most_used(self.prewarm_count):
+            self.preload(model)
+
+    def preload(self, model: str):
+        with self.lock:
+            state = self.states.setdefault(model, ModelState())
+            if state.state in (ModelState.LOADING, ModelState.LOADED):
+                return
+            state.set(ModelState.LOADING)
+            client = self.ollama_client
+        self.executor.submit(self._load, client, model)
+
+    def _load(self, client: OllamaClient, model: str):
+        started = time.perf_counter()
+        load_time = client.load_model(model)
+        with self.lock:
+            # Ignore results for a client that was replaced in the meantime
+            if client is not self.ollama_client:
+                return
+            state = self.states.setdefault(model, ModelState())
+            if load_time is None:
+                state.set(ModelState.FAILED)
+                return
+            state.set(ModelState.LOADED)
+            state.load_time = load_time or time.perf_counter() - started
+        self.check_now.set()
+
+    def mark_loaded(self, model: str):
+        # A finished generation proves the model is in memory
+        with self.lock:
+            state = self.states.setdefault(model, ModelState())
+            if state.state != ModelState.LOADED:
+                state.set(ModelState.LOADED)
+
+    def refresh(self):
+        # Blocking; reconciles our view with /api/ps
+        client = self.ollama_client
+        running = client.fetch_running()
+        if running is None:
+            return
+        loaded = {}
+        for entry in running:
+            loaded.setdefault(entry.get('name'), entry.get('expires_at'))
+        with self.lock:
+            if client is not self.ollama_client:
+                return
+            for name, expires_at in loaded.items():
+                state = self.states.setdefault(name, ModelState())
+                if state.state != ModelState.LOADED:
+                    state.set(ModelState.LOADED)
+                state.expires_at = expires_at
+            for name, state in self.states.items():
+                if name not in loaded and state.state == ModelState.LOADED:
+                    state.set(ModelState.UNLOADED)
+                    state.expires_at = None
+            active = self.active_model
+            evicted = active is not None and self.states.get(active, ModelState()).state == ModelState.UNLOADED
+        # The active model is kept resident even if Ollama let it go
+        if evicted:
+            self.preload(active)
+
+    def _monitor_worker(self):
+        while not self.stop_event.is_set():
+            self.refresh()
+            self.check_now.wait(self.check_interval)
+            self.check_now.clear()
+
+    def state_of(self, model: str) -> str:
+        with self.lock:
+            state = self.states.get(model)
+            return state.state if state else ModelState.UNLOADED
+
+    def describe(self, model: str) -> str:
+        with self.lock:
+            state = self.states.get(model)
+            if state is None:
+                return "\u25CB not loaded"
+            if state.state == ModelState.LOADING:
+                return f"\u25CC loading... {time.monotonic() - state.changed:.0f} s"
+            if state.state == ModelState.FAILED:
+                return "\u2715 failed to load"
+            if state.state == ModelState.UNLOADED:
+                return "\u25CB not loaded"
+            text = "\u25CF loaded"
+            if state.load_time:
+                text += f" in {state.load_time:.1f} s"
+            expires = self._format_expiry(state.expires_at)
+            if expires:
+                text += f" \u00B7 {expires}"
+            return text
+
+    @staticmethod
+    def _format_expiry(expires_at: Optional[str]) -> Optional[str]:
+        # Ollama reports RFC 3339 with nanoseconds and an offset; far-future dates mean "forever"
+        if not expires_at:
+            return None
+        try:
+            stamp = expires_at.replace("Z", "+00:00")
+            if "." in stamp:
+                head, tail = stamp.split(".", 1)
+                offset = tail[next((i for i, c in enumerate(tail) if c in "+-"), len(tail)):]
+                stamp = head + offset
+            expires = datetime.fromisoformat(stamp)
+        except ValueError:
+            return None
+        if expires.year > datetime.now().year + 1:
+            return "kept loaded"
+        return f"until {expires.astimezone().strftime('%H:%M')}"
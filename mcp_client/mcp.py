@@ -0,0 +1,710 @@
+import itertools
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Any, List, Dict, Optional, Iterator, Callable
+from urllib.parse import urlsplit, urljoin
+
+import requests
+
+from .metrics import METRICS
+from .transport import HTTPTransport, DEFAULT_TRANSPORT
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    # stdio servers are identified by their command line
+    if parts.scheme == "stdio":
+        return url.strip()
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/")
+    return f"{scheme}://{host}{path}"
+
+# Error code of requests failed by the transport itself rather than answered by the server
+TRANSPORT_ERROR = -32000
+# The server no longer knows the session (it restarted); a new one has to be initialized
+SESSION_EXPIRED = -32001
+
+class MCPError(Exception):
+    def __init__(self, message: str, code: Optional[int] = None, data=None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+class MCPTransportBase:
+    def __init__(self):
+        # Set by MCPSession; called from the transport's reader threads
+        self.on_message: Callable[[Dict], None] = lambda message: None
+        self.on_close: Callable[..., None] = lambda reason, code=None: None
+
+    def start(self):
+        pass
+
+    def after_initialize(self):
+        pass
+
+    def send(self, message: Dict):
+        raise NotImplementedError
+
+    def is_alive(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def _fail(self, message: Dict, reason: str, code: int = TRANSPORT_ERROR):
+        # Turn a transport failure into an error response so the waiting request is released
+        if "id" in message and "method" in message:
+            self.on_message({"jsonrpc": "2.0", "id": message["id"], "error": {"code": code, "message": reason}})
+
+def iter_sse_events(response: requests.Response) -> Iterator[tuple]:
+    # Yields (event, data) pairs from a text/event-stream response
+    event = "message"
+    data = []
+    # iter_lines() normally waits for a full 512-byte read; an event stream needs each line as it
+    # arrives, so read whole chunks when the body is chunked and single bytes when it isn't
+    chunked = "chunked" in response.headers.get("Transfer-Encoding", "").lower()
+    for line in response.iter_lines(chunk_size=None if chunked else 1, decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, "\n".join(data)
+            event = "message"
+            data = []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+    if data:
+        yield event, "\n".join(data)
+
+def shutdown_response(response: Optional[requests.Response]):
+    # Closing a response another thread is reading from blocks; shutting the socket down
+    # instead makes the reader see end-of-stream and clean up on its own
+    connection = getattr(getattr(response, "raw", None), "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+class StdioMCPTransport(MCPTransportBase):
+    def __init__(self, command: List[str], env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None):
+        super().__init__()
+        self.command = command
+        self.env = env
+        self.cwd = cwd
+        self.process: Optional[subprocess.Popen] = None
+        self.write_lock = threading.Lock()
+        self.reader_thread = None
+
+    def start(self):
+        env = dict(os.environ, **self.env) if self.env else None
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            cwd=self.cwd,
+            text=True,
+            encoding="utf-8",
+            bufsize=1
+        )
+        self.reader_thread = threading.Thread(target=self._reader)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+
+    def _reader(self):
+        # Messages are newline-delimited JSON on stdout
+        for line in self.process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            for item in message if isinstance(message, list) else [message]:
+                self.on_message(item)
+        self.on_close("server process exited")
+
+    def send(self, message: Dict):
+        if not self.is_alive():
+            self._fail(message, "server process is not running")
+            return
+        data = json.dumps(message) + "\n"
+        try:
+            with self.write_lock:
+                self.process.stdin.write(data)
+                self.process.stdin.flush()
+        except (OSError, ValueError):
+            self._fail(message, "could not write to server process")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+class HTTPMCPTransport(MCPTransportBase):
+    # MCP "streamable HTTP": every message is a POST, replies come back as JSON or as an SSE stream
+    def __init__(self, url: str, http: Optional[HTTPTransport] = None, max_in_flight: int = 8,
+                 read_timeout: float = 300.0):
+        super().__init__()
+        self.url = url
+        self.http = http or DEFAULT_TRANSPORT
+        # Longest silence allowed on a POST's reply; without one a hung server would hold a pool thread forever
+        self.read_timeout = read_timeout
+        self.session_id: Optional[str] = None
+        self.protocol_version: Optional[str] = None
+        self.closed = False
+        # Set when the server answered 404 to our session id; the session has to be initialized again
+        self.expired = False
+        # POSTs run on a small pool so several requests can be in flight at once
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="mcp-http")
+        self.listen_thread = None
+        self.listen_response: Optional[requests.Response] = None
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Accept": "application/json, text/event-stream"}
+        if self.session_id:
+            headers["Mcp-Session-Id"] = self.session_id
+        if self.protocol_version:
+            headers["MCP-Protocol-Version"] = self.protocol_version
+        return headers
+
+    def send(self, message: Dict):
+        if self.closed:
+            self._fail(message, "session is closed")
+            return
+        if self.expired:
+            self._fail(message, "session expired", SESSION_EXPIRED)
+            return
+        self.executor.submit(self._post, message)
+
+    def is_alive(self) -> bool:
+        return not self.closed and not self.expired
+
+    def _post(self, message: Dict):
+        headers = self._headers()
+        try:
+            response = self.http.post(
+                self.url,
+                json=message,
+                headers=headers,
+                stream=True,
+                timeout=(self.http.connect_timeout, self.read_timeout)
+            )
+        except requests.exceptions.RequestException as e:
+            self._fail(message, f"request failed: {e}")
+            return
+        with response:
+            if response.status_code == 404 and "Mcp-Session-Id" in headers:
+                self._fail(message, "session expired", SESSION_EXPIRED)
+                self._expire()
+                return
+            if response.headers.get("Mcp-Session-Id"):
+                self.session_id = response.headers["Mcp-Session-Id"]
+            if response.status_code == 202:
+                return
+            if response.status_code >= 400:
+                self._fail(message, f"HTTP {response.status_code}")
+                return
+            try:
+                if response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                    for _, data in iter_sse_events(response):
+                        self._deliver(data)
+                else:
+                    self._deliver(response.text)
+            except requests.exceptions.RequestException as e:
+                self._fail(message, f"reply interrupted: {e}")
+
+    def _expire(self):
+        # The server restarted or dropped us; requests still waiting on this session won't be answered
+        if not self.expired:
+            self.expired = True
+            self.on_close("session expired", SESSION_EXPIRED)
+
+    def _deliver(self, data: str):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        for item in message if isinstance(message, list) else [message]:
+            self.on_message(item)
+
+    def after_initialize(self):
+        # Server-initiated notifications (list_changed, logs) arrive on an optional GET stream
+        self.listen_thread = threading.Thread(target=self._listen)
+        self.listen_thread.daemon = True
+        self.listen_thread.start()
+
+    def _listen(self):
+        headers = self._headers()
+        headers["Accept"] = "text/event-stream"
+        try:
+            response = self.http.get(self.url, headers=headers, stream=True, timeout=(self.http.connect_timeout, None))
+        except requests.exceptions.RequestException:
+            return
+        self.listen_response = response
+        with response:
+            if response.status_code == 404 and "Mcp-Session-Id" in headers:
+                self._expire()
+                return
+            # 405 means the server doesn't offer a notification stream
+            if response.status_code != 200:
+                return
+            for _, data in iter_sse_events(response):
+                if self.closed:
+                    break
+                self._deliver(data)
+
+    def close(self):
+        self.closed = True
+        # POSTs have a finite read timeout, so the pool threads left running finish on their own
+        self.executor.shutdown(wait=False)
+        shutdown_response(self.listen_response)
+        if self.session_id and not self.expired:
+            try:
+                self.http.request("DELETE", self.url, headers=self._headers(), timeout=2)
+            except requests.exceptions.RequestException:
+                pass
+
+class SSEMCPTransport(MCPTransportBase):
+    # Older HTTP+SSE transport: one long-lived event stream, messages POSTed to the endpoint it announces
+    def __init__(self, url: str, http: Optional[HTTPTransport] = None, connect_timeout: float = 10.0):
+        super().__init__()
+        self.url = url
+        self.http = http or DEFAULT_TRANSPORT
+        self.connect_timeout = connect_timeout
+        self.endpoint: Optional[str] = None
+        self.endpoint_ready = threading.Event()
+        self.response: Optional[requests.Response] = None
+        self.closed = False
+        self.reader_thread = None
+
+    def start(self):
+        self.reader_thread = threading.Thread(target=self._reader)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+        if not self.endpoint_ready.wait(self.connect_timeout):
+            raise MCPError(f"No endpoint announced by {self.url}")
+
+    def _reader(self):
+        try:
+            self.response = self.http.get(
+                self.url,
+                headers={"Accept": "text/event-stream"},
+                stream=True,
+                timeout=(self.http.connect_timeout, None)
+            )
+            for event, data in iter_sse_events(self.response):
+                if event == "endpoint":
+                    self.endpoint = urljoin(self.url, data.strip())
+                    self.endpoint_ready.set()
+                    continue
+                try:
+                    message = json.loads(data)
+                except ValueError:
+                    continue
+                for item in message if isinstance(message, list) else [message]:
+                    self.on_message(item)
+        except requests.exceptions.RequestException:
+            pass
+        finally:
+            self.endpoint_ready.set()
+            if self.response is not None:
+                self.response.close()
+        if not self.closed:
+            self.on_close("event stream closed")
+
+    def send(self, message: Dict):
+        if self.closed or not self.endpoint:
+            self._fail(message, "not connected")
+            return
+        try:
+            response = self.http.post(self.endpoint, json=message, timeout=(self.http.connect_timeout, 30))
+            if response.status_code >= 400:
+                self._fail(message, f"HTTP {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            self._fail(message, f"request failed: {e}")
+
+    def is_alive(self) -> bool:
+        return not self.closed and self.reader_thread is not None and self.reader_thread.is_alive()
+
+    def close(self):
+        self.closed = True
+        shutdown_response(self.response)
+
+class MCPSession:
+    PROTOCOL_VERSION = "2025-03-26"
+
+    def __init__(self, transport: MCPTransportBase, request_timeout: float = 30.0):
+        self.transport = transport
+        self.request_timeout = request_timeout
+        transport.on_message = self._dispatch
+        transport.on_close = self._on_close
+        self.ids = itertools.count(1)
+        # Request id -> Future; lets many requests share one connection
+        self.pending: Dict[int, Future] = {}
+        self.progress_handlers: Dict[object, Callable[[Dict], None]] = {}
+        self.listeners: List[Callable[[str, Dict], None]] = []
+        self.lock = threading.Lock()
+        self.server_info: Dict = {}
+        self.server_capabilities: Dict = {}
+        self.initialized = False
+
+    def subscribe(self, listener: Callable[[str, Dict], None]):
+        # Listeners get (method, params) for every server notification, on a transport thread
+        self.listeners.append(listener)
+
+    def open(self, timeout: Optional[float] = None) -> Dict:
+        self.transport.start()
+        result = self.request("initialize", {
+            "protocolVersion": self.PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "MCP Client", "version": "1.0.0"}
+        }, timeout=timeout)
+        self.server_info = result.get("serverInfo", {})
+        self.server_capabilities = result.get("capabilities", {})
+        if isinstance(self.transport, HTTPMCPTransport):
+            self.transport.protocol_version = result.get("protocolVersion", self.PROTOCOL_VERSION)
+        self.notify("notifications/initialized")
+        self.initialized = True
+        self.transport.after_initialize()
+        return result
+
+    def request_async(self, method: str, params: Optional[Dict] = None) -> Future:
+        request_id = next(self.ids)
+        future: Future = Future()
+        with self.lock:
+            self.pending[request_id] = future
+        if METRICS.enabled:
+            # Round trip over any transport, including stdio which never touches HTTPTransport
+            started = time.perf_counter()
+            future.add_done_callback(lambda f: METRICS.observe(
+                "mcp_request_seconds", time.perf_counter() - started,
+                {"method": method, "outcome": "error" if f.cancelled() or f.exception() else "ok"}
+            ))
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        self.transport.send(message)
+        return future
+
+    def request(self, method: str, params: Optional[Dict] = None, timeout: Optional[float] = None) -> Dict:
+        future = self.request_async(method, params)
+        try:
+            return future.result(timeout=timeout or self.request_timeout)
+        except FutureTimeoutError:
+            self._cancel(future, f"{method} timed out")
+            raise MCPError(f"{method} timed out")
+
+    def notify(self, method: str, params: Optional[Dict] = None):
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        self.transport.send(message)
+
+    def _cancel(self, future: Future, reason: str):
+        with self.lock:
+            request_ids = [request_id for request_id, pending in self.pending.items() if pending is future]
+            for request_id in request_ids:
+                del self.pending[request_id]
+        for request_id in request_ids:
+            self.notify("notifications/cancelled", {"requestId": request_id, "reason": reason})
+
+    def _dispatch(self, message: Dict):
+        if "id" in message and ("result" in message or "error" in message):
+            with self.lock:
+                future = self.pending.pop(message["id"], None)
+            if future is None or future.done():
+                return
+            if "error" in message:
+                error = message["error"] or {}
+                future.set_exception(MCPError(error.get("message", "Unknown error"), error.get("code"), error.get("data")))
+            else:
+                future.set_result(message.get("result") or {})
+        elif "id" in message and "method" in message:
+            self._handle_server_request(message)
+        elif "method" in message:
+            params = message.get("params") or {}
+            if message["method"] == "notifications/progress":
+                handler = self.progress_handlers.get(params.get("progressToken"))
+                if handler:
+                    handler(params)
+            for listener in list(self.listeners):
+                listener(message["method"], params)
+
+    def _handle_server_request(self, message: Dict):
+        # The only server-to-client request we support is ping
+        if message["method"] == "ping":
+            self.transport.send({"jsonrpc": "2.0", "id": message["id"], "result": {}})
+        else:
+            self.transport.send({
+                "jsonrpc": "2.0",
+                "id": message["id"],
+                "error": {"code": -32601, "message": f"Method not found: {message['method']}"}
+            })
+
+    def _on_close(self, reason: str, code: Optional[int] = None):
+        with self.lock:
+            pending = list(self.pending.values())
+            self.pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(MCPError(f"Connection closed: {reason}", code))
+
+    def _list_all(self, method: str, key: str) -> List[Dict]:
+        items = []
+        cursor = None
+        while True:
+            result = self.request(method, {"cursor": cursor} if cursor else None)
+            items.extend(result.get(key, []))
+            cursor = result.get("nextCursor")
+            if not cursor:
+                return items
+
+    def ping(self, timeout: Optional[float] = None) -> bool:
+        self.request("ping", timeout=timeout)
+        return True
+
+    def list_tools(self) -> List[Dict]:
+        return self._list_all("tools/list", "tools")
+
+    def list_resources(self) -> List[Dict]:
+        return self._list_all("resources/list", "resources")
+
+    def list_prompts(self) -> List[Dict]:
+        return self._list_all("prompts/list", "prompts")
+
+    def read_resource(self, uri: str) -> Dict:
+        return self.request("resources/read", {"uri": uri})
+
+    def get_prompt(self, name: str, arguments: Optional[Dict[str, str]] = None) -> Dict:
+        return self.request("prompts/get", {"name": name, "arguments": arguments or {}})
+
+    def call_tool_async(self, name: str, arguments: Optional[Dict] = None,
+                        on_progress: Optional[Callable[[Dict], None]] = None) -> Future:
+        params = {"name": name, "arguments": arguments or {}}
+        token = None
+        if on_progress:
+            token = f"progress-{next(self.ids)}"
+            params["_meta"] = {"progressToken": token}
+            self.progress_handlers[token] = on_progress
+        future = self.request_async("tools/call", params)
+        if token is not None:
+            future.add_done_callback(lambda _: self.progress_handlers.pop(token, None))
+        return future
+
+    def call_tool(self, name: str, arguments: Optional[Dict] = None, timeout: Optional[float] = None,
+                  on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        future = self.call_tool_async(name, arguments, on_progress)
+        try:
+            return future.result(timeout=timeout or self.request_timeout)
+        except FutureTimeoutError:
+            self._cancel(future, "tools/call timed out")
+            raise MCPError(f"Tool {name} timed out")
+
+    def is_alive(self) -> bool:
+        return self.transport.is_alive()
+
+    def close(self):
+        self.transport.close()
+        self._on_close("session closed")
+
+class SchemaCache:
+    KINDS = ("tools", "resources", "prompts")
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self.lists: Dict[str, List[Dict]] = {}
+        self.fetched_at: Dict[str, float] = {}
+        # Bumped on every change so catalogues know when to rebuild
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def get(self, kind: str) -> Optional[List[Dict]]:
+        with self.lock:
+            fetched_at = self.fetched_at.get(kind)
+            if fetched_at is None or time.monotonic() - fetched_at > self.ttl:
+                return None
+            return self.lists[kind]
+
+    def put(self, kind: str, items: List[Dict]):
+        with self.lock:
+            if self.lists.get(kind) != items:
+                self.version += 1
+            self.lists[kind] = items
+            self.fetched_at[kind] = time.monotonic()
+
+    def invalidate(self, kind: Optional[str] = None):
+        with self.lock:
+            for name in [kind] if kind else list(self.fetched_at):
+                self.fetched_at.pop(name, None)
+
+    def on_notification(self, method: str, params: Dict):
+        # e.g. notifications/tools/list_changed
+        parts = method.split("/")
+        if len(parts) == 3 and parts[2] == "list_changed" and parts[1] in self.KINDS:
+            self.invalidate(parts[1])
+
+class MCPServer:
+    TRANSPORTS = ("http", "sse", "stdio")
+
+    def __init__(self, name: str, url: str, transport: Optional[HTTPTransport] = None,
+                 mcp_transport: str = "http", mcp_path: str = "/mcp", command: Optional[List[str]] = None):
+        self.name = name
+        self.transport = transport or DEFAULT_TRANSPORT
+        # How to speak MCP to this server: streamable HTTP at url + mcp_path, SSE, or a stdio command
+        self.mcp_transport = "stdio" if command else mcp_transport
+        self.mcp_path = mcp_path
+        self.command = command
+        self.url = f"stdio:{subprocess.list2cmdline(command)}" if command else url
+        self.status = "unknown"
+        self.last_check = None
+        self.session: Optional[MCPSession] = None
+        self.session_lock = threading.Lock()
+        self.schemas = SchemaCache()
+
+    @property
+    def key(self) -> str:
+        return normalize_url(self.url)
+
+    def __eq__(self, other):
+        if not isinstance(other, MCPServer):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"MCPServer({self.name!r}, {self.url!r}, status={self.status!r})"
+
+    def probe(self, timeout: float = 5) -> tuple:
+        # Returns (healthy, latency in seconds) without touching status
+        started = time.perf_counter()
+        if self.mcp_transport == "stdio":
+            # No HTTP endpoint to hit; an MCP ping over the (re)started process stands in for /health
+            try:
+                healthy = self.connect(timeout).ping(timeout)
+            except MCPError:
+                healthy = False
+            return healthy, time.perf_counter() - started
+        try:
+            response = self.transport.get(f"{self.url}/health", timeout=timeout)
+            healthy = response.status_code == 200
+        except:
+            healthy = False
+        return healthy, time.perf_counter() - started
+
+    def check_status(self) -> bool:
+        healthy, _ = self.probe()
+        self.status = "online" if healthy else "offline"
+        self.last_check = time.time()
+        return healthy
+
+    def create_session(self) -> MCPSession:
+        if self.mcp_transport == "stdio":
+            return MCPSession(StdioMCPTransport(self.command))
+        if self.mcp_transport == "sse":
+            return MCPSession(SSEMCPTransport(self.url, self.transport))
+        return MCPSession(HTTPMCPTransport(self.url.rstrip("/") + self.mcp_path, self.transport))
+
+    def connect(self, timeout: Optional[float] = None) -> MCPSession:
+        # Reuses the open session; a dead one is replaced
+        with self.session_lock:
+            if self.session is not None and self.session.is_alive():
+                return self.session
+            if self.session is not None:
+                self.session.close()
+            session = self.create_session()
+            session.subscribe(self.schemas.on_notification)
+            try:
+                session.open(timeout)
+            except (MCPError, OSError) as e:
+                session.close()
+                raise MCPError(f"Could not connect to {self.name}: {e}")
+            self.session = session
+        # A new session may see different lists; fetch them up front
+        self.schemas.invalidate()
+        self.prefetch_schemas(session)
+        return session
+
+    def is_connected(self) -> bool:
+        # An expired HTTP session still counts: the next request through with_session() opens a new one
+        session = self.session
+        return session is not None and (session.is_alive() or getattr(session.transport, "expired", False))
+
+    def disconnect(self):
+        with self.session_lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+        self.schemas.invalidate()
+
+    def prefetch_schemas(self, session: MCPSession):
+        # Fire the list requests together rather than one round-trip after another
+        kinds = [kind for kind in SchemaCache.KINDS if kind in session.server_capabilities]
+        futures = {kind: session.request_async(f"{kind}/list") for kind in kinds}
+        for kind, future in futures.items():
+            try:
+                result = future.result(timeout=session.request_timeout)
+            except (MCPError, FutureTimeoutError):
+                continue
+            # Further pages, if any, are picked up by the next regular fetch
+            if result.get("nextCursor"):
+                continue
+            self.schemas.put(kind, result.get(kind, []))
+
+    def with_session(self, action: Callable[[MCPSession], Any]):
+        # A restarted HTTP server answers our old session id with 404 and nothing was run, so a new
+        # session is opened and the request sent once more
+        session = self.connect()
+        try:
+            return action(session)
+        except MCPError:
+            if not getattr(session.transport, "expired", False):
+                raise
+        return action(self.connect())
+
+    def call_tool(self, name: str, arguments: Optional[Dict] = None, timeout: Optional[float] = None) -> Dict:
+        return self.with_session(lambda session: session.call_tool(name, arguments, timeout=timeout))
+
+    def _cached_list(self, kind: str, fetch: Callable[[MCPSession], List[Dict]]) -> List[Dict]:
+        items = self.schemas.get(kind)
+        if items is None:
+            items = self.with_session(fetch)
+            self.schemas.put(kind, items)
+        return items
+
+    def list_tools(self) -> List[Dict]:
+        return self._cached_list("tools", lambda session: session.list_tools())
+
+    def list_resources(self) -> List[Dict]:
+        return self._cached_list("resources", lambda session: session.list_resources())
+
+    def list_prompts(self) -> List[Dict]:
+        return self._cached_list("prompts", lambda session: session.list_prompts())
@@ -0,0 +1,282 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Upper bounds in seconds shared by every latency histogram
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HELP = {
+    "http_requests_total": "Outbound HTTP requests by endpoint and status",
+    "http_connect_seconds": "Time to open a new connection",
+    "http_ttfb_seconds": "Time from sending a request to its response headers",
+    "http_duration_seconds": "Time from sending a request to the end of its body",
+    "ollama_first_token_seconds": "Time to the first generated token",
+    "ollama_prompt_eval_seconds": "Prompt evaluation time reported by Ollama",
+    "ollama_eval_seconds": "Generation time reported by Ollama",
+    "ollama_tokens_total": "Tokens evaluated by Ollama",
+    "ollama_prefill_seconds": "Prompt evaluation done ahead of sending, while the user types",
+    "mcp_request_seconds": "MCP JSON-RPC round trips by method",
+    "discovery_probes_total": "Port probes made by server discovery",
+    "discovery_sweep_seconds": "Duration of a full discovery sweep",
+    "discovery_servers_total": "Servers found by discovery, by source",
+    "ui_callback_seconds": "Time spent in periodic UI callbacks",
+    "ui_lag_seconds": "How late periodic UI callbacks ran",
+}
+
+def label_key(labels: Optional[Dict[str, str]]) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf bucket; not cumulative
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Interpolated within the bucket, like Prometheus' histogram_quantile
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+class Span:
+    __slots__ = ("metrics", "name", "labels", "started", "wall_time", "connect", "ttfb", "duration",
+                 "status", "error", "attributes")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.wall_time = time.time()
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.status = None
+        self.error: Optional[str] = None
+        self.attributes: Dict = {}
+
+    def finish(self, error: Optional[str] = None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.started
+        if error:
+            self.error = error
+        self.metrics.end_span(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "labels": self.labels,
+            "start": self.wall_time,
+            "connect": self.connect,
+            "ttfb": self.ttfb,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+class Metrics:
+    # Off by default; callers check `enabled` before doing any work so the disabled cost is one attribute read
+    def __init__(self, enabled: bool = False, max_spans: int = 200, buckets: tuple = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.counters: Dict[str, Dict[tuple, float]] = {}
+        self.histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self.spans: deque = deque(maxlen=max_spans)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+        if not self.enabled:
+            return
+        key = label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        if not self.enabled:
+            return
+        key = label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def start_span(self, name: str, **labels) -> Span:
+        return Span(self, name, labels)
+
+    def current_span(self) -> Optional[Span]:
+        # The span of the request being sent on this thread, so connection setup can be attributed to it
+        return getattr(self.local, "span", None)
+
+    def set_current_span(self, span: Optional[Span]):
+        self.local.span = span
+
+    def end_span(self, span: Span):
+        if not self.enabled:
+            return
+        labels = dict(span.labels)
+        endpoint = {key: labels[key] for key in ("host", "path") if key in labels}
+        outcome = dict(labels, status=span.error or str(span.status))
+        self.inc(f"{span.name}_requests_total", outcome)
+        if span.connect is not None:
+            self.observe(f"{span.name}_connect_seconds", span.connect, {"host": labels.get("host", "")})
+        if span.ttfb is not None:
+            self.observe(f"{span.name}_ttfb_seconds", span.ttfb, endpoint)
+        self.observe(f"{span.name}_duration_seconds", span.duration, endpoint)
+        self.spans.append(span)
+
+    def record_generation(self, stats, span: Optional[Span] = None):
+        # Ollama's own timings for one reply, in seconds
+        if not self.enabled or stats.cached:
+            return
+        labels = {"model": stats.model or ""}
+        if stats.first_token_latency is not None:
+            self.observe("ollama_first_token_seconds", stats.first_token_latency, labels)
+        if stats.prompt_eval_duration:
+            self.observe("ollama_prompt_eval_seconds", stats.prompt_eval_duration / 1e9, labels)
+        if stats.eval_duration:
+            self.observe("ollama_eval_seconds", stats.eval_duration / 1e9, labels)
+        self.inc("ollama_tokens_total", dict(labels, kind="prompt"), stats.prompt_eval_count)
+        self.inc("ollama_tokens_total", dict(labels, kind="eval"), stats.eval_count)
+        if span is not None:
+            span.attributes.update({
+                "model": stats.model,
+                "prompt_eval": stats.prompt_eval_duration / 1e9,
+                "prompt_eval_count": stats.prompt_eval_count,
+                "eval": stats.eval_duration / 1e9,
+                "eval_count": stats.eval_count,
+            })
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+
+    def recent_spans(self, limit: int = 50) -> List[Span]:
+        with self.lock:
+            return list(self.spans)[-limit:]
+
+    def snapshot(self) -> Dict:
+        # Copies for the stats panel, so it never reads while a worker writes
+        with self.lock:
+            counters = {name: dict(series) for name, series in self.counters.items()}
+            histograms = {}
+            for name, series in self.histograms.items():
+                histograms[name] = {}
+                for key, histogram in series.items():
+                    copy = Histogram(histogram.buckets)
+                    copy.counts = list(histogram.counts)
+                    copy.sum = histogram.sum
+                    copy.count = histogram.count
+                    histograms[name][key] = copy
+        return {"counters": counters, "histograms": histograms}
+
+    @staticmethod
+    def _labels_text(key: tuple, extra: Optional[tuple] = None) -> str:
+        items = list(key) + ([extra] if extra else [])
+        if not items:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+
+    def render_prometheus(self, prefix: str = "mcp_client_") -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in sorted(snapshot["counters"].items()):
+            full = prefix + name
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full}{self._labels_text(key)} {value:g}")
+        for name, series in sorted(snapshot["histograms"].items()):
+            full = prefix + name
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} histogram")
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{full}_bucket{self._labels_text(key, ('le', le))} {cumulative}")
+                lines.append(f"{full}_sum{self._labels_text(key)} {histogram.sum:.6f}")
+                lines.append(f"{full}_count{self._labels_text(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        metrics = self.server.metrics
+        if self.path == "/metrics":
+            body = metrics.render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/spans":
+            body = json.dumps([span.to_dict() for span in metrics.recent_spans(metrics.spans.maxlen)]).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer:
+    # Serves /metrics in the Prometheus text format and /spans as JSON
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9464):
+        self.httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.metrics = metrics
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+# Process-wide metrics; disabled until the user turns them on
+METRICS = Metrics()
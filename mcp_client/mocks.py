@@ -0,0 +1,396 @@
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Port probes and closed keep-alive connections hang up without a request
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def send_json(self, obj, status: int = 200, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status: int):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+class MockServer:
+    # A ThreadingHTTPServer on a background thread; port 0 picks a free port
+    handler_class = MockHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = MockHTTPServer((host, port), self.handler_class)
+        self.httpd.mock = self
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.httpd.server_address[0]}:{self.port}"
+
+    def start(self) -> "MockServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.1})
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class MockOllamaHandler(MockHandler):
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path == "/api/tags":
+            self.send_json({"models": [{"name": name} for name in mock.models]})
+        elif self.path == "/api/ps":
+            expires_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 1800))
+            self.send_json({"models": [{"name": name, "expires_at": expires_at} for name in sorted(mock.loaded)]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        mock = self.server.mock
+        request = self.read_json()
+        if self.path == "/api/show":
+            self.send_json({"details": {"parameter_size": "7B", "quantization_level": "Q4_0"},
+                            "model_info": {"mock.context_length": 4096}})
+            return
+        if self.path == "/api/embed":
+            inputs = request.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.send_json({"model": request.get("model"), "embeddings": [self.embed(text) for text in inputs]})
+            return
+        if self.path not in ("/api/generate", "/api/chat"):
+            self.send_json({"error": "not found"}, 404)
+            return
+        is_chat = self.path == "/api/chat"
+        options = request.get("options") or {}
+        tokens = options.get("num_predict", mock.tokens)
+        if tokens < 0:
+            tokens = mock.tokens
+
+        def message(text: str, done: bool) -> Dict:
+            chunk = {"model": request.get("model"), "done": done}
+            if is_chat:
+                chunk["message"] = {"role": "assistant", "content": text}
+            else:
+                chunk["response"] = text
+            return chunk
+
+        # Like OLLAMA_NUM_PARALLEL: requests beyond the limit queue up
+        if mock.slots is not None:
+            mock.slots.acquire()
+        try:
+            self.generate(request, message, tokens)
+        finally:
+            if mock.slots is not None:
+                mock.slots.release()
+
+    @staticmethod
+    def embed(text: str, dim: int = 256) -> List[float]:
+        # Hashed bag of words: texts sharing words get similar vectors, which is enough to test retrieval
+        vector = [0.0] * dim
+        for word in text.lower().split():
+            vector[zlib.crc32(word.strip(".,!?").encode()) % dim] += 1.0
+        return vector
+
+    def generate(self, request: Dict, message, tokens: int):
+        mock = self.server.mock
+        started = time.perf_counter()
+        # A model that isn't in memory pays the load time once
+        if request.get("model") not in mock.loaded:
+            time.sleep(mock.load_time)
+            mock.loaded.add(request.get("model"))
+        load_duration = int((time.perf_counter() - started) * 1e9)
+        if "prompt" not in request and "messages" not in request:
+            # No prompt: Ollama only loads the model
+            self.send_json({"model": request.get("model"), "response": "", "done": True,
+                            "done_reason": "load", "load_duration": load_duration})
+            return
+        # Prompt eval stands in as a fixed delay before the first token; with a prompt rate, the part of
+        # the prompt not shared with the model's previous one (its KV cache) adds time per character
+        started = time.perf_counter()
+        prompt_tokens = 8
+        if mock.prompt_rate:
+            prompt = json.dumps(request.get("messages", request.get("prompt")))
+            with mock.lock:
+                cached = mock.prompt_cache.get(request.get("model"), "")
+                mock.prompt_cache[request.get("model")] = prompt
+            new_chars = len(prompt) - len(os.path.commonprefix([cached, prompt]))
+            prompt_tokens = new_chars // 4 + 1
+            time.sleep(mock.latency + new_chars / mock.prompt_rate)
+        else:
+            time.sleep(mock.latency)
+        prompt_done = time.perf_counter()
+        if not request.get("stream", True):
+            time.sleep(tokens / mock.token_rate)
+            final = message(" ".join(["token"] * tokens), True)
+            final.update(mock.timings(tokens, started, prompt_done, prompt_tokens), load_duration=load_duration)
+            self.send_json(final)
+            return
+
+        self.start_chunked("application/x-ndjson")
+        interval = 1.0 / mock.token_rate
+        next_token = prompt_done
+        for index in range(tokens):
+            self.write_chunk((json.dumps(message("token" if index == 0 else " token", False)) + "\n").encode())
+            next_token += interval
+            delay = next_token - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        final = message("", True)
+        final.update(mock.timings(tokens, started, prompt_done, prompt_tokens), load_duration=load_duration)
+        self.write_chunk((json.dumps(final) + "\n").encode())
+        self.end_chunked()
+
+class MockOllamaServer(MockServer):
+    # Fake /api/generate, /api/chat and /api/tags with a fixed first-token latency and token rate
+    handler_class = MockOllamaHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_rate: float = 200.0,
+                 latency: float = 0.05, tokens: int = 64, models: Optional[List[str]] = None,
+                 parallel: Optional[int] = None, load_time: float = 0.0, prompt_rate: Optional[float] = None):
+        super().__init__(host, port)
+        self.load_time = load_time
+        # Prompt characters evaluated per second; None keeps prompt eval at the fixed latency
+        self.prompt_rate = prompt_rate
+        self.prompt_cache: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.token_rate = token_rate
+        self.latency = latency
+        self.tokens = tokens
+        self.models = models or ["mock:latest"]
+        self.slots = threading.Semaphore(parallel) if parallel else None
+        # Models that have been used, reported by /api/ps
+        self.loaded = set()
+
+    @staticmethod
+    def timings(tokens: int, started: float, prompt_done: float, prompt_tokens: int = 8) -> Dict:
+        finished = time.perf_counter()
+        return {
+            "total_duration": int((finished - started) * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int((prompt_done - started) * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int((finished - prompt_done) * 1e9),
+        }
+
+MOCK_MCP_TOOLS = [{
+    "name": "echo",
+    "description": "Returns its arguments",
+    "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}},
+}, {
+    "name": "sleep",
+    "description": "Waits the given number of seconds, then returns its arguments",
+    "inputSchema": {"type": "object", "properties": {"seconds": {"type": "number"}}},
+}]
+
+def mcp_reply(message: Dict, name: str, tools: List[Dict], latency: float = 0.0) -> Optional[Dict]:
+    # The JSON-RPC side of the mock MCP server, shared by its HTTP, SSE and stdio transports
+    if "id" not in message:
+        return None
+    if latency:
+        time.sleep(latency)
+    method = message.get("method")
+    params = message.get("params") or {}
+    if method == "initialize":
+        result = {"protocolVersion": params.get("protocolVersion"),
+                  "capabilities": {"tools": {}},
+                  "serverInfo": {"name": name, "version": "1.0.0"}}
+    elif method == "ping":
+        result = {}
+    elif method == "tools/list":
+        result = {"tools": tools}
+    elif method == "tools/call":
+        arguments = params.get("arguments") or {}
+        if params.get("name") == "sleep":
+            time.sleep(float(arguments.get("seconds", 1.0)))
+        result = {"content": [{"type": "text", "text": json.dumps(arguments)}], "isError": False}
+    elif method in ("resources/list", "prompts/list"):
+        result = {method.split("/")[0]: []}
+    else:
+        return {"jsonrpc": "2.0", "id": message["id"],
+                "error": {"code": -32601, "message": f"Method not found: {method}"}}
+    return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+
+class MockMCPHandler(MockHandler):
+    def reply(self, message: Dict) -> Optional[Dict]:
+        mock = self.server.mock
+        return mcp_reply(message, f"mock-{mock.port}", mock.tools, mock.latency)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json({"status": "ok"})
+        elif self.path == "/sse":
+            self.stream_events()
+        else:
+            # No server-to-client notification stream
+            self.send_empty(405)
+
+    def do_DELETE(self):
+        with self.server.mock.lock:
+            self.server.mock.sessions.discard(self.headers.get("Mcp-Session-Id"))
+        self.send_empty(200)
+
+    def do_POST(self):
+        mock = self.server.mock
+        message = self.read_json()
+        if self.path.startswith("/messages"):
+            # Old HTTP+SSE transport: the reply goes out on the event stream the client opened
+            outbox = mock.streams.get(self.path.partition("session=")[2])
+            if outbox is None:
+                self.send_empty(404)
+                return
+            self.send_empty(202)
+            reply = self.reply(message)
+            if reply is not None:
+                outbox.put(reply)
+            return
+        # Streamable HTTP: a session starts with initialize, and an unknown one gets 404 as the spec says
+        session = self.headers.get("Mcp-Session-Id")
+        if message.get("method") == "initialize":
+            with mock.lock:
+                session = f"mock-session-{next(mock.ids)}"
+                mock.sessions.add(session)
+        elif session is not None and session not in mock.sessions:
+            self.send_empty(404)
+            return
+        reply = self.reply(message)
+        if reply is None:
+            self.send_empty(202)
+            return
+        self.send_json(reply, headers={"Mcp-Session-Id": session} if session else None)
+
+    def stream_events(self):
+        mock = self.server.mock
+        with mock.lock:
+            session = str(next(mock.ids))
+            outbox = mock.streams[session] = queue.Queue()
+        self.start_chunked("text/event-stream")
+        try:
+            self.write_chunk(f"event: endpoint\ndata: /messages?session={session}\n\n".encode())
+            while not mock.closing.is_set():
+                try:
+                    reply = outbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self.write_chunk(f"event: message\ndata: {json.dumps(reply)}\n\n".encode())
+            self.end_chunked()
+        except OSError:
+            pass
+        finally:
+            mock.streams.pop(session, None)
+
+class MockMCPServer(MockServer):
+    # /health plus JSON-RPC over streamable HTTP at /mcp and over HTTP+SSE at /sse, with an echo tool
+    # and a sleep tool for timeouts
+    handler_class = MockMCPHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        super().__init__(host, port)
+        self.latency = latency
+        self.tools = list(MOCK_MCP_TOOLS)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        # Live streamable HTTP sessions, and the reply queue of each open SSE stream
+        self.sessions = set()
+        self.streams: Dict[str, queue.Queue] = {}
+        self.closing = threading.Event()
+
+    def expire_sessions(self):
+        # What a restarted server looks like to its clients: every session id it handed out is unknown
+        with self.lock:
+            self.sessions.clear()
+
+    def stop(self):
+        self.closing.set()
+        super().stop()
+
+def run_stdio_server(latency: float = 0.0):
+    # The mock MCP server over stdio, one JSON-RPC message per line: python -m mcp_client.mocks --stdio
+    for line in sys.stdin:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        reply = mcp_reply(message, "mock-stdio", MOCK_MCP_TOOLS, latency)
+        if reply is not None:
+            sys.stdout.write(json.dumps(reply) + "\n")
+            sys.stdout.flush()
+
+def start_mcp_servers(port_range: tuple, count: int, host: str = "127.0.0.1",
+                      latency: float = 0.0) -> List[MockMCPServer]:
+    # Spreads servers evenly over the range; ports that are already taken are skipped
+    start, end = port_range
+    step = max((end - start) // max(count, 1), 1)
+    servers = []
+    for port in range(start, end, step):
+        if len(servers) >= count:
+            break
+        try:
+            servers.append(MockMCPServer(host, port, latency).start())
+        except OSError:
+            continue
+    return servers
+
+if __name__ == "__main__" and "--stdio" in sys.argv:
+    run_stdio_server()
@@ -0,0 +1,728 @@
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Iterator, Callable
+
+import requests
+
+from . import APP_DIR
+from .metrics import METRICS
+from .transport import HTTPTransport, DEFAULT_TRANSPORT
+
+class ModelUnavailable(requests.exceptions.RequestException):
+    # Raised before anything is sent, when no host has the model; its message is shown as it is
+    pass
+
+class GenerationStats:
+    def __init__(self, model: str):
+        self.model = model
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.end_time = None
+        self.eval_count = 0
+        self.eval_duration = 0
+        self.prompt_eval_count = 0
+        self.prompt_eval_duration = 0
+        self.cached = False
+        # Set when the reply is an error message rather than model output
+        self.error: Optional[str] = None
+        # Extra fragments shown after the timings, e.g. an agent step breakdown
+        self.notes: List[str] = []
+
+    def mark_first_token(self):
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+
+    def finish(self, final_chunk: Dict):
+        self.end_time = time.perf_counter()
+        # Durations reported by Ollama are in nanoseconds
+        self.eval_count = final_chunk.get('eval_count', 0)
+        self.eval_duration = final_chunk.get('eval_duration', 0)
+        self.prompt_eval_count = final_chunk.get('prompt_eval_count', 0)
+        self.prompt_eval_duration = final_chunk.get('prompt_eval_duration', 0)
+
+    @property
+    def first_token_latency(self) -> Optional[float]:
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    @property
+    def total_time(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        if not self.eval_count or not self.eval_duration:
+            return None
+        return self.eval_count / (self.eval_duration / 1e9)
+
+    def summary(self) -> str:
+        parts = ["cached"] if self.cached else []
+        if self.first_token_latency is not None:
+            parts.append(f"first token {self.first_token_latency * 1000:.0f} ms")
+        if self.tokens_per_second is not None:
+            parts.append(f"{self.tokens_per_second:.1f} tok/s")
+        if self.total_time is not None:
+            parts.append(f"total {self.total_time:.1f} s")
+        parts.extend(self.notes)
+        return " · ".join(parts)
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024,
+                 ttl: float = 24 * 3600, path: Optional[str] = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        # key -> (response, created); least recently used first
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, created REAL)"
+            )
+            self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            self.db.commit()
+
+    @staticmethod
+    def is_cacheable(options: Optional[Dict]) -> bool:
+        # Ollama samples at temperature 0.8 by default; only a fixed seed or greedy decoding repeats
+        options = options or {}
+        return options.get("seed") is not None or options.get("temperature") == 0
+
+    @staticmethod
+    def make_key(endpoint: str, model: str, prompt, options: Optional[Dict]) -> str:
+        raw = json.dumps([endpoint, model, prompt, options or {}], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                self._evict(key)
+                entry = None
+            if entry is None and self.db is not None:
+                row = self.db.execute(
+                    "SELECT response, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl:
+                    entry = (row[0], row[1])
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, response: str):
+        entry = (response, time.time())
+        with self.lock:
+            self._store(key, entry)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, response, entry[1]))
+                self.db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)",
+                    (self.max_disk_entries,)
+                )
+                self.db.commit()
+
+    def record_bypass(self):
+        with self.lock:
+            self.bypassed += 1
+
+    def _store(self, key: str, entry: tuple):
+        if key in self.entries:
+            self._evict(key)
+        self.entries[key] = entry
+        self.size += len(entry[0])
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            self._evict(next(iter(self.entries)))
+
+    def _evict(self, key: str):
+        response, _ = self.entries.pop(key)
+        self.size -= len(response)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            if self.db is not None:
+                self.db.execute("DELETE FROM responses")
+                self.db.commit()
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+class OllamaClient:
+    def __init__(self, base_url: str = "http://localhost:11434",
+                 transport: Optional[HTTPTransport] = None, generate_timeout: float = 300.0,
+                 keep_alive: Optional[str] = "30m", cache: Optional[ResponseCache] = None,
+                 options: Optional[Dict] = None):
+        self.base_url = base_url
+        self.transport = transport or DEFAULT_TRANSPORT
+        # Generation can sit in prompt eval for a long time before the first byte
+        self.generate_timeout = generate_timeout
+        # How long Ollama keeps the model (and its KV cache) loaded after a request
+        self.keep_alive = keep_alive
+        # Optional response cache; only used when options make output repeatable
+        self.cache = cache
+        # Default model options (temperature, seed, ...) sent with every request
+        self.options = options or {}
+        # Filled in by update_available_models or from a ModelCatalog; never fetched here
+        self.available_models = []
+        self.current_model = None
+        self.last_stats: Optional[GenerationStats] = None
+
+    def close(self):
+        # Nothing to stop for a single host; the router overrides this
+        pass
+
+    def fetch_models(self, timeout: float = 5) -> Optional[List[Dict]]:
+        # Raw /api/tags entries, or None when Ollama can't be reached
+        try:
+            response = self.transport.get(f"{self.base_url}/api/tags", timeout=timeout)
+            if response.status_code == 200:
+                return response.json()['models']
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            pass
+        return None
+
+    def show_model(self, model: str, timeout: float = 10) -> Optional[Dict]:
+        try:
+            response = self.transport.post(f"{self.base_url}/api/show", json={"model": model}, timeout=timeout)
+            if response.status_code == 200:
+                return response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        return None
+
+    def fetch_running(self, timeout: float = 5) -> Optional[List[Dict]]:
+        # Models Ollama holds in memory right now (/api/ps), or None when it can't be reached
+        try:
+            response = self.transport.get(f"{self.base_url}/api/ps", timeout=timeout)
+            if response.status_code == 200:
+                return response.json()['models']
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            pass
+        return None
+
+    def load_model(self, model: str) -> Optional[float]:
+        # A generate request without a prompt only loads the model; returns the load time in seconds
+        try:
+            response = self._send("/api/generate", {"model": model}, stream=False)
+            if response.status_code == 200:
+                return response.json().get('load_duration', 0) / 1e9
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        return None
+
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> Optional[List[List[float]]]:
+        # One /api/embed request for the whole batch; None when Ollama can't be reached or lacks the model
+        payload = {"model": model, "input": texts}
+        if dimensions:
+            payload["dimensions"] = dimensions
+        try:
+            response = self._send("/api/embed", payload, stream=False)
+            if response.status_code == 200:
+                return response.json()['embeddings']
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            pass
+        return None
+
+    def update_available_models(self):
+        models = self.fetch_models()
+        self.available_models = [model['name'] for model in models] if models else []
+
+    def generate_response(self, prompt: str, model: str = None,
+                          on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        # With a callback, stream the reply and hand each piece over as it arrives
+        if on_chunk:
+            pieces = []
+            for piece in self.stream_response(prompt, model):
+                pieces.append(piece)
+                on_chunk(piece)
+            return "".join(pieces)
+
+        if not model and not self.current_model:
+            return "No model selected"
+        
+        model_to_use = model or self.current_model
+        stats = GenerationStats(model_to_use)
+        options = self._options()
+        cache_key = self._cache_key("/api/generate", model_to_use, prompt, options)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.last_stats = self._cached_stats(stats)
+                return cached
+        try:
+            payload = {
+                "model": model_to_use,
+                "prompt": prompt,
+                "stream": False
+            }
+            if options:
+                payload["options"] = options
+            response = self._send("/api/generate", payload, stream=False)
+            if response.status_code == 200:
+                data = response.json()
+                stats.mark_first_token()
+                stats.finish(data)
+                self.last_stats = stats
+                if METRICS.enabled:
+                    METRICS.record_generation(stats, getattr(response, "span", None))
+                if cache_key:
+                    self.cache.put(cache_key, data['response'])
+                return data['response']
+            else:
+                return f"Error: {response.status_code}"
+        except ModelUnavailable as e:
+            return f"Error: {e}"
+        except requests.exceptions.ConnectionError:
+            return "Error: Could not connect to Ollama server"
+        except requests.exceptions.Timeout:
+            return "Error: Ollama server timed out"
+        except requests.exceptions.RequestException as e:
+            return f"Error: Request to Ollama failed: {e}"
+        except (ValueError, KeyError) as e:
+            return f"Error: Malformed response from Ollama: {e}"
+
+    def _send(self, path: str, payload: Dict, stream: bool) -> requests.Response:
+        # Every generation request goes through here, so a router can pick the host
+        return self.transport.post(
+            f"{self.base_url}{path}",
+            json=self._payload(payload),
+            stream=stream,
+            timeout=(self.transport.connect_timeout, self.generate_timeout)
+        )
+
+    def _payload(self, payload: Dict) -> Dict:
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _options(self, options: Optional[Dict] = None) -> Dict:
+        merged = dict(self.options)
+        merged.update(options or {})
+        return merged
+
+    def _cache_key(self, endpoint: str, model: str, prompt, options: Dict) -> Optional[str]:
+        if self.cache is None:
+            return None
+        if not self.cache.is_cacheable(options):
+            self.cache.record_bypass()
+            return None
+        return self.cache.make_key(endpoint, model, prompt, options)
+
+    @staticmethod
+    def _cached_stats(stats: GenerationStats) -> GenerationStats:
+        stats.cached = True
+        stats.mark_first_token()
+        stats.finish({})
+        return stats
+
+    def stream_response(self, prompt: str, model: str = None,
+                        stats: Optional[GenerationStats] = None) -> Iterator[str]:
+        if not model and not self.current_model:
+            if stats is not None:
+                stats.error = "No model selected"
+            yield "No model selected"
+            return
+
+        model_to_use = model or self.current_model
+        # Callers running several generations at once pass their own stats object
+        if stats is None:
+            stats = GenerationStats(model_to_use)
+        self.last_stats = stats
+        payload = {
+            "model": model_to_use,
+            "prompt": prompt,
+            "stream": True
+        }
+        options = self._options()
+        if options:
+            payload["options"] = options
+        cache_key = self._cache_key("/api/generate", model_to_use, prompt, options)
+        yield from self._stream("/api/generate", payload, stats, lambda chunk: chunk.get('response', ''), cache_key)
+
+    def stream_chat(self, messages: List[Dict], model: str = None,
+                    stats: Optional[GenerationStats] = None, options: Optional[Dict] = None,
+                    tools: Optional[List[Dict]] = None, tool_calls: Optional[List[Dict]] = None) -> Iterator[str]:
+        if not model and not self.current_model:
+            if stats is not None:
+                stats.error = "No model selected"
+            yield "No model selected"
+            return
+
+        model_to_use = model or self.current_model
+        if stats is None:
+            stats = GenerationStats(model_to_use)
+        self.last_stats = stats
+        payload = {
+            "model": model_to_use,
+            "messages": messages,
+            "stream": True
+        }
+        options = self._options(options)
+        if options:
+            payload["options"] = options
+        # Replies that call tools can't be replayed from the cache
+        if tools:
+            payload["tools"] = tools
+            cache_key = None
+        else:
+            cache_key = self._cache_key("/api/chat", model_to_use, messages, options)
+
+        def extract(chunk: Dict) -> str:
+            message = chunk.get('message', {})
+            # Tool calls arrive whole in a chunk; collect them for the caller
+            if tool_calls is not None and message.get('tool_calls'):
+                tool_calls.extend(message['tool_calls'])
+            return message.get('content', '')
+
+        yield from self._stream("/api/chat", payload, stats, extract, cache_key)
+
+    def prefill_chat(self, messages: List[Dict], model: str, options: Optional[Dict] = None,
+                     tools: Optional[List[Dict]] = None) -> Optional[GenerationStats]:
+        # Evaluates the prompt without generating (num_predict 0), leaving it in Ollama's KV cache for
+        # the next request that starts the same way; None when Ollama can't be reached or the request
+        # was aborted. Streamed so the connection stays open, and closing it stops Ollama's evaluation.
+        stats = GenerationStats(model)
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "options": dict(self._options(options), num_predict=0)
+        }
+        if tools:
+            payload["tools"] = tools
+        try:
+            with self._send("/api/chat", payload, stream=True) as response:
+                if response.status_code != 200:
+                    return None
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        return None
+                    if chunk.get('done'):
+                        stats.finish(chunk)
+                        return stats
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+        return None
+
+    def _stream(self, path: str, payload: Dict, stats: GenerationStats,
+                extract: Callable[[Dict], str], cache_key: Optional[str] = None) -> Iterator[str]:
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._cached_stats(stats)
+                yield cached
+                return
+        pieces = []
+        try:
+            response = self._send(path, payload, stream=True)
+            if response.status_code != 200:
+                response.close()
+                stats.error = f"Error: {response.status_code}"
+                yield stats.error
+                return
+
+            # Ollama sends one JSON object per line; the last one has done=true and the timings
+            with response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        stats.error = f"Error: {chunk['error']}"
+                        yield stats.error
+                        return
+                    text = extract(chunk)
+                    if text:
+                        stats.mark_first_token()
+                        if cache_key:
+                            pieces.append(text)
+                        yield text
+                    if chunk.get('done'):
+                        stats.finish(chunk)
+                        if METRICS.enabled:
+                            METRICS.record_generation(stats, getattr(response, "span", None))
+                        # Only complete replies are cached
+                        if cache_key:
+                            self.cache.put(cache_key, "".join(pieces))
+                        break
+        except ModelUnavailable as e:
+            stats.error = f"Error: {e}"
+            yield stats.error
+        except requests.exceptions.ConnectionError:
+            stats.error = "Error: Could not connect to Ollama server"
+            yield stats.error
+        except requests.exceptions.Timeout:
+            stats.error = "Error: Ollama server timed out"
+            yield stats.error
+        except requests.exceptions.RequestException as e:
+            # e.g. ChunkedEncodingError when the connection drops mid-reply
+            stats.error = f"Error: Ollama stream broke off: {e}"
+            yield stats.error
+        except ValueError as e:
+            stats.error = f"Error: Malformed response from Ollama: {e}"
+            yield stats.error
+
+class ModelCatalog:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(APP_DIR, "models.json")
+        self.lock = threading.Lock()
+        # base_url -> {"models": [...], "details": {name: {...}}, "updated": timestamp}
+        self.data: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Write then rename so a crash never leaves a half-written catalogue
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+    def cached_models(self, base_url: str) -> List[str]:
+        with self.lock:
+            return list(self.data.get(base_url, {}).get("models", []))
+
+    def details(self, base_url: str, model: str) -> Dict:
+        with self.lock:
+            return dict(self.data.get(base_url, {}).get("details", {}).get(model, {}))
+
+    def describe(self, base_url: str, model: str) -> str:
+        info = self.details(base_url, model)
+        parts = []
+        if info.get("parameter_size"):
+            parts.append(info["parameter_size"])
+        if info.get("quantization"):
+            parts.append(info["quantization"])
+        if info.get("context_length"):
+            parts.append(f"{info['context_length']} ctx")
+        if info.get("size"):
+            parts.append(f"{info['size'] / 1e9:.1f} GB")
+        return " \u00B7 ".join(parts)
+
+    def refresh(self, ollama_client: OllamaClient, max_workers: int = 4) -> List[str]:
+        # Blocking; run it off the UI thread. Falls back to the cached list when Ollama is down.
+        models = ollama_client.fetch_models()
+        if models is None:
+            return self.cached_models(ollama_client.base_url)
+        names = [model['name'] for model in models]
+        details = {}
+        for model in models:
+            model_details = model.get('details') or {}
+            details[model['name']] = {
+                "size": model.get('size'),
+                "parameter_size": model_details.get('parameter_size'),
+                "quantization": model_details.get('quantization_level'),
+            }
+        # /api/show is one request per model, so fetch them in parallel
+        if names:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for name, shown in zip(names, pool.map(ollama_client.show_model, names)):
+                    if not shown:
+                        continue
+                    shown_details = shown.get('details') or {}
+                    info = details[name]
+                    info["parameter_size"] = shown_details.get('parameter_size') or info["parameter_size"]
+                    info["quantization"] = shown_details.get('quantization_level') or info["quantization"]
+                    for key, value in (shown.get('model_info') or {}).items():
+                        if key.endswith(".context_length"):
+                            info["context_length"] = value
+        with self.lock:
+            self.data[ollama_client.base_url] = {"models": names, "details": details, "updated": time.time()}
+            try:
+                self._save()
+            except OSError:
+                pass
+        return names
+
+class Conversation:
+    def __init__(self, system_prompt: str = "", context_window: int = 4096, reserve_tokens: int = 1024,
+                 trim_ratio: float = 0.75, summarize: bool = False):
+        self.system_prompt = system_prompt
+        self.context_window = context_window
+        # Room left for the model's answer
+        self.reserve_tokens = reserve_tokens
+        self.trim_ratio = trim_ratio
+        self.summarize = summarize
+        self.messages: List[Dict] = []
+        self.summary = ""
+        self.dropped_turns = 0
+        # Bumped by clear() and restore(), so a summary finished after either is not applied
+        self.resets = 0
+        # Turn ids, so a reply finds its own user turn even if the same text was sent twice
+        self.turn_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    @property
+    def token_budget(self) -> int:
+        return self.context_window - self.reserve_tokens
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        # About four characters per token for English text
+        return len(text) // 4 + 4
+
+    def add_user(self, text: str) -> int:
+        with self.lock:
+            turn = next(self.turn_ids)
+            self.messages.append({"role": "user", "content": text, "tokens": self.estimate_tokens(text), "id": turn})
+            return turn
+
+    def remove_user(self, turn: int):
+        # Takes back a user turn that got no reply (refused, failed or stopped), so the history never
+        # has two user turns in a row
+        with self.lock:
+            index = self._find(turn)
+            if index is not None:
+                del self.messages[index]
+
+    def add_assistant(self, text: str, stats: Optional[GenerationStats] = None, turn: Optional[int] = None):
+        # Ollama's own count is exact when we have it
+        tokens = stats.eval_count if stats and stats.eval_count else self.estimate_tokens(text)
+        message = {"role": "assistant", "content": text, "tokens": tokens, "id": next(self.turn_ids)}
+        with self.lock:
+            # Right after the user turn it answers; at the end if that turn was trimmed away
+            index = None if turn is None else self._find(turn)
+            self.messages.insert(len(self.messages) if index is None else index + 1, message)
+
+    def _find(self, turn: int) -> Optional[int]:
+        for index in range(len(self.messages) - 1, -1, -1):
+            if self.messages[index]["id"] == turn:
+                return index
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.messages = []
+            self.summary = ""
+            self.dropped_turns = 0
+            self.resets += 1
+
+    def restore(self, messages: List[Dict]):
+        # Picks a saved chat back up; anything over budget is trimmed on the next request
+        with self.lock:
+            self.messages = [
+                {"role": m["role"], "content": m["content"],
+                 "tokens": m.get("eval_count") or self.estimate_tokens(m["content"]), "id": next(self.turn_ids)}
+                for m in messages if m["role"] in ("user", "assistant")
+            ]
+            self.summary = ""
+            self.dropped_turns = 0
+            self.resets += 1
+
+    def draft_messages(self, draft: str) -> Optional[List[Dict]]:
+        # The messages sending the draft would produce, or None if it would trim (and so change) the history
+        with self.lock:
+            if self.used_tokens() + self.estimate_tokens(draft) > self.token_budget:
+                return None
+            messages = self._build()
+        if draft:
+            messages.append({"role": "user", "content": draft})
+        return messages
+
+    def used_tokens(self) -> int:
+        total = sum(message["tokens"] for message in self.messages)
+        return total + self.estimate_tokens(self.system_prompt) + self.estimate_tokens(self.summary)
+
+    def prepare_messages(self, ollama_client: Optional[OllamaClient] = None, model: str = None) -> List[Dict]:
+        with self.lock:
+            dropped = self._trim() if self.used_tokens() > self.token_budget else []
+            if not (dropped and self.summarize and ollama_client):
+                return self._build()
+            summary, resets = self.summary, self.resets
+        # Summarizing is a whole model call; under the lock it would stall the UI thread adding turns
+        summary = self._summarize(ollama_client, model, dropped, summary)
+        with self.lock:
+            if summary is not None and resets == self.resets:
+                self.summary = summary
+            return self._build()
+
+    def options(self) -> Dict:
+        return {"num_ctx": self.context_window}
+
+    def _build(self) -> List[Dict]:
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        messages.extend({"role": m["role"], "content": m["content"]} for m in self.messages)
+        return messages
+
+    def _trim(self) -> List[Dict]:
+        # Drop old turns in one go down to trim_ratio of the budget, so the prompt prefix
+        # stays identical for the next several turns and Ollama can reuse its KV cache
+        target = int(self.token_budget * self.trim_ratio)
+        dropped = []
+        while len(self.messages) > 1 and self.used_tokens() > target:
+            dropped.append(self.messages.pop(0))
+            # Never start the history with a dangling assistant reply
+            while self.messages and self.messages[0]["role"] == "assistant" and len(self.messages) > 1:
+                dropped.append(self.messages.pop(0))
+        self.dropped_turns += len(dropped)
+        return dropped
+
+    @staticmethod
+    def _summarize(ollama_client: OllamaClient, model: Optional[str], dropped: List[Dict],
+                   earlier: str) -> Optional[str]:
+        # None keeps the earlier summary; a failed call must not become the summary
+        if not (model or ollama_client.current_model):
+            return None
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in dropped)
+        if earlier:
+            transcript = f"Earlier summary: {earlier}\n{transcript}"
+        summary = ollama_client.generate_response(
+            f"Summarize this conversation in a few sentences, keeping names and facts:\n{transcript}",
+            model
+        )
+        summary = summary.strip()
+        return None if not summary or summary.startswith("Error:") else summary
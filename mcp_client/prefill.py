@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+
+from .agent import ToolCatalog
+from .mcp import MCPServer
+from .metrics import METRICS
+from .ollama import OllamaClient
+from .transport import RequestScope
+
+def prompt_text(messages: List[Dict]) -> str:
+    # Stands in for the token sequence Ollama builds, close enough to find the shared prefix
+    return "".join(f"{message['role']}\n{message['content']}\n" for message in messages)
+
+class PromptPrefill:
+    # Sends the chat so far, with the draft the user is typing, to Ollama to process but not answer, so its
+    # KV cache already holds the prompt when the real request arrives and only the rest needs evaluating.
+    # At most one prefill runs at a time, at most one every min_interval seconds, and never while a real
+    # generation is running.
+    def __init__(self, ollama_client: OllamaClient, tool_catalog: Optional[ToolCatalog] = None,
+                 min_interval: float = 2.0, min_growth: int = 24):
+        self.ollama_client = ollama_client
+        self.tool_catalog = tool_catalog or ToolCatalog()
+        self.min_interval = min_interval
+        # Characters the prompt must have grown by since the last prefill to be worth another one
+        self.min_growth = min_growth
+        self.lock = threading.Lock()
+        # Bumped by cancel(); a prefill that finishes under an older generation is not counted
+        self.generation = 0
+        self.running = False
+        # Connections of the prefill in flight, closed by cancel() so Ollama stops evaluating it
+        self.scope: Optional[RequestScope] = None
+        self.last_started = 0.0
+        # What Ollama holds for this model now, and the prompt eval time and tokens spent getting it there
+        self.warm_model: Optional[str] = None
+        self.warm_text = ""
+        self.warm_seconds = 0.0
+        self.warm_tokens = 0
+        self.started = 0
+        self.completed = 0
+        self.skipped = 0
+        self.discarded = 0
+        self.aborted = 0
+        self.failed = 0
+        self.replies = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+
+    def retry_after(self) -> float:
+        # Seconds until request() could start a prefill
+        with self.lock:
+            wait = self.last_started + self.min_interval - time.perf_counter()
+            return max(wait, self.min_interval if self.running else 0.0)
+
+    def request(self, messages: List[Dict], model: str, options: Optional[Dict] = None,
+                servers: Optional[List[MCPServer]] = None, busy: bool = False) -> bool:
+        # Called after the user paused typing; True if a prefill was started in the background
+        text = prompt_text(messages)
+        with self.lock:
+            # Measured from the shared prefix: the draft is the last message, so a longer draft never
+            # simply extends the previous prompt text
+            grown = len(text) - len(os.path.commonprefix([self.warm_text, text]))
+            if (busy or self.running or time.perf_counter() - self.last_started < self.min_interval
+                    or (model == self.warm_model and grown < self.min_growth)):
+                self.skipped += 1
+                return False
+            self.running = True
+            self.last_started = time.perf_counter()
+            self.started += 1
+            generation = self.generation
+        worker = threading.Thread(target=self._run, args=(generation, messages, model, options, servers, text))
+        worker.daemon = True
+        worker.start()
+        return True
+
+    def cancel(self):
+        # The draft went away (new chat, other model): whatever is running no longer counts, and its
+        # connection is closed so Ollama doesn't keep a slot busy evaluating it
+        with self.lock:
+            self.generation += 1
+            self._reset()
+            scope = self.scope
+        if scope is not None:
+            scope.abort()
+
+    def _reset(self):
+        self.warm_model = None
+        self.warm_text = ""
+        self.warm_seconds = 0.0
+        self.warm_tokens = 0
+
+    def _run(self, generation: int, messages: List[Dict], model: str, options: Optional[Dict],
+             servers: Optional[List[MCPServer]], text: str):
+        stats = None
+        scope = RequestScope()
+        try:
+            # The tool list is part of the prompt, so it has to match the one the real request sends
+            tools = self.tool_catalog.refresh(servers).definitions if servers else None
+            with self.lock:
+                if generation == self.generation:
+                    self.scope = scope
+                else:
+                    scope.aborted = True
+            if not scope.aborted:
+                with scope:
+                    stats = self.ollama_client.prefill_chat(messages, model, options=options, tools=tools or None)
+        finally:
+            with self.lock:
+                self.running = False
+                self.scope = None
+                if scope.aborted:
+                    self.aborted += 1
+                elif stats is None:
+                    self.failed += 1
+                elif generation != self.generation:
+                    self.discarded += 1
+                else:
+                    self.completed += 1
+                    self._record(model, text, stats.prompt_eval_duration / 1e9, stats.prompt_eval_count)
+        if stats is not None and METRICS.enabled:
+            METRICS.observe("ollama_prefill_seconds", stats.prompt_eval_duration / 1e9, {"model": model})
+
+    def _record(self, model: str, text: str, seconds: float, tokens: int):
+        # Ollama keeps the part shared with the previous prompt and evaluated the rest
+        if model != self.warm_model:
+            self._reset()
+        kept = len(os.path.commonprefix([self.warm_text, text]))
+        share = kept / len(self.warm_text) if self.warm_text else 0.0
+        self.warm_model = model
+        self.warm_text = text
+        self.warm_seconds = self.warm_seconds * share + seconds
+        self.warm_tokens = int(self.warm_tokens * share) + tokens
+
+    def claim(self, model: str, messages: List[Dict]) -> Optional[Tuple[int, float]]:
+        # Called with the real request just before it is sent: the prompt tokens and prompt eval seconds
+        # it is spared, estimated from the share of the prefilled prompt it starts with
+        text = prompt_text(messages)
+        with self.lock:
+            # A prefill still running now only adds to the cache this request is about to use
+            self.generation += 1
+            if model != self.warm_model or not self.warm_text:
+                self._reset()
+                return None
+            share = len(os.path.commonprefix([self.warm_text, text])) / len(self.warm_text)
+            tokens, seconds = int(self.warm_tokens * share), self.warm_seconds * share
+            self._reset()
+            if seconds <= 0:
+                return None
+            self.replies += 1
+            self.saved_seconds += seconds
+            self.saved_tokens += tokens
+            return tokens, seconds
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "started": self.started,
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "discarded": self.discarded,
+                "aborted": self.aborted,
+                "failed": self.failed,
+                "replies": self.replies,
+                "saved_seconds": self.saved_seconds,
+                "saved_tokens": self.saved_tokens,
+            }
@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import List, Dict, Optional, Callable
+
+from .mcp import MCPServer, normalize_url
+
+class ServerRegistry:
+    ADDED = "added"
+    REMOVED = "removed"
+    STATUS_CHANGED = "status_changed"
+
+    def __init__(self):
+        # Keyed by normalized URL, kept in insertion order
+        self.servers: Dict[str, MCPServer] = {}
+        self.lock = threading.RLock()
+        self.listeners: List[Callable[[str, MCPServer], None]] = []
+
+    def subscribe(self, listener: Callable[[str, MCPServer], None]):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[str, MCPServer], None]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _emit(self, event: str, server: MCPServer):
+        # Listeners run on the caller's thread, outside the lock
+        for listener in list(self.listeners):
+            listener(event, server)
+
+    def add(self, server: MCPServer) -> MCPServer:
+        with self.lock:
+            existing = self.servers.get(server.key)
+            if existing is not None:
+                return existing
+            self.servers[server.key] = server
+        self._emit(self.ADDED, server)
+        return server
+
+    def remove(self, server_or_url) -> Optional[MCPServer]:
+        key = server_or_url.key if isinstance(server_or_url, MCPServer) else normalize_url(server_or_url)
+        with self.lock:
+            server = self.servers.pop(key, None)
+        if server is not None:
+            self._emit(self.REMOVED, server)
+        return server
+
+    def set_status(self, server: MCPServer, status: str):
+        with self.lock:
+            server = self.servers.get(server.key, server)
+            changed = server.status != status
+            server.status = status
+            server.last_check = time.time()
+        if changed:
+            self._emit(self.STATUS_CHANGED, server)
+
+    def get(self, url: str) -> Optional[MCPServer]:
+        with self.lock:
+            return self.servers.get(normalize_url(url))
+
+    def find_by_name(self, name: str) -> Optional[MCPServer]:
+        with self.lock:
+            for server in self.servers.values():
+                if server.name == name:
+                    return server
+        return None
+
+    def __contains__(self, server: MCPServer) -> bool:
+        with self.lock:
+            return server.key in self.servers
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.servers)
+
+    def __iter__(self):
+        # Iterate over a snapshot so other threads can keep adding
+        with self.lock:
+            return iter(list(self.servers.values()))
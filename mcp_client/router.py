@@ -0,0 +1,298 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import requests
+
+from .ollama import ModelUnavailable, OllamaClient, ResponseCache
+from .transport import HTTPTransport, RequestScope
+
+class OllamaBackend:
+    def __init__(self, base_url: str, max_concurrency: int = 2):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(max_concurrency, 1)
+        self.in_flight = 0
+        self.healthy = True
+        self.failures = 0
+        # A host that failed is skipped until then, unless nothing else is left
+        self.retry_at = 0.0
+        # Model names from /api/tags (None until the first poll) and from /api/ps
+        self.available: Optional[Set[str]] = None
+        # Pulled models change far less often than loaded ones, so /api/tags is read less often
+        self.tags_at = 0.0
+        self.loaded: Set[str] = set()
+        self.served = 0
+
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.max_concurrency
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.max_concurrency
+
+    def summary(self) -> Dict:
+        return {
+            "url": self.base_url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "loaded": sorted(self.loaded),
+            "served": self.served,
+        }
+
+class OllamaRouter(OllamaClient):
+    # Spreads generation over several Ollama hosts: warm hosts first, then the least loaded one
+    def __init__(self, base_urls: List[str], max_concurrency: Union[int, Dict[str, int]] = 2,
+                 transport: Optional[HTTPTransport] = None, generate_timeout: float = 300.0,
+                 keep_alive: Optional[str] = "30m", cache: Optional[ResponseCache] = None,
+                 options: Optional[Dict] = None, poll_interval: float = 10.0, probe_timeout: float = 2.0,
+                 retry_after: float = 15.0, queue_timeout: Optional[float] = None, tags_interval: float = 60.0):
+        caps = max_concurrency if isinstance(max_concurrency, dict) else {}
+        default_cap = max_concurrency if isinstance(max_concurrency, int) else 2
+        self.backends = [OllamaBackend(url, caps.get(url, default_cap)) for url in base_urls]
+        # The joined URLs identify the pool, e.g. in the model catalogue
+        super().__init__(",".join(backend.base_url for backend in self.backends), transport=transport,
+                         generate_timeout=generate_timeout, keep_alive=keep_alive, cache=cache, options=options)
+        self.poll_interval = poll_interval
+        self.probe_timeout = probe_timeout
+        self.retry_after = retry_after
+        self.tags_interval = tags_interval
+        # How long a request may wait for a free slot; None waits as long as it takes
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.poll_thread = threading.Thread(target=self._poll_worker)
+        self.poll_thread.daemon = True
+        self.poll_thread.start()
+
+    @property
+    def capacity(self) -> int:
+        return sum(backend.max_concurrency for backend in self.backends)
+
+    def close(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def status(self) -> List[Dict]:
+        with self.condition:
+            return [backend.summary() for backend in self.backends]
+
+    def _poll_worker(self):
+        while not self.stop_event.is_set():
+            self.poll()
+            self.stop_event.wait(self.poll_interval)
+
+    def poll(self):
+        # Blocking; refreshes which models every host holds in memory and, when due, which it has
+        now = time.monotonic()
+        jobs = [(backend, "ps") for backend in self.backends]
+        jobs += [(backend, "tags") for backend in self.backends if now >= backend.tags_at]
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="ollama-poll") as pool:
+            results = list(pool.map(lambda job: self._poll_names(*job), jobs))
+        for backend in self.backends:
+            answers = {endpoint: result for (owner, endpoint), result in zip(jobs, results) if owner is backend}
+            self._apply_poll(backend, answers)
+
+    def _poll_names(self, backend: OllamaBackend, endpoint: str) -> Tuple[bool, Optional[Set[str]]]:
+        # (reachable, model names); a non-200 reply leaves the names as they were
+        try:
+            response = self.transport.get(f"{backend.base_url}/api/{endpoint}", timeout=self.probe_timeout)
+            if response.status_code != 200:
+                return True, None
+            return True, {model['name'] for model in response.json().get('models', [])}
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            return False, None
+
+    def _apply_poll(self, backend: OllamaBackend, answers: Dict[str, Tuple[bool, Optional[Set[str]]]]):
+        if not all(reachable for reachable, _ in answers.values()):
+            self._mark_down(backend)
+            return
+        with self.condition:
+            loaded = answers["ps"][1]
+            if loaded is not None:
+                backend.loaded = loaded
+            if "tags" in answers:
+                available = answers["tags"][1]
+                if available is not None:
+                    backend.available = available
+                    backend.tags_at = time.monotonic() + self.tags_interval
+            backend.healthy = True
+            backend.failures = 0
+            self.condition.notify_all()
+
+    def _mark_down(self, backend: OllamaBackend):
+        with self.condition:
+            backend.healthy = False
+            backend.failures += 1
+            backend.loaded = set()
+            backend.retry_at = time.monotonic() + self.retry_after
+            # A host that comes back may have been restarted with other models
+            backend.tags_at = 0.0
+            self.condition.notify_all()
+
+    def _candidates(self, model: Optional[str], exclude: Set[OllamaBackend]) -> List[OllamaBackend]:
+        now = time.monotonic()
+        having = [backend for backend in self.backends if backend not in exclude and self._may_have(backend, model)]
+        usable = [backend for backend in having if backend.healthy or now >= backend.retry_at]
+        # With every host that has the model marked down, still try them rather than fail outright;
+        # hosts with the model already in memory skip the load, and ties go to the least loaded
+        return sorted(usable or having, key=lambda backend: (model not in backend.loaded, backend.load))
+
+    @staticmethod
+    def _may_have(backend: OllamaBackend, model: Optional[str]) -> bool:
+        # Before the first /api/tags answer any host might have it
+        return not model or backend.available is None or model in backend.available
+
+    def _check_available(self, model: Optional[str]):
+        with self.condition:
+            if any(self._may_have(backend, model) for backend in self.backends):
+                return
+        # The lists may predate a pull, so read them once more before giving up
+        self.fetch_models(timeout=self.probe_timeout)
+        with self.condition:
+            if any(self._may_have(backend, model) for backend in self.backends):
+                return
+        raise ModelUnavailable(f"Model {model} is not available on any Ollama host")
+
+    def _acquire(self, model: Optional[str], exclude: Set[OllamaBackend]) -> Optional[OllamaBackend]:
+        deadline = None if self.queue_timeout is None else time.monotonic() + self.queue_timeout
+        with self.condition:
+            while not self.stop_event.is_set():
+                candidates = self._candidates(model, exclude)
+                if not candidates:
+                    return None
+                for backend in candidates:
+                    if backend.has_capacity():
+                        backend.in_flight += 1
+                        return backend
+                # Every host is at its cap; wait for a slot to free up
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+        return None
+
+    def _release(self, backend: OllamaBackend):
+        with self.condition:
+            backend.in_flight -= 1
+            # Waiters may want different models, so let all of them re-check
+            self.condition.notify_all()
+
+    def _send(self, path: str, payload: Dict, stream: bool) -> requests.Response:
+        model = payload.get("model")
+        self._check_available(model)
+        tried: Set[OllamaBackend] = set()
+        while True:
+            backend = self._acquire(model, tried)
+            if backend is None:
+                raise requests.exceptions.ConnectionError("No Ollama host available")
+            try:
+                response = self.transport.post(
+                    f"{backend.base_url}{path}",
+                    json=self._payload(payload),
+                    stream=stream,
+                    timeout=(self.transport.connect_timeout, self.generate_timeout)
+                )
+            except requests.exceptions.ConnectionError:
+                self._release(backend)
+                scope = RequestScope.current()
+                if scope is not None and scope.aborted:
+                    # Cut off on purpose (a cancelled prefill); the host is fine
+                    raise
+                # Nothing was generated yet, so the request can go to the next host
+                self._mark_down(backend)
+                tried.add(backend)
+                continue
+            except Exception:
+                self._release(backend)
+                raise
+            with self.condition:
+                backend.healthy = True
+                backend.failures = 0
+                backend.served += 1
+                if response.status_code == 200 and model:
+                    backend.loaded.add(model)
+            response.backend = backend.base_url
+            if not stream:
+                self._release(backend)
+                return response
+            # A streamed reply keeps its slot until the caller closes the response
+            close = response.close
+            released = [False]
+
+            def close_and_release():
+                close()
+                if not released[0]:
+                    released[0] = True
+                    self._release(backend)
+
+            response.close = close_and_release
+            return response
+
+    def fetch_models(self, timeout: float = 5) -> Optional[List[Dict]]:
+        # Every model any host has, listed once
+        with ThreadPoolExecutor(max_workers=len(self.backends), thread_name_prefix="ollama-poll") as pool:
+            results = list(pool.map(lambda backend: self._fetch_tags(backend, timeout), self.backends))
+        if all(result is None for result in results):
+            return None
+        models = {}
+        for result in results:
+            for model in result or []:
+                models.setdefault(model['name'], model)
+        return list(models.values())
+
+    def _fetch_tags(self, backend: OllamaBackend, timeout: float) -> Optional[List[Dict]]:
+        try:
+            response = self.transport.get(f"{backend.base_url}/api/tags", timeout=timeout)
+            if response.status_code == 200:
+                models = response.json()['models']
+                with self.condition:
+                    backend.available = {model['name'] for model in models}
+                    backend.tags_at = time.monotonic() + self.tags_interval
+                return models
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            self._mark_down(backend)
+        return None
+
+    def fetch_running(self, timeout: float = 5) -> Optional[List[Dict]]:
+        # Loaded models on every host; a model loaded on several hosts is listed for each
+        def fetch(backend: OllamaBackend) -> Optional[List[Dict]]:
+            try:
+                response = self.transport.get(f"{backend.base_url}/api/ps", timeout=timeout)
+                if response.status_code == 200:
+                    models = response.json()['models']
+                    with self.condition:
+                        backend.loaded = {model['name'] for model in models}
+                    return [dict(model, host=backend.base_url) for model in models]
+            except (requests.exceptions.RequestException, ValueError, KeyError):
+                self._mark_down(backend)
+            return None
+
+        with ThreadPoolExecutor(max_workers=len(self.backends), thread_name_prefix="ollama-poll") as pool:
+            results = list(pool.map(fetch, self.backends))
+        if all(result is None for result in results):
+            return None
+        return [model for result in results for model in result or []]
+
+    def show_model(self, model: str, timeout: float = 10) -> Optional[Dict]:
+        for backend in self._candidates(model, set()):
+            try:
+                response = self.transport.post(f"{backend.base_url}/api/show", json={"model": model}, timeout=timeout)
+                if response.status_code == 200:
+                    return response.json()
+            except (requests.exceptions.RequestException, ValueError):
+                continue
+        return None
+
+def parse_hosts(text: str) -> List[str]:
+    # Comma or whitespace separated base URLs
+    return [url.strip().rstrip("/") for url in text.replace(",", " ").split() if url.strip()]
+
+def create_ollama_client(urls: Union[str, List[str]], max_concurrency: int = 2, **kwargs) -> OllamaClient:
+    # One host keeps the plain client; several get a router
+    hosts = parse_hosts(urls) if isinstance(urls, str) else list(urls)
+    if len(hosts) > 1:
+        return OllamaRouter(hosts, max_concurrency=max_concurrency, **kwargs)
+    return OllamaClient(hosts[0] if hosts else "http://localhost:11434", **kwargs)
@@ -0,0 +1,320 @@
+import itertools
+import queue
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+
+from .agent import AgentLoop, ToolCatalog
+from .mcp import MCPServer
+from .ollama import GenerationStats, OllamaClient, Conversation
+from .transport import RequestScope
+
+class GenerationJob:
+    def __init__(self, job_id: int, prompt: str, model: Optional[str],
+                 conversation: Optional[Conversation] = None, servers: Optional[List[MCPServer]] = None,
+                 group: Optional[int] = None):
+        self.job_id = job_id
+        self.prompt = prompt
+        self.model = model
+        self.conversation = conversation
+        # MCP servers whose tools the model may call during this job
+        self.servers = servers or []
+        # Jobs sent together to compare models share a group id
+        self.group = group
+        self.text = ""
+        self.stats: Optional[GenerationStats] = None
+        # Why the job produced no reply, when it failed; its text may still hold the error message
+        self.error: Optional[str] = None
+        # (prompt tokens, prompt eval seconds) a prefill spared this job
+        self.prefilled: Optional[Tuple[int, float]] = None
+        self.submitted = time.perf_counter()
+        self.cancel_event = threading.Event()
+        # The Ollama requests the job sends, so a cancel reaches one still waiting for its first token
+        self.scope = RequestScope()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.scope.abort()
+
+class RequestScheduler:
+    def __init__(self, ollama_client: OllamaClient, max_workers: int = 2, max_pending: int = 8):
+        self.ollama_client = ollama_client
+        # The size asked for; comparisons raise max_workers above it only while they run
+        self.configured_workers = max_workers
+        self.max_workers = max_workers
+        # Group id -> jobs of that comparison not finished yet
+        self.groups: Dict[int, int] = {}
+        # Bounded so a burst of submissions is refused instead of piling up
+        self.pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.results: queue.Queue = queue.Queue()
+        self.active: Dict[int, GenerationJob] = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        # Shared by agent jobs so tool schemas aren't re-indexed on every turn
+        self.tool_catalog = ToolCatalog()
+        self.workers: List[threading.Thread] = []
+        # Requests one model may have in flight at once; None means no limit
+        self.default_model_limit: Optional[int] = None
+        self.model_limits: Dict[str, int] = {}
+        self.model_running: Dict[str, int] = {}
+        self.model_slots = threading.Condition()
+        # Optional EmbeddingIndex that adds related excerpts from earlier chats to each chat request
+        self.retriever = None
+        # Optional PromptPrefill that evaluated the prompt while it was typed
+        self.prefill = None
+        self.closed = False
+        self._start_workers()
+
+    def _start_workers(self):
+        with self.lock:
+            missing = self.max_workers - len(self.workers)
+            for _ in range(missing):
+                worker = threading.Thread(target=self._worker)
+                worker.daemon = True
+                self.workers.append(worker)
+                worker.start()
+
+    def set_max_workers(self, max_workers: int):
+        # More workers let several Ollama hosts generate at once; extra ones stop after their current job.
+        # Nothing here waits on the queue, so it is safe from the UI thread however full the queue is.
+        with self.lock:
+            self.configured_workers = max(max_workers, 1)
+            self._resize()
+        self._start_workers()
+
+    def _resize(self):
+        # Called with the lock held; workers beyond the new size retire after their current job
+        self.max_workers = max(self.configured_workers, sum(self.groups.values()))
+
+    def submit(self, prompt: str, model: str = None, conversation: Optional[Conversation] = None,
+               servers: Optional[List[MCPServer]] = None) -> Optional[GenerationJob]:
+        job = GenerationJob(next(self.ids), prompt, model or self.ollama_client.current_model, conversation, servers)
+        # Registered before it is queued so a worker that finishes it quickly cannot leave it behind in active
+        # Producers queue under the lock, so submit_group's capacity check can't be raced
+        with self.lock:
+            if self.closed:
+                return None
+            try:
+                self.pending.put_nowait(job)
+            except queue.Full:
+                return None
+            self.active[job.job_id] = job
+        return job
+
+    def set_model_limits(self, default: Optional[int], limits: Optional[Dict[str, int]] = None):
+        with self.model_slots:
+            self.default_model_limit = default
+            self.model_limits = dict(limits or {})
+            self.model_slots.notify_all()
+
+    def submit_group(self, prompt: str, models: List[str]) -> Optional[List[GenerationJob]]:
+        # One prompt to several models at once; the pool grows so none of them waits for a worker, and
+        # shrinks back once the group is done
+        group = next(self.ids)
+        jobs = [GenerationJob(next(self.ids), prompt, model, group=group) for model in models]
+        if not jobs:
+            return []
+        with self.lock:
+            # All or nothing: a comparison with models missing isn't one. Workers only take jobs out, so
+            # the room checked here is still there when the jobs go in.
+            if self.closed or self.pending.maxsize - self.pending.qsize() < len(jobs):
+                return None
+            for job in jobs:
+                self.pending.put_nowait(job)
+                self.active[job.job_id] = job
+            self.groups[group] = len(jobs)
+            self._resize()
+        self._start_workers()
+        return jobs
+
+    def cancel(self, job_id: int):
+        with self.lock:
+            job = self.active.get(job_id)
+        if job:
+            job.cancel()
+
+    def cancel_all(self):
+        with self.lock:
+            jobs = list(self.active.values())
+        for job in jobs:
+            job.cancel()
+
+    def in_flight(self) -> int:
+        with self.lock:
+            return len(self.active)
+
+    def poll(self, max_events: int = 200) -> List[tuple]:
+        # Called from the UI thread; never blocks
+        events = []
+        while len(events) < max_events:
+            try:
+                events.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def shutdown(self):
+        # Never blocks: queued jobs are cancelled here and workers stop at their next check
+        with self.lock:
+            self.closed = True
+        self.cancel_all()
+        while True:
+            try:
+                job = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.active.pop(job.job_id, None)
+                self._finish_group(job)
+            self.results.put(("cancelled", job, None))
+
+    def _finish_group(self, job: GenerationJob):
+        # Called with the lock held once a job is over, whether it ran or not
+        if job.group is None or job.group not in self.groups:
+            return
+        self.groups[job.group] -= 1
+        if self.groups[job.group] <= 0:
+            del self.groups[job.group]
+            self._resize()
+
+    def _retire(self) -> bool:
+        # A worker leaves once the scheduler is shut down or the pool has been made smaller
+        with self.lock:
+            if self.closed or len(self.workers) > self.max_workers:
+                self.workers.remove(threading.current_thread())
+                return True
+        return False
+
+    def _worker(self):
+        while not self._retire():
+            try:
+                job = self.pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                # One broken job must not take the worker with it, and the UI is waiting for its end
+                job.error = f"Error: {e}"
+                self.results.put(("chunk", job, job.error))
+                self.results.put(("done", job, job.stats))
+            finally:
+                with self.lock:
+                    self.active.pop(job.job_id, None)
+                    self._finish_group(job)
+
+    def _context(self, job: GenerationJob, messages: List[Dict]) -> List[Dict]:
+        retriever = self.retriever
+        if retriever is not None:
+            messages = retriever.augment_messages(messages)
+        prefill = self.prefill
+        if prefill is not None:
+            job.prefilled = prefill.claim(job.model, messages)
+        return messages
+
+    @staticmethod
+    def _note_prefill(job: GenerationJob):
+        if job.stats is not None and job.prefilled is not None:
+            tokens, seconds = job.prefilled
+            job.stats.notes.append(f"prefilled ~{tokens} tokens, ~{seconds * 1000:.0f} ms saved (estimate)")
+
+    def _acquire_model(self, job: GenerationJob) -> bool:
+        # Blocks this worker while the model is at its limit; False if the job was cancelled meanwhile
+        with self.model_slots:
+            while not job.cancelled:
+                limit = self.model_limits.get(job.model, self.default_model_limit)
+                if limit is None or self.model_running.get(job.model, 0) < limit:
+                    self.model_running[job.model] = self.model_running.get(job.model, 0) + 1
+                    return True
+                self.model_slots.wait(0.1)
+        return False
+
+    def _release_model(self, job: GenerationJob):
+        with self.model_slots:
+            self.model_running[job.model] -= 1
+            self.model_slots.notify_all()
+
+    def _run(self, job: GenerationJob):
+        if job.cancelled or not self._acquire_model(job):
+            self.results.put(("cancelled", job, None))
+            return
+        try:
+            if job.servers and job.conversation is not None:
+                self._run_agent(job)
+            else:
+                self._run_generate(job)
+        finally:
+            self._release_model(job)
+
+    def _run_generate(self, job: GenerationJob):
+        job.stats = GenerationStats(job.model)
+        stream = None
+        try:
+            with job.scope:
+                if job.conversation is not None:
+                    messages = self._context(job, job.conversation.prepare_messages(self.ollama_client, job.model))
+                    stream = self.ollama_client.stream_chat(messages, job.model, stats=job.stats,
+                                                            options=job.conversation.options())
+                else:
+                    stream = self.ollama_client.stream_response(job.prompt, job.model, stats=job.stats)
+                for piece in stream:
+                    # An aborted request ends its stream with a connection error, which is not the reply
+                    if job.cancelled:
+                        break
+                    job.text += piece
+                    self.results.put(("chunk", job, piece))
+        except Exception as e:
+            job.error = f"Error: {e}"
+            self.results.put(("chunk", job, job.error))
+        finally:
+            # Closing the generator also closes the underlying HTTP response
+            if stream is not None:
+                stream.close()
+        if job.error is None and job.stats.error is not None:
+            job.error = job.stats.error
+        self._note_prefill(job)
+        self.results.put(("cancelled" if job.cancelled else "done", job, job.stats))
+
+    def _run_agent(self, job: GenerationJob):
+        def on_text(piece: str):
+            job.text += piece
+            self.results.put(("chunk", job, piece))
+
+        # Tool activity is shown in the reply but is not part of the model's answer
+        def on_tool(description: str):
+            self.results.put(("tool", job, description))
+
+        agent = AgentLoop(self.ollama_client, job.servers, catalog=self.tool_catalog)
+        try:
+            with job.scope:
+                messages = self._context(job, job.conversation.prepare_messages(self.ollama_client, job.model))
+            _, trace = agent.run(messages, job.model, options=job.conversation.options(),
+                                 on_text=on_text, on_tool=on_tool, cancelled=lambda: job.cancelled,
+                                 scope=job.scope)
+            job.stats = trace.last_stats
+            if job.stats is not None:
+                job.stats.notes.append(trace.summary())
+                job.error = job.stats.error
+        except Exception as e:
+            job.error = f"Error: {e}"
+            self.results.put(("chunk", job, job.error))
+        self._note_prefill(job)
+        self.results.put(("cancelled" if job.cancelled else "done", job, job.stats))
+
+def parse_model_limits(text: str) -> Tuple[Optional[int], Dict[str, int]]:
+    # "2" limits every model; "2, llama3:70b=1" also gives one model its own limit
+    default = None
+    limits = {}
+    for part in text.replace(",", " ").split():
+        name, _, value = part.rpartition("=")
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError(f"Not a positive number: {part}")
+        if name:
+            limits[name] = int(value)
+        else:
+            default = int(value)
+    return default, limits
@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from . import APP_DIR
+from .ollama import GenerationStats
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    model TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL,
+    model TEXT,
+    server TEXT,
+    stats TEXT,
+    first_token_ms REAL,
+    tokens_per_second REAL,
+    total_s REAL,
+    eval_count INTEGER,
+    prompt_eval_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation_id, id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+MESSAGE_COLUMNS = ("id, conversation_id, role, content, created, model, server, stats, "
+                   "first_token_ms, tokens_per_second, total_s, eval_count, prompt_eval_count")
+
+class ConversationStore:
+    # Every chat on disk: SQLite in WAL mode, with an FTS5 index over message text when available
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(APP_DIR, "conversations.sqlite3")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        # WAL lets searches read while a reply is written; NORMAL skips the fsync on every commit
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        try:
+            self.db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; search falls back to a (slow) LIKE scan
+            self.fts = False
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def create_conversation(self, title: str = "", model: Optional[str] = None) -> int:
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO conversations (title, model, created, updated) VALUES (?, ?, ?, ?)",
+                (title[:120], model, now, now)
+            )
+            self.db.commit()
+            return cursor.lastrowid
+
+    def add_message(self, conversation_id: int, role: str, content: str, model: Optional[str] = None,
+                    server: Optional[str] = None, stats: Optional[GenerationStats] = None) -> int:
+        now = time.time()
+        timings = (None, None, None, None, None, None)
+        if stats is not None:
+            timings = (
+                stats.summary(),
+                stats.first_token_latency * 1000 if stats.first_token_latency is not None else None,
+                stats.tokens_per_second,
+                stats.total_time,
+                stats.eval_count or None,
+                stats.prompt_eval_count or None,
+            )
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO messages (conversation_id, role, content, created, model, server, stats, "
+                "first_token_ms, tokens_per_second, total_s, eval_count, prompt_eval_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (conversation_id, role, content, now, model, server) + timings
+            )
+            self.db.execute(
+                "UPDATE conversations SET updated = ?, message_count = message_count + 1, "
+                "model = COALESCE(?, model) WHERE id = ?",
+                (now, model, conversation_id)
+            )
+            self.db.commit()
+            return cursor.lastrowid
+
+    def rename_conversation(self, conversation_id: int, title: str):
+        with self.lock:
+            self.db.execute("UPDATE conversations SET title = ? WHERE id = ?", (title[:120], conversation_id))
+            self.db.commit()
+
+    def delete_conversation(self, conversation_id: int):
+        with self.lock:
+            self.db.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            self.db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            self.db.commit()
+
+    def get_conversation(self, conversation_id: int) -> Optional[Dict]:
+        with self.lock:
+            row = self.db.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_conversations(self, limit: int = 50, offset: int = 0) -> List[Dict]:
+        # Most recently active first
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM conversations ORDER BY updated DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def load_page(self, conversation_id: int, before_id: Optional[int] = None, limit: int = 100) -> List[Dict]:
+        # The newest `limit` messages older than before_id, oldest first; walks the (conversation_id, id) index
+        with self.lock:
+            if before_id is None:
+                rows = self.db.execute(
+                    f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE conversation_id = ? "
+                    "ORDER BY id DESC LIMIT ?", (conversation_id, limit)
+                ).fetchall()
+            else:
+                rows = self.db.execute(
+                    f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE conversation_id = ? AND id < ? "
+                    "ORDER BY id DESC LIMIT ?", (conversation_id, before_id, limit)
+                ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def messages_after(self, after_id: int = 0, limit: int = 500) -> List[Dict]:
+        # Every saved message in order, a batch at a time, e.g. for building an index
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def fts_query(text: str) -> str:
+        # Every word must match; the last one is a prefix so results appear while typing
+        terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+        if terms:
+            terms[-1] += "*"
+        return " ".join(terms)
+
+    def search(self, text: str, limit: int = 50, conversation_id: Optional[int] = None) -> List[Dict]:
+        # Newest matches first, which FTS5 reads straight off its index
+        if not text.strip():
+            return []
+        scope = "AND m.conversation_id = ?" if conversation_id is not None else ""
+        with self.lock:
+            if self.fts:
+                params = [self.fts_query(text)] + ([conversation_id] if conversation_id is not None else []) + [limit]
+                rows = self.db.execute(
+                    "SELECT m.id, m.conversation_id, m.role, m.created, c.title, "
+                    "snippet(messages_fts, 0, '[', ']', '…', 12) AS snippet "
+                    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                    "JOIN conversations c ON c.id = m.conversation_id "
+                    f"WHERE messages_fts MATCH ? {scope} ORDER BY messages_fts.rowid DESC LIMIT ?",
+                    params
+                ).fetchall()
+            else:
+                pattern = "%" + text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                params = [pattern] + ([conversation_id] if conversation_id is not None else []) + [limit]
+                rows = self.db.execute(
+                    "SELECT m.id, m.conversation_id, m.role, m.created, c.title, substr(m.content, 1, 120) AS snippet "
+                    "FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+                    f"WHERE m.content LIKE ? ESCAPE '\\' {scope} ORDER BY m.id DESC LIMIT ?",
+                    params
+                ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,234 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from .metrics import METRICS
+
+class RequestScope:
+    # Remembers the connections of the requests one thread sends while the scope is entered, so another
+    # thread can abort() them mid-flight, even before any response header arrived. The server sees the
+    # connection close, which is how Ollama learns to stop evaluating a request nobody wants anymore.
+    local = threading.local()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sockets: list = []
+        self.aborted = False
+
+    @classmethod
+    def current(cls) -> "RequestScope":
+        return getattr(cls.local, "scope", None)
+
+    def __enter__(self) -> "RequestScope":
+        RequestScope.local.scope = self
+        return self
+
+    def __exit__(self, *exc_info):
+        RequestScope.local.scope = None
+        with self.lock:
+            self.sockets = []
+
+    def track(self, sock):
+        with self.lock:
+            if not self.aborted:
+                self.sockets.append(sock)
+                return
+        self._shut(sock)
+
+    def abort(self):
+        with self.lock:
+            self.aborted = True
+            sockets, self.sockets = self.sockets, []
+        for sock in sockets:
+            self._shut(sock)
+
+    @staticmethod
+    def _shut(sock):
+        # Shutting down (not closing) wakes the thread blocked reading it; urllib3 then drops the connection
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class TimedHTTPConnection(HTTPConnection):
+    # New connections report their setup time to the span of the request that opened them
+    def connect(self):
+        span = METRICS.current_span()
+        if span is None:
+            return super().connect()
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            span.connect = time.perf_counter() - started
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        scope = RequestScope.current()
+        if scope is not None and self.sock is not None:
+            scope.track(self.sock)
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        span = METRICS.current_span()
+        if span is None:
+            return super().connect()
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            span.connect = time.perf_counter() - started
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        scope = RequestScope.current()
+        if scope is not None and self.sock is not None:
+            scope.track(self.sock)
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+class HTTPTransport:
+    def __init__(self, pool_size: int = 10, keep_alive: bool = True,
+                 connect_timeout: float = 3.0, read_timeout: float = 30.0,
+                 retries: int = 2, backoff_factor: float = 0.3, max_sessions: int = 32):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_sessions = max_sessions
+        # One pooled session per scheme://host:port, least recently used first
+        self.sessions: "OrderedDict[str, requests.Session]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.session_hits = 0
+        self.session_misses = 0
+
+    @staticmethod
+    def base_url(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        # Only idempotent requests are retried on bad gateway responses; connect errors are retried for all
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False
+        )
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def session_for(self, url: str) -> requests.Session:
+        key = self.base_url(url)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is not None:
+                self.session_hits += 1
+                self.sessions.move_to_end(key)
+                return session
+            self.session_misses += 1
+            session = self._create_session()
+            self.sessions[key] = session
+            if len(self.sessions) > self.max_sessions:
+                _, evicted = self.sessions.popitem(last=False)
+                evicted.close()
+            return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        session = self.session_for(url)
+        if not METRICS.enabled:
+            return session.request(method, url, **kwargs)
+        return self._traced_request(session, method, url, **kwargs)
+
+    def _traced_request(self, session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        parts = urlsplit(url)
+        span = METRICS.start_span("http", method=method, host=parts.netloc, path=parts.path or "/")
+        METRICS.set_current_span(span)
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            span.finish(error=type(e).__name__)
+            raise
+        finally:
+            METRICS.set_current_span(None)
+        span.status = response.status_code
+        # requests measures from sending the request until the headers are parsed
+        span.ttfb = response.elapsed.total_seconds()
+        response.span = span
+        if not kwargs.get("stream"):
+            span.finish()
+            return response
+        # Streamed bodies are read by the caller; the span ends when the response is closed
+        close = response.close
+
+        def close_and_finish():
+            close()
+            span.finish()
+
+        response.close = close_and_finish
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        # urllib3 counts every request and every new connection per pool; the rest were reused
+        requests_sent = 0
+        connections_opened = 0
+        with self.lock:
+            sessions = list(self.sessions.values())
+            stats = {
+                "sessions": len(sessions),
+                "session_hits": self.session_hits,
+                "session_misses": self.session_misses,
+            }
+        for session in sessions:
+            pools = session.get_adapter("http://").poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+        stats["pool_hits"] = max(requests_sent - connections_opened, 0)
+        stats["pool_misses"] = connections_opened
+        return stats
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+# Shared by every client unless one is given its own transport
+DEFAULT_TRANSPORT = HTTPTransport()
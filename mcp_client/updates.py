@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, List, Optional
+
+from .metrics import METRICS
+
+# Marks an update that calls its callback without an argument
+NO_VALUE = object()
+
+class PendingUpdate:
+    __slots__ = ("callback", "value", "merge")
+
+    def __init__(self, callback: Callable, value, merge: Optional[Callable]):
+        self.callback = callback
+        self.value = value
+        self.merge = merge
+
+class UIUpdateScheduler:
+    # The one place widgets get updated from: any thread posts, the UI thread applies them once per frame.
+    # Posts for the same key before the next frame collapse into one, so a burst of tokens or server
+    # events costs one widget update per frame instead of one per event.
+    def __init__(self, root, max_fps: float = 30.0, frame_budget: Optional[float] = None,
+                 max_pending: int = 10000, history: int = 300):
+        self.root = root
+        self.frame_interval = 1.0 / max_fps
+        # Work past the budget waits for the next frame so input stays responsive
+        self.frame_budget = frame_budget if frame_budget is not None else self.frame_interval / 2
+        self.max_pending = max_pending
+        self.pending: Dict[Hashable, PendingUpdate] = {}
+        self.lock = threading.Lock()
+        # Polled at the start of every frame, on the UI thread, e.g. to drain a worker's result queue
+        self.sources: List[Callable[[], None]] = []
+        # key -> [interval, callback, due]
+        self.periodic: Dict[Hashable, list] = {}
+        self.frame_times: deque = deque(maxlen=history)
+        self.posted = 0
+        self.merged = 0
+        self.dropped = 0
+        self.applied = 0
+        self.deferred = 0
+        self.errors = 0
+        self.frames = 0
+        self.frame_due = None
+        self.after_id = None
+
+    def start(self):
+        if self.after_id is None:
+            self.frame_due = time.perf_counter() + self.frame_interval
+            self.after_id = self.root.after(int(self.frame_interval * 1000), self._frame)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def add_source(self, poll: Callable[[], None]):
+        self.sources.append(poll)
+
+    def every(self, key: Hashable, interval: float, callback: Callable[[], None]):
+        # Low-rate refreshes (status labels and the like) ride along with the frames instead of their own timers
+        self.periodic[key] = [interval, callback, time.perf_counter() + interval]
+
+    def post(self, key: Hashable, callback: Callable, value=NO_VALUE, merge: Optional[Callable] = None):
+        # Thread-safe. Without `merge` the newest update for a key wins; with it, values are combined
+        with self.lock:
+            self.posted += 1
+            update = self.pending.get(key)
+            if update is not None:
+                self.merged += 1
+                update.value = merge(update.value, value) if merge is not None else value
+                update.callback = callback
+                return
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending[key] = PendingUpdate(callback, value, merge)
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        # Drops pending updates whose target went away, e.g. replies of a chat that was cleared
+        with self.lock:
+            keys = [key for key in self.pending if predicate(key)]
+            for key in keys:
+                del self.pending[key]
+            self.dropped += len(keys)
+        return len(keys)
+
+    def flush(self):
+        # Applies everything now; for callers that need the widgets current, e.g. before a measurement
+        self._apply(None)
+
+    def _apply(self, deadline: Optional[float]):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        items = list(batch.items())
+        for index, (key, update) in enumerate(items):
+            if deadline is not None and index and time.perf_counter() > deadline:
+                self._defer(items[index:])
+                break
+            try:
+                if update.value is NO_VALUE:
+                    update.callback()
+                else:
+                    update.callback(update.value)
+            except Exception:
+                # One broken update must not stop the frame loop
+                self.errors += 1
+            self.applied += 1
+
+    def _defer(self, items: list):
+        with self.lock:
+            self.deferred += len(items)
+            newer = self.pending
+            self.pending = dict(items)
+            # Updates posted during this frame go after the deferred ones, merged where they share a key
+            for key, update in newer.items():
+                earlier = self.pending.get(key)
+                if earlier is not None and update.merge is not None:
+                    earlier.value = update.merge(earlier.value, update.value)
+                    earlier.callback = update.callback
+                else:
+                    self.pending.pop(key, None)
+                    self.pending[key] = update
+
+    def _frame(self):
+        started = time.perf_counter()
+        lag = max(started - self.frame_due, 0.0)
+        for poll in self.sources:
+            try:
+                poll()
+            except Exception:
+                self.errors += 1
+        for key, entry in list(self.periodic.items()):
+            interval, callback, due = entry
+            if started >= due:
+                entry[2] = started + interval
+                self.post(("every", key), callback)
+        self._apply(started + self.frame_budget)
+        elapsed = time.perf_counter() - started
+        self.frames += 1
+        self.frame_times.append(elapsed)
+        if METRICS.enabled:
+            METRICS.observe("ui_lag_seconds", lag, {"callback": "frame"})
+            METRICS.observe("ui_callback_seconds", elapsed, {"callback": "frame"})
+        # Capped frame rate: a slow frame shortens the wait, it never makes frames come faster
+        delay = max(self.frame_interval - elapsed, 0.001)
+        self.frame_due = time.perf_counter() + delay
+        self.after_id = self.root.after(int(delay * 1000), self._frame)
+
+    def stats(self) -> Dict:
+        times = sorted(self.frame_times)
+
+        def quantile(q: float) -> Optional[float]:
+            return times[min(int(q * len(times)), len(times) - 1)] if times else None
+
+        with self.lock:
+            return {
+                "frames": self.frames,
+                "posted": self.posted,
+                "merged": self.merged,
+                "dropped": self.dropped,
+                "applied": self.applied,
+                "deferred": self.deferred,
+                "errors": self.errors,
+                "pending": len(self.pending),
+                "frame_p50": quantile(0.5),
+                "frame_p95": quantile(0.95),
+                "frame_max": times[-1] if times else None,
+            }
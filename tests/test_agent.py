@@ -0,0 +1,42 @@
+from mcp_client.agent import AgentLoop, ToolCatalog
+from mcp_client.mcp import MCPServer
+from mcp_client.mocks import MockMCPServer
+from mcp_client.transport import HTTPTransport
+
+class ToolHungryClient:
+    # Calls a tool whenever it is offered one, and answers from the tool results once it is not
+    current_model = "model"
+
+    def __init__(self):
+        self.offered = []
+
+    def stream_chat(self, messages, model=None, stats=None, options=None, tools=None, tool_calls=None):
+        self.offered.append(bool(tools))
+        if tools:
+            tool_calls.append({"function": {"name": "echo", "arguments": {"text": "again"}}})
+            return
+        seen = sum(1 for message in messages if message["role"] == "tool")
+        stats.mark_first_token()
+        yield f"answer after {seen} tool results"
+
+def test_step_limit_ends_with_an_answer_without_tools():
+    with MockMCPServer() as mock:
+        http = HTTPTransport(retries=0)
+        server = MCPServer("mock", mock.url, transport=http)
+        client = ToolHungryClient()
+        agent = AgentLoop(client, [server], max_steps=3)
+        text, trace = agent.run([{"role": "user", "content": "hi"}], "model")
+        assert client.offered == [True, True, True, False]
+        assert text == "answer after 3 tool results"
+        assert trace.step_limit_hit and trace.summary().endswith("step limit reached")
+        server.disconnect()
+        http.close()
+
+def test_colliding_names_get_one_suffix_each():
+    servers = [MCPServer(name, f"http://localhost:{8000 + index}")
+               for index, name in enumerate(["a b", "a_b", "a  b", "other"])]
+    tool_lists = [(server, [{"name": "echo"}]) for server in servers]
+    view = ToolCatalog()._build((), tool_lists)
+    assert [definition["function"]["name"] for definition in view.definitions] == [
+        "a_b__echo", "a_b__echo_2", "a_b__echo_3", "other__echo"]
+    assert view.resolve("a_b__echo_3").server is servers[2]
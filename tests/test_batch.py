@@ -0,0 +1,58 @@
+import io
+import json
+import time
+
+import pytest
+
+from mcp_client.batch import read_batch_items, run_batch
+from mcp_client.cli import build_arg_parser
+
+class FakeClient:
+    current_model = "model"
+
+    def stream_response(self, prompt, model, stats):
+        if prompt == "slow":
+            time.sleep(0.3)
+        if prompt == "fail":
+            stats.error = "Error: boom"
+            yield stats.error
+            return
+        stats.mark_first_token()
+        yield f"reply to {prompt}"
+
+class Output(io.StringIO):
+    @property
+    def results(self):
+        return [json.loads(line) for line in self.getvalue().splitlines()]
+
+def test_errors_are_counted_from_the_stream_not_the_text():
+    output = Output()
+    prompts = ["fail", "Error: in the prompt", "fine"]
+    counts = run_batch(FakeClient(), read_batch_items(prompts), output, concurrency=2, ordered=True)
+    assert counts == {"total": 3, "errors": 1}
+    results = output.results
+    assert results[0]["error"] == "Error: boom"
+    assert results[1]["response"] == "reply to Error: in the prompt"
+
+def test_ordered_output_bounds_read_ahead():
+    output = Output()
+    concurrency = 2
+    ahead = []
+
+    def items():
+        for item in read_batch_items(["slow"] + [f"fast {index}" for index in range(40)]):
+            # Items read but not yet written; the slow first one must not let this grow with the input
+            ahead.append(item["index"] - len(output.results))
+            yield item
+
+    counts = run_batch(FakeClient(), items(), output, concurrency=concurrency, ordered=True)
+    assert counts["total"] == 41
+    assert [result["index"] for result in output.results] == list(range(41))
+    assert max(ahead) <= 2 * concurrency
+
+def test_concurrency_must_be_positive():
+    parser = build_arg_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["batch", "-c", "0"])
+    with pytest.raises(ValueError):
+        run_batch(FakeClient(), iter([]), Output(), concurrency=0)
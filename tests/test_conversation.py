@@ -0,0 +1,70 @@
+from mcp_client.ollama import Conversation
+
+class SummarizingClient:
+    def __init__(self, conversation: Conversation, clear: bool = False, reply: str = "they talked"):
+        self.conversation = conversation
+        self.clear = clear
+        self.reply = reply
+        self.current_model = "model"
+        self.lock_held = []
+
+    def generate_response(self, prompt: str, model: str = None) -> str:
+        self.lock_held.append(self.conversation.lock.locked())
+        if self.clear:
+            self.conversation.clear()
+        if not (model or self.current_model):
+            return "No model selected"
+        return self.reply
+
+def long_conversation(turns: int = 20) -> Conversation:
+    conversation = Conversation(context_window=400, reserve_tokens=100, summarize=True)
+    for index in range(turns):
+        conversation.add_user(f"question {index} " + "x" * 80)
+        conversation.add_assistant(f"answer {index} " + "y" * 80)
+    return conversation
+
+def test_summarizes_outside_the_lock():
+    conversation = long_conversation()
+    client = SummarizingClient(conversation)
+    messages = conversation.prepare_messages(client, "model")
+    assert client.lock_held == [False]
+    assert conversation.summary == "they talked"
+    assert messages[0]["content"].endswith("they talked")
+
+def test_failed_summaries_are_not_kept():
+    conversation = long_conversation()
+    client = SummarizingClient(conversation)
+    client.current_model = None
+    messages = conversation.prepare_messages(client, None)
+    assert client.lock_held == [] and conversation.summary == ""
+    assert all("No model selected" not in message["content"] for message in messages)
+    conversation.summary = "earlier"
+    for index in range(20):
+        conversation.add_user("more " + "x" * 80)
+    conversation.prepare_messages(SummarizingClient(conversation, reply="Error: 500"), "model")
+    assert conversation.summary == "earlier"
+
+def test_summary_is_dropped_after_clear():
+    conversation = long_conversation()
+    conversation.prepare_messages(SummarizingClient(conversation, clear=True), "model")
+    assert conversation.summary == ""
+    assert conversation.messages == []
+
+def test_remove_user_takes_back_its_own_turn():
+    conversation = Conversation()
+    first = conversation.add_user("hello")
+    conversation.add_assistant("hi", turn=first)
+    second = conversation.add_user("hello")
+    conversation.remove_user(second)
+    assert [message["role"] for message in conversation.messages] == ["user", "assistant"]
+    conversation.remove_user(second)
+    assert len(conversation.messages) == 2
+
+def test_reply_lands_after_its_own_turn():
+    conversation = Conversation()
+    first = conversation.add_user("same")
+    second = conversation.add_user("same")
+    conversation.add_assistant("answer 1", turn=first)
+    conversation.add_assistant("answer 2", turn=second)
+    assert [message["content"] for message in conversation.messages] == ["same", "answer 1", "same", "answer 2"]
+    assert all(set(message) == {"role", "content"} for message in conversation.prepare_messages())
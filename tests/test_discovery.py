@@ -0,0 +1,21 @@
+import time
+
+import pytest
+
+from mcp_client.discovery import ServerDiscovery
+
+def test_expand_hosts_lists_networks_and_names():
+    hosts = ServerDiscovery.expand_hosts(["localhost", "10.0.0.0/30", "10.0.1.5/32"])
+    assert hosts == ["localhost", "10.0.0.1", "10.0.0.2", "10.0.1.5"]
+    assert len(ServerDiscovery.expand_hosts(["10.1.0.0/16"])) == 65534
+
+@pytest.mark.parametrize("network", ["10.0.0.0/8", "fd00::/64"])
+def test_too_large_networks_are_refused_up_front(network):
+    started = time.perf_counter()
+    with pytest.raises(ValueError, match="too large"):
+        ServerDiscovery.expand_hosts([network])
+    assert time.perf_counter() - started < 0.1
+
+def test_invalid_network_is_refused():
+    with pytest.raises(ValueError, match="Invalid network"):
+        ServerDiscovery.expand_hosts(["10.0.0.300/24"])
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from mcp_client.embeddings import EmbeddingIndex
+
+class FakeEmbedder:
+    def __init__(self, dim: int = 8):
+        self.dim = dim
+        self.fail = False
+
+    def embed(self, texts, model, dimensions=None):
+        if self.fail:
+            raise RuntimeError("embedder broke")
+        return [[float(len(text) % 7 + 1)] + [1.0] * (self.dim - 1) for text in texts]
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+def test_dimension_change_rebuilds_the_index(tmp_path):
+    embedder = FakeEmbedder(dim=8)
+    index = EmbeddingIndex(embedder, directory=str(tmp_path))
+    for ref in range(3):
+        index.submit(f"message {ref}", "chat", ref)
+    wait_for(lambda: len(index) == 3 and not index.flush_scheduled)
+    index.remove({("chat", 0)})
+    embedder.dim = 16
+    index.submit("after the model changed", "chat", 3)
+    # The deleted message is left out; the rest is embedded again at the new size
+    wait_for(lambda: len(index) == 3 and not index.flush_scheduled)
+    assert index.dim == 16 and index.rebuilds == 1
+    assert sorted(chunk["ref"] for chunk in index.chunks) == [1, 2, 3]
+    reloaded = EmbeddingIndex(embedder, directory=str(tmp_path))
+    assert len(reloaded) == 3 and reloaded.dim == 16
+    index.close()
+
+def test_search_after_a_dimension_change_starts_the_rebuild(tmp_path):
+    embedder = FakeEmbedder(dim=8)
+    index = EmbeddingIndex(embedder, directory=str(tmp_path))
+    for ref in range(3):
+        index.submit(f"message {ref}", "chat", ref)
+    wait_for(lambda: len(index) == 3 and not index.flush_scheduled)
+    embedder.dim = 16
+    # Nothing comparable until the old texts are embedded again, instead of a shape error
+    assert index.search("message 1") == []
+    assert index.augment_messages([{"role": "user", "content": "message 1"}])[-1]["content"] == "message 1"
+    wait_for(lambda: len(index) == 3 and not index.flush_scheduled)
+    assert index.dim == 16 and index.rebuilds == 1
+    assert len(index.search("message 1", k=3)) == 3
+    index.close()
+
+def test_failed_flush_does_not_block_later_ones(tmp_path):
+    embedder = FakeEmbedder()
+    index = EmbeddingIndex(embedder, directory=str(tmp_path))
+    embedder.fail = True
+    index.submit("lost to an error", "chat", 1)
+    wait_for(lambda: not index.flush_scheduled)
+    embedder.fail = False
+    index.submit("next one", "chat", 2)
+    wait_for(lambda: len(index) == 1)
+    assert index.chunks[0]["ref"] == 2
+    index.close()
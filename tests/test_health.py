@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from mcp_client.health import HealthMonitor
+from mcp_client.mcp import MCPServer
+from mcp_client.registry import ServerRegistry
+
+class FakeServer(MCPServer):
+    def __init__(self, url: str, outcomes):
+        super().__init__("fake", url)
+        self.outcomes = list(outcomes)
+        self.probes = 0
+
+    def probe(self, timeout: float = 5.0):
+        self.probes += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, 0.01
+
+def monitor_with(server: FakeServer, **kwargs) -> HealthMonitor:
+    registry = ServerRegistry()
+    monitor = HealthMonitor(registry, **kwargs)
+    registry.add(server)
+    return monitor
+
+def test_backoff_doubles_and_the_exponent_is_capped():
+    server = FakeServer("http://localhost:9001", [False])
+    monitor = monitor_with(server, base_interval=1.0, max_backoff=float("inf"))
+    intervals = []
+    for _ in range(4):
+        monitor._check(server)
+        intervals.append(monitor.health_for(server).interval)
+    assert intervals == [1.0, 2.0, 4.0, 8.0]
+    health = monitor.health_for(server)
+    health.consecutive_failures = 5000
+    # 2 ** 4999 would overflow the float
+    assert monitor._next_interval(health, False) == 2.0 ** 16
+    monitor.max_backoff = 300.0
+    assert monitor._next_interval(health, False) == 300.0
+    monitor.stop()
+
+def test_checking_is_cleared_when_the_probe_raises():
+    server = FakeServer("http://localhost:9002", [RuntimeError("probe broke")])
+    monitor = monitor_with(server, base_interval=1.0)
+    health = monitor.health_for(server)
+    health.checking = True
+    monitor._check(server)
+    assert not health.checking and health.consecutive_failures == 1
+    assert health.next_check > time.monotonic() and server.status == "offline"
+    monitor.stop()
+
+def test_checking_is_cleared_when_recording_raises():
+    server = FakeServer("http://localhost:9003", [True])
+    monitor = monitor_with(server)
+    health = monitor.health_for(server)
+    health.checking = True
+
+    def broken(healthy, latency):
+        raise ValueError("bad sample")
+
+    health.record = broken
+    with pytest.raises(ValueError):
+        monitor._check(server)
+    assert not health.checking
+    monitor.stop()
+
+def test_flapping_servers_are_checked_often_and_stable_ones_relax():
+    server = FakeServer("http://localhost:9004", [True, False, True, False, True])
+    monitor = monitor_with(server, base_interval=10.0, min_interval=2.0, max_interval=60.0)
+    for _ in range(5):
+        monitor._check(server)
+    assert monitor.health_for(server).interval == 2.0
+    steady = FakeServer("http://localhost:9005", [True])
+    monitor.registry.add(steady)
+    health = monitor.health_for(steady)
+    for _ in range(6):
+        monitor._check(steady)
+    assert health.interval == 60.0 and health.summary()["p50"] == 0.01
+    monitor.stop()
+
+def test_a_failing_probe_keeps_being_scheduled():
+    server = FakeServer("http://localhost:9006", [RuntimeError("probe broke")])
+    monitor = monitor_with(server, base_interval=0.01, max_backoff=0.01)
+    monitor.start()
+    deadline = time.monotonic() + 5
+    while server.probes < 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    monitor.stop()
+    assert server.probes >= 3
@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from mcp_client.mcp import (SESSION_EXPIRED, HTTPMCPTransport, MCPError, MCPServer, MCPSession, SSEMCPTransport,
+                            StdioMCPTransport)
+from mcp_client.mocks import MockMCPServer
+from mcp_client.transport import HTTPTransport
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSPORTS = ("http", "sse", "stdio")
+
+@pytest.fixture
+def mock():
+    with MockMCPServer() as server:
+        yield server
+
+@pytest.fixture
+def http():
+    transport = HTTPTransport(retries=0)
+    yield transport
+    transport.close()
+
+def make_transport(kind: str, mock: MockMCPServer, http: HTTPTransport):
+    if kind == "stdio":
+        transport = StdioMCPTransport([sys.executable, "-m", "mcp_client.mocks", "--stdio"], cwd=ROOT)
+    elif kind == "sse":
+        transport = SSEMCPTransport(f"{mock.url}/sse", http)
+    else:
+        transport = HTTPMCPTransport(f"{mock.url}/mcp", http)
+    return transport
+
+@pytest.fixture(params=TRANSPORTS)
+def session(request, mock, http):
+    session = MCPSession(make_transport(request.param, mock, http), request_timeout=10)
+    session.open(timeout=10)
+    session.kind = request.param
+    yield session
+    session.close()
+
+def test_initialize(session):
+    assert session.initialized
+    assert session.server_info["name"].startswith("mock-")
+    assert "tools" in session.server_capabilities
+
+def test_list_tools(session):
+    assert {tool["name"] for tool in session.list_tools()} == {"echo", "sleep"}
+
+def test_call_tool(session):
+    result = session.call_tool("echo", {"text": "hello"})
+    assert not result["isError"]
+    assert json.loads(result["content"][0]["text"]) == {"text": "hello"}
+
+def test_call_timeout(session):
+    with pytest.raises(MCPError, match="timed out"):
+        session.call_tool("sleep", {"seconds": 1.0}, timeout=0.2)
+    # The session outlives a request that timed out
+    assert session.call_tool("echo", {"text": "still here"}, timeout=5)["content"]
+
+def test_dead_server(session, mock):
+    if session.kind == "stdio":
+        session.transport.process.kill()
+        session.transport.process.wait()
+    else:
+        mock.stop()
+    started = time.perf_counter()
+    with pytest.raises(MCPError):
+        session.call_tool("echo", {"text": "anyone?"}, timeout=5)
+    assert time.perf_counter() - started < 5
+    if session.kind != "http":
+        # Streamable HTTP has no connection to lose between requests; the others notice the loss
+        deadline = time.perf_counter() + 5
+        while session.is_alive() and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        assert not session.is_alive()
+
+def test_http_expired_session_is_not_alive(mock, http):
+    session = MCPSession(HTTPMCPTransport(f"{mock.url}/mcp", http), request_timeout=10)
+    session.open(timeout=10)
+    mock.expire_sessions()
+    with pytest.raises(MCPError) as error:
+        session.call_tool("echo", {"text": "hello"})
+    assert error.value.code == SESSION_EXPIRED
+    assert not session.is_alive()
+    session.close()
+
+def test_http_expired_session_is_reinitialized(mock, http):
+    server = MCPServer("mock", mock.url, transport=http)
+    first = server.connect(timeout=10)
+    mock.expire_sessions()
+    result = server.call_tool("echo", {"text": "again"}, timeout=10)
+    assert json.loads(result["content"][0]["text"]) == {"text": "again"}
+    assert server.session is not first and server.session.is_alive()
+    assert server.is_connected()
+    server.disconnect()
+
+def test_http_post_read_timeout(mock, http):
+    transport = HTTPMCPTransport(f"{mock.url}/mcp", http, read_timeout=0.3)
+    session = MCPSession(transport, request_timeout=10)
+    session.open(timeout=10)
+    started = time.perf_counter()
+    # The POST gives up on its own; the request timeout alone would wait the full 10 seconds
+    with pytest.raises(MCPError, match="request failed"):
+        session.call_tool("sleep", {"seconds": 2.0})
+    assert time.perf_counter() - started < 2.0
+    session.close()
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from mcp_client.mocks import MockHandler, MockServer
+from mcp_client.ollama import GenerationStats, OllamaClient
+from mcp_client.transport import HTTPTransport
+
+class BrokenStreamHandler(MockHandler):
+    def do_POST(self):
+        self.read_json()
+        self.start_chunked("application/x-ndjson")
+        self.write_chunk((json.dumps({"response": "partial", "done": False}) + "\n").encode())
+        if self.server.mock.mode == "malformed":
+            self.write_chunk(b"{not json\n")
+            self.end_chunked()
+        else:
+            # Hang up in the middle of a chunk
+            self.wfile.write(b"40\r\n{\"response\"")
+            self.wfile.flush()
+            self.close_connection = True
+
+class BrokenOllama(MockServer):
+    handler_class = BrokenStreamHandler
+
+    def __init__(self, mode: str):
+        super().__init__()
+        self.mode = mode
+
+@pytest.mark.parametrize("mode, message", [("malformed", "Malformed response"), ("truncated", "broke off")])
+def test_stream_errors_become_error_text(mode, message):
+    with BrokenOllama(mode) as mock:
+        transport = HTTPTransport(retries=0)
+        client = OllamaClient(mock.url, transport=transport, keep_alive=None)
+        stats = GenerationStats("model")
+        pieces = list(client.stream_response("hello", "model", stats=stats))
+        transport.close()
+    assert pieces[0] == "partial"
+    assert pieces[-1].startswith("Error:") and message in pieces[-1]
+    assert stats.error == pieces[-1]
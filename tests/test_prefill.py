@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from mcp_client.mocks import MockOllamaServer
+from mcp_client.ollama import OllamaClient
+from mcp_client.prefill import PromptPrefill
+from mcp_client.transport import HTTPTransport
+
+MODEL = "mock:latest"
+
+def chat(draft: str):
+    return [{"role": "user", "content": "earlier question"}, {"role": "assistant", "content": "earlier answer"},
+            {"role": "user", "content": draft}]
+
+def wait_idle(prefill: PromptPrefill, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while prefill.running and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert not prefill.running
+
+@pytest.fixture
+def mock():
+    with MockOllamaServer(latency=0.01, prompt_rate=2000, tokens=4) as mock:
+        yield mock
+
+@pytest.fixture
+def client(mock):
+    transport = HTTPTransport(retries=0)
+    yield OllamaClient(mock.url, transport=transport, keep_alive=None)
+    transport.close()
+
+def test_prefill_is_claimed_once_by_the_matching_request(client):
+    prefill = PromptPrefill(client, min_interval=0)
+    draft = "what is the weather like in " + "x" * 200
+    assert prefill.request(chat(draft), MODEL)
+    wait_idle(prefill)
+    assert prefill.stats()["completed"] == 1
+    tokens, seconds = prefill.claim(MODEL, chat(draft + " today?"))
+    assert tokens > 0 and seconds > 0
+    # Claimed: the next request starts from nothing again
+    assert prefill.claim(MODEL, chat(draft + " today?")) is None
+    assert prefill.stats()["replies"] == 1
+    assert prefill.request(chat("y" * 200), MODEL)
+    wait_idle(prefill)
+    # Another model takes over the host, so the warm prompt is gone for this one too
+    assert prefill.claim("other:latest", chat("y" * 200)) is None
+    assert prefill.claim(MODEL, chat("y" * 200)) is None
+
+def test_prefills_are_rate_limited_and_skipped_when_little_changed(client):
+    prefill = PromptPrefill(client, min_interval=0, min_growth=24)
+    assert not prefill.request(chat("hello"), MODEL, busy=True)
+    assert prefill.request(chat("hello"), MODEL)
+    assert not prefill.request(chat("hello there"), MODEL)
+    wait_idle(prefill)
+    assert not prefill.request(chat("hello there"), MODEL)
+    prefill.min_interval = 60
+    assert not prefill.request(chat("hello there, " + "x" * 50), MODEL)
+    assert prefill.stats()["skipped"] == 4
+
+def test_cancel_aborts_a_long_prefill(client, mock):
+    mock.prompt_rate = 100
+    prefill = PromptPrefill(client, min_interval=0)
+    assert prefill.request(chat("x" * 400), MODEL)
+    time.sleep(0.2)
+    started = time.perf_counter()
+    prefill.cancel()
+    wait_idle(prefill, timeout=2.0)
+    assert time.perf_counter() - started < 1.0
+    assert prefill.stats()["aborted"] == 1 and prefill.claim(MODEL, chat("x" * 400)) is None
+
+def test_prefill_finishing_after_the_claim_is_discarded(client, mock):
+    mock.prompt_rate = 1000
+    prefill = PromptPrefill(client, min_interval=0)
+    assert prefill.request(chat("x" * 300), MODEL)
+    time.sleep(0.05)
+    # The real request went out first; the prefill only warmed the cache it is about to use
+    assert prefill.claim(MODEL, chat("x" * 300)) is None
+    wait_idle(prefill)
+    stats = prefill.stats()
+    assert stats["discarded"] == 1 and stats["completed"] == 0
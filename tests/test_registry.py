@@ -0,0 +1,46 @@
+import threading
+
+from mcp_client.mcp import MCPServer, normalize_url
+from mcp_client.registry import ServerRegistry
+
+def test_urls_are_compared_normalized():
+    assert normalize_url("HTTP://Example.com:80/mcp/") == "http://example.com/mcp"
+    assert normalize_url("https://example.com:8443") == "https://example.com:8443"
+    assert normalize_url("http://[::1]:8000/") == "http://[::1]:8000"
+
+def test_same_server_is_kept_once_and_events_fire_on_changes():
+    registry = ServerRegistry()
+    events = []
+    registry.subscribe(lambda event, server: events.append((event, server.name)))
+    first = registry.add(MCPServer("first", "http://localhost:8000/"))
+    assert registry.add(MCPServer("again", "HTTP://LOCALHOST:8000")) is first
+    assert len(registry) == 1 and registry.get("http://localhost:8000/") is first
+    registry.set_status(MCPServer("copy", "http://localhost:8000"), "online")
+    registry.set_status(first, "online")
+    assert first.status == "online"
+    assert registry.remove("http://localhost:8000") is first
+    assert registry.remove("http://localhost:8000") is None
+    assert events == [("added", "first"), ("status_changed", "first"), ("removed", "first")]
+
+def test_iteration_is_a_snapshot_while_others_add():
+    registry = ServerRegistry()
+    for port in range(10):
+        registry.add(MCPServer(f"server {port}", f"http://localhost:{8000 + port}"))
+    seen = 0
+    for server in registry:
+        registry.add(MCPServer("late", f"http://localhost:{9000 + seen}"))
+        seen += 1
+    assert seen == 10 and len(registry) == 20
+
+def test_concurrent_adds_of_one_url_keep_one_server():
+    registry = ServerRegistry()
+    added = []
+    registry.subscribe(lambda event, server: added.append(server))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.add(MCPServer("s", "http://host:8000"))))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(added) == 1 and all(result is added[0] for result in results)
@@ -0,0 +1,57 @@
+import time
+
+from mcp_client.mocks import MockOllamaServer
+from mcp_client.ollama import GenerationStats, OllamaClient, ResponseCache
+from mcp_client.transport import HTTPTransport
+
+def test_least_recently_used_entry_goes_first():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "first")
+    cache.put("b", "second")
+    assert cache.get("a") == "first"
+    cache.put("c", "third")
+    assert cache.get("b") is None
+    assert cache.get("a") == "first" and cache.get("c") == "third"
+
+def test_byte_limit_evicts_and_keeps_the_size_right():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.put("a", "123")
+    assert cache.stats()["bytes"] == 8
+    cache.put("c", "1234")
+    assert cache.get("b") is None
+    assert cache.stats()["bytes"] == 7
+
+def test_expired_entries_are_not_returned(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(ttl=0.05, path=path)
+    cache.put("a", "old")
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert ResponseCache(ttl=0.05, path=path).get("a") is None
+    assert cache.stats()["entries"] == 0
+
+def test_entries_outlive_the_process_on_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(path=path).put("a", "kept")
+    assert ResponseCache(path=path).get("a") == "kept"
+
+def test_only_repeatable_and_complete_replies_are_cached():
+    with MockOllamaServer(token_rate=1000, tokens=8, latency=0.01) as mock:
+        transport = HTTPTransport(retries=0)
+        cache = ResponseCache()
+        client = OllamaClient(mock.url, transport=transport, keep_alive=None, cache=cache)
+        list(client.stream_response("hi", "mock:latest"))
+        assert cache.stats()["bypassed"] == 1 and cache.stats()["entries"] == 0
+        client.options = {"temperature": 0}
+        stream = client.stream_response("hi", "mock:latest")
+        next(stream)
+        stream.close()
+        # Stopped after the first token: nothing to reuse
+        assert cache.stats()["entries"] == 0
+        reply = "".join(client.stream_response("hi", "mock:latest"))
+        stats = GenerationStats("mock:latest")
+        assert list(client.stream_response("hi", "mock:latest", stats=stats)) == [reply]
+        assert stats.cached and cache.stats()["hits"] == 1
+        transport.close()
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from mcp_client.mocks import MockOllamaHandler, MockOllamaServer
+from mcp_client.ollama import GenerationStats
+from mcp_client.router import OllamaRouter
+from mcp_client.transport import HTTPTransport
+
+class SlowListingHandler(MockOllamaHandler):
+    def do_GET(self):
+        mock = self.server.mock
+        with mock.lock:
+            mock.listings.append(self.path)
+        time.sleep(mock.listing_delay)
+        super().do_GET()
+
+    def do_POST(self):
+        mock = self.server.mock
+        with mock.lock:
+            mock.listings.append(self.path)
+        super().do_POST()
+
+class SlowListingOllama(MockOllamaServer):
+    handler_class = SlowListingHandler
+
+    def __init__(self, models, listing_delay: float = 0.0):
+        super().__init__(token_rate=1000, tokens=5, latency=0.01, models=models)
+        self.listing_delay = listing_delay
+        self.listings = []
+
+@pytest.fixture
+def hosts():
+    with SlowListingOllama(["a:latest"], listing_delay=0.2) as first, SlowListingOllama(["b:latest"]) as second:
+        yield first, second
+
+def make_router(hosts, **kwargs):
+    transport = HTTPTransport(retries=0)
+    router = OllamaRouter([host.url for host in hosts], transport=transport, keep_alive=None,
+                          poll_interval=3600, **kwargs)
+    deadline = time.monotonic() + 5
+    while any(backend.available is None for backend in router.backends) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return router
+
+def test_model_on_no_backend_fails_fast(hosts):
+    router = make_router(hosts)
+    stats = GenerationStats("missing:latest")
+    pieces = list(router.stream_response("hi", "missing:latest", stats=stats))
+    assert pieces == ["Error: Model missing:latest is not available on any Ollama host"]
+    assert router.generate_response("hi", model="missing:latest") == pieces[0]
+    assert not any(path.startswith("/api/generate") for host in hosts for path in host.listings)
+    # A model that only one host has goes there
+    assert not router.generate_response("hi", model="b:latest").startswith("Error")
+    assert "/api/generate" in hosts[1].listings and "/api/generate" not in hosts[0].listings
+    router.close()
+
+def test_model_pulled_after_the_last_poll_is_found(hosts):
+    router = make_router(hosts)
+    hosts[1].models.append("fresh:latest")
+    stats = GenerationStats("fresh:latest")
+    list(router.stream_response("hi", "fresh:latest", stats=stats))
+    assert stats.error is None
+    router.close()
+
+def test_poll_reads_listings_concurrently():
+    with SlowListingOllama(["a:latest"], listing_delay=0.2) as host:
+        router = make_router([host], tags_interval=0)
+        host.listings.clear()
+        started = time.perf_counter()
+        router.poll()
+        assert sorted(host.listings) == ["/api/ps", "/api/tags"]
+        # Two 0.2 s listings, not waited on one after the other
+        assert time.perf_counter() - started < 0.35
+        router.close()
+
+def test_tags_are_polled_less_often(hosts):
+    router = make_router(hosts, tags_interval=3600)
+    for host in hosts:
+        host.listings.clear()
+    router.poll()
+    assert all(host.listings == ["/api/ps"] for host in hosts)
+    router.close()
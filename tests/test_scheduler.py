@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from mcp_client.mcp import MCPServer
+from mcp_client.mocks import MockMCPServer, MockOllamaServer
+from mcp_client.ollama import Conversation, OllamaClient
+from mcp_client.scheduler import RequestScheduler
+from mcp_client.transport import HTTPTransport
+
+MODELS = [f"mock{index}:latest" for index in range(4)]
+
+@pytest.fixture
+def client():
+    with MockOllamaServer(token_rate=500, tokens=10, latency=0.01, models=MODELS) as mock:
+        transport = HTTPTransport(retries=0)
+        yield OllamaClient(mock.url, transport=transport, keep_alive=None)
+        transport.close()
+
+def wait_until_over(scheduler: RequestScheduler, jobs, timeout: float = 10.0) -> list:
+    remaining = {job.job_id for job in jobs}
+    events = []
+    deadline = time.monotonic() + timeout
+    while remaining and time.monotonic() < deadline:
+        for event in scheduler.poll():
+            events.append(event)
+            if event[0] in ("done", "cancelled"):
+                remaining.discard(event[1].job_id)
+        time.sleep(0.01)
+    assert not remaining
+    return events
+
+def test_group_grows_the_pool_and_gives_it_back(client):
+    scheduler = RequestScheduler(client, max_workers=1)
+    jobs = scheduler.submit_group("hello", MODELS)
+    assert scheduler.max_workers == len(MODELS)
+    wait_until_over(scheduler, jobs)
+    assert scheduler.max_workers == 1
+    deadline = time.monotonic() + 5
+    while len(scheduler.workers) > 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(scheduler.workers) == 1
+    scheduler.shutdown()
+
+def test_group_that_does_not_fit_queues_nothing(client):
+    scheduler = RequestScheduler(client, max_workers=1, max_pending=3)
+    assert scheduler.submit_group("hello", MODELS) is None
+    assert scheduler.pending.qsize() == 0 and scheduler.in_flight() == 0
+    assert scheduler.max_workers == 1
+    scheduler.shutdown()
+
+@pytest.mark.parametrize("agent", [False, True])
+def test_stop_reaches_a_request_waiting_for_its_first_token(agent):
+    with MockOllamaServer(latency=5.0, models=MODELS) as mock, MockMCPServer() as tools:
+        transport = HTTPTransport(retries=0)
+        client = OllamaClient(mock.url, transport=transport, keep_alive=None)
+        scheduler = RequestScheduler(client, max_workers=1)
+        conversation = Conversation()
+        conversation.add_user("hello")
+        servers = [MCPServer("mock", tools.url, transport=transport)] if agent else None
+        job = scheduler.submit("hello", MODELS[0], conversation=conversation, servers=servers)
+        time.sleep(0.3)
+        started = time.perf_counter()
+        scheduler.cancel(job.job_id)
+        events = wait_until_over(scheduler, [job])
+        # Long before the model's first token would have arrived
+        assert time.perf_counter() - started < 2.0
+        assert events[-1][0] == "cancelled" and job.text == ""
+        scheduler.shutdown()
+        transport.close()
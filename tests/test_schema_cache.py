@@ -0,0 +1,54 @@
+import time
+
+from mcp_client.mcp import MCPServer, SchemaCache
+from mcp_client.mocks import MockMCPServer
+from mcp_client.transport import HTTPTransport
+
+TOOLS = [{"name": "echo", "inputSchema": {"type": "object"}}]
+
+def test_lists_expire_and_version_only_moves_on_changes():
+    cache = SchemaCache(ttl=0.05)
+    assert cache.get("tools") is None
+    cache.put("tools", TOOLS)
+    cache.put("tools", list(TOOLS))
+    assert cache.get("tools") == TOOLS and cache.version == 1
+    time.sleep(0.1)
+    assert cache.get("tools") is None
+    cache.put("tools", [])
+    assert cache.version == 2
+
+def test_invalidate_one_kind_or_all():
+    cache = SchemaCache()
+    cache.put("tools", TOOLS)
+    cache.put("resources", [])
+    cache.invalidate("tools")
+    assert cache.get("tools") is None and cache.get("resources") == []
+    cache.put("tools", TOOLS)
+    cache.invalidate()
+    assert cache.get("tools") is None and cache.get("resources") is None
+
+def test_list_changed_notifications_invalidate_their_kind():
+    cache = SchemaCache()
+    cache.put("tools", TOOLS)
+    cache.put("prompts", [])
+    cache.on_notification("notifications/message", {})
+    cache.on_notification("notifications/prompts/list_changed", {})
+    assert cache.get("tools") == TOOLS and cache.get("prompts") is None
+    cache.on_notification("notifications/tools/list_changed", {})
+    assert cache.get("tools") is None
+
+def test_server_refetches_only_after_invalidation():
+    with MockMCPServer() as mock:
+        http = HTTPTransport(retries=0)
+        server = MCPServer("mock", mock.url, transport=http)
+        server.connect()
+        # Prefetched with the session; no request needed
+        assert [tool["name"] for tool in server.list_tools()] == ["echo", "sleep"]
+        mock.tools = mock.tools[:1]
+        assert len(server.list_tools()) == 2
+        version = server.schemas.version
+        server.schemas.on_notification("notifications/tools/list_changed", {})
+        assert [tool["name"] for tool in server.list_tools()] == ["echo"]
+        assert server.schemas.version == version + 1
+        server.disconnect()
+        http.close()
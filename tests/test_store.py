@@ -0,0 +1,60 @@
+import pytest
+
+from mcp_client.ollama import Conversation, GenerationStats
+from mcp_client.store import ConversationStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = ConversationStore(str(tmp_path / "chats.sqlite3"))
+    yield store
+    store.close()
+
+def fill(store: ConversationStore, turns: int = 5) -> int:
+    conversation_id = store.create_conversation("Weather", "mock:latest")
+    for index in range(turns):
+        store.add_message(conversation_id, "user", f"question {index} about the weather")
+        stats = GenerationStats("mock:latest")
+        stats.eval_count = 7
+        store.add_message(conversation_id, "assistant", f"answer {index}", model="mock:latest", stats=stats)
+    return conversation_id
+
+def test_wal_mode_and_full_text_search(store):
+    assert store.db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert store.fts
+    first = fill(store)
+    other = store.create_conversation("Other")
+    store.add_message(other, "user", "nothing to see here")
+    hits = store.search("weath")
+    assert len(hits) == 5 and all(hit["conversation_id"] == first for hit in hits)
+    # Newest first, with the match marked in the snippet
+    assert [hit["id"] for hit in hits] == sorted((hit["id"] for hit in hits), reverse=True)
+    assert "[weather]" in hits[0]["snippet"]
+    assert store.search('"quoted" weather') == []
+    assert store.search("nothing", conversation_id=first) == []
+
+def test_deleted_messages_leave_the_search_index(store):
+    conversation_id = fill(store)
+    store.delete_conversation(conversation_id)
+    assert store.search("weather") == []
+
+def test_saved_chat_is_restored_page_by_page(tmp_path):
+    path = str(tmp_path / "chats.sqlite3")
+    writer = ConversationStore(path)
+    conversation_id = fill(writer, turns=6)
+    # A second connection reads while the first one stays open, as the search dialog does
+    store = ConversationStore(path)
+    page = store.load_page(conversation_id, limit=4)
+    assert [message["content"] for message in page] == ["question 4 about the weather", "answer 4",
+                                                        "question 5 about the weather", "answer 5"]
+    older = store.load_page(conversation_id, before_id=page[0]["id"], limit=4)
+    assert older[-1]["id"] < page[0]["id"] and len(older) == 4
+    conversation = Conversation()
+    conversation.restore(page)
+    assert [message["role"] for message in conversation.prepare_messages()] == ["user", "assistant"] * 2
+    # Ollama's own token count is kept for replies
+    assert conversation.messages[1]["tokens"] == 7
+    assert store.get_conversation(conversation_id)["message_count"] == 12
+    writer.add_message(conversation_id, "user", "one more")
+    assert store.load_page(conversation_id, limit=1)[0]["content"] == "one more"
+    writer.close()
+    store.close()
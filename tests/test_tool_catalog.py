@@ -0,0 +1,36 @@
+import pytest
+
+from mcp_client.agent import ToolCatalog
+from mcp_client.mcp import MCPServer
+from mcp_client.mocks import MockMCPServer
+from mcp_client.transport import HTTPTransport
+
+@pytest.fixture
+def servers():
+    mocks = [MockMCPServer().start() for _ in range(2)]
+    http = HTTPTransport(retries=0)
+    servers = [MCPServer(f"mock {index}", mock.url, transport=http) for index, mock in enumerate(mocks)]
+    yield servers
+    for server in servers:
+        server.disconnect()
+    for mock in mocks:
+        mock.stop()
+    http.close()
+
+def test_views_per_server_set(servers):
+    first, second = servers
+    catalog = ToolCatalog()
+    only_first = catalog.refresh([first])
+    only_second = catalog.refresh([second])
+    # Refreshing for another job's servers leaves the earlier view pointing at its own server
+    assert only_first.resolve("echo").server is first
+    assert only_second.resolve("echo").server is second
+    both = catalog.refresh([second, first])
+    assert both.resolve("echo") is None
+    assert both.resolve(ToolCatalog.qualified_name(first, "echo")).server is first
+
+def test_view_is_reused_for_the_same_set(servers):
+    catalog = ToolCatalog()
+    view = catalog.refresh(servers)
+    assert catalog.refresh(list(reversed(servers))) is view
+    assert len(view) == 4
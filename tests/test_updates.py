@@ -0,0 +1,75 @@
+import operator
+import time
+
+from mcp_client.updates import UIUpdateScheduler
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+        return len(self.scheduled)
+
+    def after_cancel(self, after_id):
+        pass
+
+def test_posts_for_one_key_merge_into_one_update():
+    updates = UIUpdateScheduler(FakeRoot())
+    applied = []
+    for piece in ("Hel", "lo", "!"):
+        updates.post(("reply", 1), applied.append, piece, merge=operator.add)
+    updates.post("status", applied.append, "old")
+    updates.post("status", applied.append, "new")
+    updates.post("ping", lambda: applied.append("ping"))
+    updates.flush()
+    assert applied == ["Hello!", "new", "ping"]
+    stats = updates.stats()
+    assert stats["posted"] == 6 and stats["merged"] == 3 and stats["applied"] == 3
+
+def test_work_past_the_budget_waits_for_the_next_frame():
+    updates = UIUpdateScheduler(FakeRoot())
+    applied = []
+    updates.post("a", applied.append, "a")
+    updates.post(("reply", 1), applied.append, "x", merge=operator.add)
+    updates.post("c", applied.append, "c")
+
+    def post_during_frame(value):
+        applied.append(value)
+        # Arrives while the frame runs; merged behind the deferred text, not applied before it
+        updates.post(("reply", 1), applied.append, "y", merge=operator.add)
+
+    updates.pending["a"].callback = post_during_frame
+    # Already past the deadline: the first update still runs so every frame makes progress
+    updates._apply(time.perf_counter() - 1)
+    assert applied == ["a"] and updates.stats()["deferred"] == 2
+    updates.flush()
+    assert applied == ["a", "xy", "c"]
+
+def test_discard_limits_and_broken_callbacks():
+    updates = UIUpdateScheduler(FakeRoot(), max_pending=2)
+    applied = []
+    updates.post(("reply", 1), applied.append, "x")
+    updates.post(("reply", 2), applied.append, "y")
+    updates.post("status", applied.append, "z")
+    assert updates.stats()["dropped"] == 1
+    assert updates.discard(lambda key: key[0] == "reply") == 2
+    updates.post("broken", lambda: 1 / 0)
+    updates.post("fine", lambda: None)
+    updates.flush()
+    stats = updates.stats()
+    assert stats["errors"] == 1 and stats["applied"] == 2 and stats["pending"] == 0
+    assert applied == []
+
+def test_frames_poll_sources_and_run_periodic_refreshes():
+    root = FakeRoot()
+    updates = UIUpdateScheduler(root, max_fps=1000)
+    polled = []
+    updates.add_source(lambda: polled.append("poll"))
+    updates.every("clock", 0.0, lambda: polled.append("tick"))
+    updates.start()
+    for _ in range(3):
+        root.scheduled[-1]()
+    assert polled == ["poll", "tick"] * 3
+    assert updates.stats()["frames"] == 3 and len(root.scheduled) == 4
+    updates.stop()